@@ -0,0 +1,188 @@
+"""Замер рассылки на синтетических получателях через фейковый Bot API.
+
+Прогоняет настоящий путь рассылки (broadcast_jobs → BroadcastSender → TokenBucket → aiogram Bot)
+на временной SQLite-базе и печатает msgs/s, p50/p99 задержки запросов и число 429.
+
+    python -m benchmarks.broadcast_benchmark --recipients 10000 100000
+    python -m benchmarks.broadcast_benchmark --recipients 10000 --rate 200 --server-rate-limit 0 --json
+
+При лимите по умолчанию (25 сообщ./сек) 10k получателей — это ~7 минут: так и должно быть.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Настройки читаются из окружения при импорте config, поэтому выставляем их до импорта модулей бота
+_DB_DIR = tempfile.mkdtemp(prefix="optic_bench_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{Path(_DB_DIR) / 'bench.db'}"
+os.environ.setdefault("BOT_TOKEN", "123456:benchmark")
+os.environ.setdefault("OWNER_IDS", "1")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Бенчмарк рассылки на фейковом Telegram Bot API")
+    parser.add_argument("--recipients", type=int, nargs="+", default=[10_000])
+    parser.add_argument("--rate", type=float, default=None, help="BROADCAST_RATE_LIMIT, сообщ./сек")
+    parser.add_argument("--workers", type=int, default=None, help="BROADCAST_WORKERS")
+    parser.add_argument("--latency-ms", type=float, default=40.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--flood-probability", type=float, default=0.0005)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--server-rate-limit", type=int, default=30, help="0 — без серверного лимита")
+    parser.add_argument("--blocked-ratio", type=float, default=0.02)
+    parser.add_argument("--json", action="store_true", help="вывести результат одной JSON-строкой")
+    return parser.parse_args()
+
+
+ARGS = parse_args()
+if ARGS.rate is not None:
+    os.environ["BROADCAST_RATE_LIMIT"] = str(ARGS.rate)
+if ARGS.workers is not None:
+    os.environ["BROADCAST_WORKERS"] = str(ARGS.workers)
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+from aiogram.exceptions import TelegramRetryAfter  # noqa: E402
+from aiogram.methods import EditMessageText  # noqa: E402
+from sqlalchemy import delete, insert  # noqa: E402
+
+from benchmarks.fake_telegram_api import FakeTelegramAPI, start_fake_api  # noqa: E402
+from config import BROADCAST_RATE_LIMIT, BROADCAST_WORKERS  # noqa: E402
+from database.init_db import init_db  # noqa: E402
+from database.models import BroadcastDelivery, BroadcastJob, Person  # noqa: E402
+from database.session import AsyncSessionLocal  # noqa: E402
+from services.broadcast import (  # noqa: E402
+    DELIVERY_FAILED,
+    DELIVERY_SENT,
+    DELIVERY_UNREACHABLE,
+    BroadcastMessage,
+    _count_deliveries,
+    _next_job,
+    _process_job,
+    enqueue_broadcast,
+)
+
+OWNER_CHAT_ID = 1
+INSERT_BATCH = 5_000
+
+
+class LatencyMiddleware(BaseRequestMiddleware):
+    """Меряет время каждого запроса рассылки к API и считает полученные 429."""
+
+    def __init__(self) -> None:
+        self.latencies: list[float] = []
+        self.flood_incidents = 0
+
+    async def __call__(self, make_request, bot, method):
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except TelegramRetryAfter:
+            self.flood_incidents += 1
+            raise
+        finally:
+            if not isinstance(method, EditMessageText):
+                self.latencies.append(time.perf_counter() - started)
+
+
+def _percentile(values: list[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(percent) - 1]
+
+
+async def _seed_recipients(count: int) -> None:
+    async with AsyncSessionLocal() as session:
+        await session.execute(delete(BroadcastDelivery))
+        await session.execute(delete(BroadcastJob))
+        await session.execute(delete(Person))
+        for start in range(0, count, INSERT_BATCH):
+            await session.execute(insert(Person), [
+                {"telegram_id": 10_000_000 + i, "first_name": f"Клиент {i}"}
+                for i in range(start, min(count, start + INSERT_BATCH))
+            ])
+        await session.commit()
+
+
+async def run_once(recipients: int) -> dict:
+    api = FakeTelegramAPI(
+        latency_ms=ARGS.latency_ms,
+        jitter_ms=ARGS.jitter_ms,
+        flood_probability=ARGS.flood_probability,
+        retry_after=ARGS.retry_after,
+        server_rate_limit=ARGS.server_rate_limit,
+        blocked_ratio=ARGS.blocked_ratio,
+    )
+    runner, base_url = await start_fake_api(api)
+    middleware = LatencyMiddleware()
+    session = AiohttpSession(api=TelegramAPIServer.from_base(base_url))
+    session.middleware(middleware)
+    bot = Bot(token=os.environ["BOT_TOKEN"], session=session)
+
+    try:
+        await _seed_recipients(recipients)
+        progress = await bot.send_message(OWNER_CHAT_ID, "📢 benchmark")
+        middleware.latencies.clear()
+        await enqueue_broadcast(BroadcastMessage(text="Тестовая рассылка"), OWNER_CHAT_ID, progress.message_id)
+
+        job = await _next_job()
+        started = time.perf_counter()
+        await _process_job(bot, job)
+        elapsed = time.perf_counter() - started
+        counts = await _count_deliveries(job.id)
+    finally:
+        await bot.session.close()
+        await runner.cleanup()
+
+    processed = sum(counts.values())
+    return {
+        "recipients": recipients,
+        "rate_limit": BROADCAST_RATE_LIMIT,
+        "workers": BROADCAST_WORKERS,
+        "elapsed_seconds": round(elapsed, 2),
+        "msgs_per_second": round(processed / elapsed, 2) if elapsed else 0.0,
+        "sent": counts.get(DELIVERY_SENT, 0),
+        "errors": counts.get(DELIVERY_FAILED, 0),
+        "blocked": counts.get(DELIVERY_UNREACHABLE, 0),
+        "progress_edits": api.stats.edits,
+        "flood_incidents": middleware.flood_incidents,
+        "latency_p50_ms": round(_percentile(middleware.latencies, 50) * 1000, 1),
+        "latency_p99_ms": round(_percentile(middleware.latencies, 99) * 1000, 1),
+    }
+
+
+async def main() -> None:
+    # 429 и так считаются в отчёте, предупреждения о каждой паузе только мешают читать вывод
+    logging.basicConfig(level=logging.ERROR)
+    await init_db()
+    results = []
+    for recipients in ARGS.recipients:
+        result = await run_once(recipients)
+        results.append(result)
+        if not ARGS.json:
+            print(
+                f"{result['recipients']:>7} получателей: {result['msgs_per_second']:>7} msgs/s, "
+                f"p50 {result['latency_p50_ms']} мс, p99 {result['latency_p99_ms']} мс, "
+                f"429: {result['flood_incidents']}, заблокировали: {result['blocked']}, "
+                f"правок прогресса: {result['progress_edits']}, {result['elapsed_seconds']} сек"
+            )
+    if ARGS.json:
+        print(json.dumps(results, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,188 @@
+"""Генератор синтетической базы клиентов для замеров поиска.
+
+Заполняет SQLite-файл кыргызскими и русскими именами, телефонами 996XXXXXXXXX
+(часть — в "сыром" виде, как их вводят руками) и историями визитов Vision.
+Одинаковый seed даёт одинаковую базу — замеры разных запусков сравнимы.
+
+    python -m benchmarks.dataset --clients 100000 --db /tmp/optic_100k.db
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Синтетическая база клиентов для бенчмарков поиска")
+    parser.add_argument("--clients", type=int, default=100_000)
+    parser.add_argument("--db", type=Path, required=True, help="путь к SQLite-файлу (будет перезаписан)")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    # Настройки читаются из окружения при импорте config, поэтому выставляем их до импорта модулей бота
+    ARGS = parse_args()
+    ARGS.db.unlink(missing_ok=True)
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{ARGS.db.resolve()}"
+    os.environ.setdefault("BOT_TOKEN", "123456:benchmark")
+    os.environ.setdefault("OWNER_IDS", "1")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import delete, insert  # noqa: E402
+
+from database.init_db import init_db  # noqa: E402
+from database.models import Person, Vision  # noqa: E402
+from database.session import AsyncSessionLocal  # noqa: E402
+from utils.phone import normalize_phone  # noqa: E402
+
+INSERT_BATCH = 5_000
+TELEGRAM_ID_BASE = 700_000_000
+
+MALE_NAMES = (
+    "Айбек", "Азамат", "Нурлан", "Эрмек", "Бакыт", "Темирлан", "Улан", "Чынгыз", "Мирлан", "Данияр",
+    "Тилек", "Эмир", "Адилет", "Бектур", "Жаныбек", "Канат", "Марат", "Руслан", "Самат", "Талант",
+    "Александр", "Дмитрий", "Сергей", "Андрей", "Иван", "Максим", "Николай", "Павел", "Артём", "Владимир",
+)
+FEMALE_NAMES = (
+    "Айгерим", "Асель", "Бермет", "Гүлнара", "Жылдыз", "Мээрим", "Чынара", "Айпери", "Нургүл", "Айжан",
+    "Бегимай", "Динара", "Элнура", "Камила", "Назира", "Өмүр", "Салтанат", "Толгонай", "Үмүт", "Айдана",
+    "Елена", "Ольга", "Наталья", "Татьяна", "Ирина", "Анна", "Мария", "Светлана", "Екатерина", "Юлия",
+)
+# Фамилии в мужской форме; женская — с окончанием "а"
+SURNAMES = (
+    "Асанов", "Жумабаев", "Садыков", "Токтогулов", "Абдыкадыров", "Мамытов", "Исаков", "Осмонов",
+    "Бакиров", "Сыдыков", "Турдубаев", "Кадыров", "Эсенов", "Алиев", "Мукашев", "Орозбеков",
+    "Шаршеев", "Бейшеев", "Кенжебаев", "Чотонов", "Иванов", "Петров", "Смирнов", "Кузнецов",
+    "Попов", "Соколов", "Морозов", "Волков", "Никитин", "Фёдоров",
+)
+OPERATOR_CODES = ("500", "501", "550", "555", "557", "700", "701", "705", "707", "770", "772", "775", "777", "990", "995", "999")
+LENS_TYPES = ("Однофокальные", "Прогрессивные", "Бифокальные", "Офисные", "Контактные", None)
+FRAME_MODELS = ("Ray-Ban RB5154", "Oakley OX8046", "Silhouette 5515", "Lindberg 9704", "Carrera 8821", "Без оправы", None)
+
+_TRANSLIT = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e", "ж": "zh", "з": "z", "и": "i",
+    "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "ң": "ng", "о": "o", "ө": "o", "п": "p", "р": "r",
+    "с": "s", "т": "t", "у": "u", "ү": "u", "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "sh",
+    "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+})
+
+
+def transliterate(text: str) -> str:
+    return text.lower().translate(_TRANSLIT)
+
+
+def _raw_phone(rng: random.Random, digits: str) -> str:
+    # Большинство номеров пришло из контакта Telegram (996...), остальные введены руками как попало
+    style = rng.random()
+    if style < 0.7:
+        return digits
+    if style < 0.85:
+        return "0" + digits[3:]
+    return f"+996 {digits[3:6]} {digits[6:9]} {digits[9:]}"
+
+
+def _visit_count(rng: random.Random) -> int:
+    # У большинства клиентов 0–3 визита, у постоянных — десятки
+    roll = rng.random()
+    if roll < 0.3:
+        return 0
+    if roll < 0.85:
+        return rng.randint(1, 3)
+    if roll < 0.99:
+        return rng.randint(4, 12)
+    return rng.randint(20, 60)
+
+
+def generate_people(count: int, seed: int = 42, start_id: int = 1):
+    """Пачки строк (persons, visions) для Core insert; id клиентов — подряд с start_id."""
+    rng = random.Random(seed)
+    phone_numbers = rng.sample(range(10**6), k=min(count, 10**6 - 1))
+    today = date.today()
+    persons, visions = [], []
+
+    for offset in range(count):
+        person_id = start_id + offset
+        female = rng.random() < 0.55
+        first_name = rng.choice(FEMALE_NAMES if female else MALE_NAMES)
+        last_name = rng.choice(SURNAMES) + ("а" if female else "")
+        # Номера не повторяются: код оператора + уникальные 6 цифр (при count > 1e6 — по кругу с другим кодом)
+        digits = f"996{OPERATOR_CODES[offset // len(phone_numbers) % len(OPERATOR_CODES)]}{phone_numbers[offset % len(phone_numbers)]:06d}"
+        has_phone = rng.random() < 0.9
+        raw_phone = _raw_phone(rng, digits) if has_phone else None
+
+        created_at = today - timedelta(days=rng.randint(0, 5 * 365))
+        visit_dates = sorted(
+            created_at + timedelta(days=rng.randint(0, (today - created_at).days))
+            for _ in range(_visit_count(rng))
+        )
+        persons.append({
+            "id": person_id,
+            "telegram_id": TELEGRAM_ID_BASE + person_id if rng.random() < 0.8 else None,
+            "username": f"{transliterate(first_name)}_{transliterate(last_name)}{rng.randint(1, 999)}" if rng.random() < 0.4 else None,
+            "first_name": first_name,
+            "last_name": last_name,
+            "phone": raw_phone,
+            # Core insert идёт мимо @validates, поэтому канонический номер считаем сами
+            "phone_digits": normalize_phone(raw_phone),
+            "age": rng.randint(7, 85) if rng.random() < 0.7 else None,
+            "role": "client",
+            "last_visit_date": visit_dates[-1] if visit_dates else None,
+        })
+        for visit_date in visit_dates:
+            sph = round(rng.uniform(-8, 4) * 4) / 4
+            visions.append({
+                "person_id": person_id,
+                "visit_date": visit_date,
+                "sph_r": sph, "cyl_r": round(rng.uniform(-3, 0) * 4) / 4, "axis_r": rng.randint(0, 180),
+                "sph_l": sph + rng.choice((-0.25, 0, 0.25)), "cyl_l": round(rng.uniform(-3, 0) * 4) / 4,
+                "axis_l": rng.randint(0, 180),
+                "pd": rng.choice((58.0, 60.0, 62.0, 64.0, 66.0)),
+                "lens_type": rng.choice(LENS_TYPES),
+                "frame_model": rng.choice(FRAME_MODELS),
+                "note": "Повторный визит" if rng.random() < 0.1 else None,
+            })
+
+        if len(persons) >= INSERT_BATCH:
+            yield persons, visions
+            persons, visions = [], []
+
+    if persons:
+        yield persons, visions
+
+
+async def seed_dataset(count: int, seed: int = 42) -> dict:
+    """Заменяет клиентов и их визиты в текущей БД (DATABASE_URL) синтетическими."""
+    started = time.perf_counter()
+    persons_total = visions_total = 0
+    async with AsyncSessionLocal() as session:
+        await session.execute(delete(Vision))
+        await session.execute(delete(Person))
+        for persons, visions in generate_people(count, seed):
+            await session.execute(insert(Person), persons)
+            if visions:
+                await session.execute(insert(Vision), visions)
+            persons_total += len(persons)
+            visions_total += len(visions)
+        await session.commit()
+    return {
+        "clients": persons_total,
+        "visions": visions_total,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+async def main() -> None:
+    await init_db()
+    stats = await seed_dataset(ARGS.clients, ARGS.seed)
+    print(f"{ARGS.db}: {stats['clients']} клиентов, {stats['visions']} визитов за {stats['seconds']} сек")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,199 @@
+"""Замер выгрузок в Excel на синтетической базе.
+
+Для каждого размера базы (по умолчанию 10k/100k клиентов) заполняет временную SQLite-базу
+генератором из benchmarks/dataset.py и меряет время выгрузки "клиенты + последняя запись зрения"
+тремя способами:
+
+* per_client — как было: поток клиентов и отдельный SELECT ... LIMIT 1 на каждого (N+1);
+* row_number — один запрос с ROW_NUMBER() OVER (PARTITION BY person_id ...);
+* single_query — один запрос с коррелированным подзапросом по индексу, как в боте.
+
+Каждый способ меряется дважды: только чтение строк из БД (.query) и вся выгрузка в .xlsx (.xlsx).
+Для справки — выгрузки всех клиентов и всех записей зрения.
+
+    python -m benchmarks.export_benchmark
+    python -m benchmarks.export_benchmark --sizes 10000 --repeat 5 --output after.json --compare before.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Настройки читаются из окружения при импорте config, поэтому выставляем их до импорта модулей бота
+_DB_DIR = tempfile.mkdtemp(prefix="optic_export_bench_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{Path(_DB_DIR) / 'bench.db'}"
+os.environ.setdefault("BOT_TOKEN", "123456:benchmark")
+os.environ["OWNER_IDS"] = "1"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Бенчмарк выгрузок в Excel")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3, help="повторов каждого замера")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, default=None, help="куда записать JSON-отчёт")
+    parser.add_argument("--compare", type=Path, default=None, help="JSON-отчёт прошлого запуска для сравнения")
+    parser.add_argument("--json", action="store_true", help="вывести отчёт JSON в stdout")
+    return parser.parse_args()
+
+
+ARGS = parse_args()
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import func, select  # noqa: E402
+
+from benchmarks.dataset import seed_dataset  # noqa: E402
+from database.init_db import init_db  # noqa: E402
+from database.models import Person, Vision  # noqa: E402
+from database.session import AsyncSessionLocal  # noqa: E402
+from services.export import (  # noqa: E402
+    CLIENT_COLUMNS, CLIENT_HEADERS, LAST_VISION_FIELDS, LAST_VISION_HEADERS, VISION_HEADERS, client_cells,
+    client_last_vision_cells, clients_last_vision_query, clients_query, stream_rows, vision_cells, visions_query,
+    write_xlsx,
+)
+
+
+async def _per_client_rows(session):
+    # Прежняя выгрузка: на каждого клиента — отдельный запрос его последней записи
+    async for batch in stream_rows(session, clients_query()):
+        rows = []
+        for client in batch:
+            vision = await session.scalar(
+                select(Vision)
+                .where(Vision.person_id == client.id)
+                .order_by(Vision.visit_date.desc(), Vision.id.desc())
+                .limit(1)
+            )
+            last = tuple(getattr(vision, field) for field in LAST_VISION_FIELDS) if vision else (None,) * len(LAST_VISION_FIELDS)
+            rows.append((*client, *last))
+        yield rows
+
+
+def _row_number_query():
+    ranked = select(
+        Vision,
+        func.row_number().over(
+            partition_by=Vision.person_id,
+            order_by=(Vision.visit_date.desc(), Vision.id.desc()),
+        ).label("visit_rank"),
+    ).subquery()
+    latest = select(ranked).where(ranked.c.visit_rank == 1).subquery()
+    return (
+        select(*CLIENT_COLUMNS, *(latest.c[field] for field in LAST_VISION_FIELDS))
+        .outerjoin(latest, latest.c.person_id == Person.id)
+        .order_by(Person.id)
+    )
+
+
+LAST_VISION_SOURCES = {
+    "per_client": _per_client_rows,
+    "row_number": lambda session: stream_rows(session, _row_number_query()),
+    "single_query": lambda session: stream_rows(session, clients_last_vision_query()),
+}
+OTHER_EXPORTS = {
+    "clients": (lambda session: stream_rows(session, clients_query()), CLIENT_HEADERS, client_cells),
+    "visions": (lambda session: stream_rows(session, visions_query()), VISION_HEADERS, vision_cells),
+}
+
+
+def _summary(samples: list[float], rows: int) -> dict:
+    samples_ms = sorted(s * 1000 for s in samples)
+    return {
+        "runs": len(samples_ms),
+        "rows": rows,
+        "p50_ms": round(statistics.median(samples_ms), 1),
+        "min_ms": round(samples_ms[0], 1),
+        "max_ms": round(samples_ms[-1], 1),
+    }
+
+
+async def _time_query(source) -> dict:
+    samples, rows = [], 0
+    for _ in range(ARGS.repeat):
+        async with AsyncSessionLocal() as session:
+            started = time.perf_counter()
+            rows = 0
+            async for batch in source(session):
+                rows += len(batch)
+            samples.append(time.perf_counter() - started)
+    return _summary(samples, rows)
+
+
+async def _time_xlsx(source, headers, cells) -> dict:
+    samples, rows = [], 0
+    for _ in range(ARGS.repeat):
+        async with AsyncSessionLocal() as session:
+            started = time.perf_counter()
+            path, rows = await write_xlsx(source(session), headers, cells, "Выгрузка")
+            samples.append(time.perf_counter() - started)
+        path.unlink(missing_ok=True)
+    return _summary(samples, rows)
+
+
+async def run_size(size: int) -> dict:
+    dataset = await seed_dataset(size, ARGS.seed)
+    cases = {}
+    for name, source in LAST_VISION_SOURCES.items():
+        cases[f"last_vision.{name}.query"] = await _time_query(source)
+        cases[f"last_vision.{name}.xlsx"] = await _time_xlsx(
+            source, CLIENT_HEADERS + LAST_VISION_HEADERS, client_last_vision_cells,
+        )
+    for name, (source, headers, cells) in OTHER_EXPORTS.items():
+        cases[f"{name}.xlsx"] = await _time_xlsx(source, headers, cells)
+    return {
+        "clients": dataset["clients"],
+        "visions": dataset["visions"],
+        "seed_seconds": dataset["seconds"],
+        "cases": cases,
+    }
+
+
+def _print_report(report: dict, baseline: dict | None) -> None:
+    for size, result in report["sizes"].items():
+        print(f"\n== {int(size):,} клиентов, {result['visions']:,} визитов (генерация {result['seed_seconds']} сек)")
+        old_cases = ((baseline or {}).get("sizes", {}).get(size) or {}).get("cases", {})
+        for name, stats in result["cases"].items():
+            line = f"  {name:<32} {stats['rows']:>8,} строк   p50 {stats['p50_ms'] / 1000:>8.2f} сек"
+            old = old_cases.get(name)
+            if old and old["p50_ms"]:
+                line += f"   было {old['p50_ms'] / 1000:>8.2f} сек ({stats['p50_ms'] / old['p50_ms']:.2f}x)"
+            print(line)
+
+
+async def main() -> None:
+    logging.basicConfig(level=logging.ERROR)
+    await init_db()
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "repeat": ARGS.repeat,
+        "seed": ARGS.seed,
+        "sizes": {},
+    }
+    for size in ARGS.sizes:
+        report["sizes"][str(size)] = await run_size(size)
+
+    baseline = json.loads(ARGS.compare.read_text(encoding="utf-8")) if ARGS.compare else None
+    if ARGS.output:
+        ARGS.output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    if ARGS.json:
+        print(json.dumps(report, ensure_ascii=False))
+    else:
+        _print_report(report, baseline)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
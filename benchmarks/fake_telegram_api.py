@@ -0,0 +1,179 @@
+"""Фейковый Telegram Bot API для нагрузочных замеров рассылок.
+
+Отвечает на sendMessage / sendPhoto / sendMediaGroup / editMessageText и т.п. с заданной задержкой,
+случайными 429 (retry_after) и 403 "bot was blocked". Реальным пользователям ничего не уходит.
+
+Отдельный запуск (бот можно направить на сервер через TELEGRAM_API_URL=http://127.0.0.1:8081):
+    python -m benchmarks.fake_telegram_api --port 8081 --latency-ms 40 --flood-probability 0.001
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+from aiohttp import web
+
+SEND_METHODS = {"sendmessage", "sendphoto", "sendvideo", "senddocument", "sendmediagroup"}
+
+
+@dataclass
+class FakeApiStats:
+    requests: int = 0
+    delivered: int = 0
+    edits: int = 0
+    blocked: int = 0
+    flood_responses: int = 0
+    methods: dict[str, int] = field(default_factory=dict)
+
+
+class FakeTelegramAPI:
+    """aiohttp-приложение, имитирующее Bot API.
+
+    - latency_ms / jitter_ms: задержка каждого ответа;
+    - flood_probability: доля запросов, на которые приходит 429 с retry_after;
+    - server_rate_limit: если отправок за последнюю секунду больше — 429, как у настоящего Telegram (0 — выключено);
+    - blocked_ratio: доля получателей, заблокировавших бота (детерминированно по chat_id, повтор даёт тот же 403).
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 40.0,
+        jitter_ms: float = 20.0,
+        flood_probability: float = 0.0,
+        retry_after: int = 1,
+        server_rate_limit: int = 30,
+        blocked_ratio: float = 0.02,
+        seed: int = 42,
+    ) -> None:
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.flood_probability = flood_probability
+        self.retry_after = retry_after
+        self.server_rate_limit = server_rate_limit
+        self.blocked_ratio = blocked_ratio
+        self.random = random.Random(seed)
+        self.stats = FakeApiStats()
+        self._recent_sends: deque[float] = deque()
+        self._flood_until = 0.0
+        self._message_id = 0
+
+        self.app = web.Application()
+        self.app.router.add_post("/bot{token}/{method}", self.handle)
+
+    def _is_blocked(self, chat_id: int) -> bool:
+        return (chat_id * 2654435761 % 10_000) < self.blocked_ratio * 10_000
+
+    def _flood_response(self) -> web.Response:
+        self.stats.flood_responses += 1
+        return web.json_response(
+            {
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            },
+            status=429,
+        )
+
+    def _check_flood(self) -> bool:
+        now = time.monotonic()
+        if now < self._flood_until:
+            return True
+        if self.flood_probability and self.random.random() < self.flood_probability:
+            self._flood_until = now + self.retry_after
+            return True
+        if self.server_rate_limit:
+            while self._recent_sends and now - self._recent_sends[0] > 1.0:
+                self._recent_sends.popleft()
+            if len(self._recent_sends) >= self.server_rate_limit:
+                self._flood_until = now + self.retry_after
+                return True
+            self._recent_sends.append(now)
+        return False
+
+    def _message(self, chat_id: int, text: str = "") -> dict:
+        self._message_id += 1
+        return {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "text": text,
+        }
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        params = await request.post()
+        self.stats.requests += 1
+        self.stats.methods[method] = self.stats.methods.get(method, 0) + 1
+
+        if method == "getupdates":
+            await asyncio.sleep(min(float(params.get("timeout", 0) or 0), 1.0))
+            return web.json_response({"ok": True, "result": []})
+        if method == "getme":
+            return web.json_response({"ok": True, "result": {
+                "id": 1, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot",
+            }})
+
+        delay = max(0.0, self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+        await asyncio.sleep(delay)
+
+        chat_id = int(params.get("chat_id", 0) or 0)
+        if method in SEND_METHODS:
+            if self._check_flood():
+                return self._flood_response()
+            if self._is_blocked(chat_id):
+                self.stats.blocked += 1
+                return web.json_response(
+                    {"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"},
+                    status=403,
+                )
+            self.stats.delivered += 1
+            if method == "sendmediagroup":
+                return web.json_response({"ok": True, "result": [self._message(chat_id)]})
+            return web.json_response({"ok": True, "result": self._message(chat_id, params.get("text", ""))})
+
+        if method == "editmessagetext":
+            self.stats.edits += 1
+            return web.json_response({"ok": True, "result": self._message(chat_id, params.get("text", ""))})
+
+        return web.json_response({"ok": True, "result": True})
+
+
+async def start_fake_api(api: FakeTelegramAPI, host: str = "127.0.0.1", port: int = 0) -> tuple[web.AppRunner, str]:
+    """Запускает сервер и возвращает (runner, base_url). port=0 — любой свободный порт."""
+    runner = web.AppRunner(api.app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{bound_port}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Фейковый Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=40.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--flood-probability", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--server-rate-limit", type=int, default=30)
+    parser.add_argument("--blocked-ratio", type=float, default=0.02)
+    args = parser.parse_args()
+
+    api = FakeTelegramAPI(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        flood_probability=args.flood_probability,
+        retry_after=args.retry_after,
+        server_rate_limit=args.server_rate_limit,
+        blocked_ratio=args.blocked_ratio,
+    )
+    web.run_app(api.app, host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
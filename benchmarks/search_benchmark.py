@@ -0,0 +1,277 @@
+"""Замеры поиска клиентов, профиля и листания визитов на синтетической базе.
+
+Для каждого размера базы (по умолчанию 1k/10k/100k клиентов) заполняет временную SQLite-базу
+генератором из benchmarks/dataset.py и гоняет настоящие функции бота:
+все формы запроса process_search (telegram_id, телефон в разных форматах, имя, префикс,
+транслит, опечатка, глубокая страница), показ профиля и листание записей зрения.
+Telegram подменён фейковым Bot API без задержки — меряется только работа бота и БД.
+
+    python -m benchmarks.search_benchmark
+    python -m benchmarks.search_benchmark --sizes 10000 --repeat 50 --output before.json
+    python -m benchmarks.search_benchmark --output after.json --compare before.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Настройки читаются из окружения при импорте config, поэтому выставляем их до импорта модулей бота
+_DB_DIR = tempfile.mkdtemp(prefix="optic_search_bench_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{Path(_DB_DIR) / 'bench.db'}"
+os.environ.setdefault("BOT_TOKEN", "123456:benchmark")
+os.environ["OWNER_IDS"] = "1"
+# Меряем сам поиск и сборку профиля, а не кэши (кэш карточек профиля меряется отдельным замером)
+os.environ["SEARCH_CACHE_SIZE"] = "0"
+os.environ["PROFILE_CACHE_SIZE"] = "0"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Бенчмарк поиска клиентов, профиля и листания визитов")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=20, help="повторов каждого замера")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, default=None, help="куда записать JSON-отчёт")
+    parser.add_argument("--compare", type=Path, default=None, help="JSON-отчёт прошлого запуска для сравнения")
+    parser.add_argument("--json", action="store_true", help="вывести отчёт JSON в stdout")
+    return parser.parse_args()
+
+
+ARGS = parse_args()
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+from aiogram.fsm.context import FSMContext  # noqa: E402
+from aiogram.fsm.storage.base import StorageKey  # noqa: E402
+from aiogram.fsm.storage.memory import MemoryStorage  # noqa: E402
+from aiogram.types import CallbackQuery, Message  # noqa: E402
+from sqlalchemy import func, select  # noqa: E402
+
+from benchmarks.dataset import FEMALE_NAMES, SURNAMES, seed_dataset, transliterate  # noqa: E402
+from benchmarks.fake_telegram_api import FakeTelegramAPI, start_fake_api  # noqa: E402
+from database.init_db import init_db  # noqa: E402
+from database.models import Person, Vision  # noqa: E402
+from database.session import AsyncSessionLocal  # noqa: E402
+from handlers.owner.crud.clients_router import show_client_profile  # noqa: E402
+from handlers.owner.crud.edit_and_delete import navigate_vision, view_all_visions  # noqa: E402
+from services.fuzzy_search import client_name_index  # noqa: E402
+from services.profiles import profile_cache  # noqa: E402
+from services.search import search_clients_page  # noqa: E402
+from services.visions import vision_nav_callback  # noqa: E402
+
+OWNER_ID = 1
+# Сколько страниц пролистать для замера "глубокой" страницы результатов
+DEEP_PAGE = 10
+VISION_PAGES = 10
+
+
+def _summary(samples: list[float]) -> dict:
+    samples_ms = sorted(s * 1000 for s in samples)
+    return {
+        "runs": len(samples_ms),
+        "mean_ms": round(statistics.fmean(samples_ms), 3),
+        "p50_ms": round(statistics.median(samples_ms), 3),
+        "p95_ms": round(samples_ms[min(len(samples_ms) - 1, int(len(samples_ms) * 0.95))], 3),
+        "max_ms": round(samples_ms[-1], 3),
+    }
+
+
+async def _timeit(call, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await call()
+        samples.append(time.perf_counter() - started)
+    return _summary(samples)
+
+
+async def _sample_client() -> Person:
+    # Клиент с телефоном и telegram_id — для точных запросов
+    async with AsyncSessionLocal() as session:
+        return await session.scalar(
+            select(Person)
+            .where(Person.phone_digits.is_not(None), Person.telegram_id.is_not(None))
+            .order_by(Person.id)
+            .limit(1)
+        )
+
+
+async def _client_with_most_visions() -> int:
+    async with AsyncSessionLocal() as session:
+        return await session.scalar(
+            select(Vision.person_id).group_by(Vision.person_id).order_by(func.count().desc()).limit(1)
+        )
+
+
+def _search_cases(client: Person) -> dict[str, str]:
+    digits = client.phone_digits
+    first_name, last_name = FEMALE_NAMES[0], SURNAMES[0] + "а"
+    return {
+        "telegram_id": str(client.telegram_id),
+        "phone_e164": digits,
+        "phone_local": "0" + digits[3:],
+        "phone_formatted": f"+996 ({digits[3:6]}) {digits[6:9]}-{digits[9:]}",
+        "prefix_2_letters": first_name[:2],
+        "first_name": first_name,
+        "full_name": f"{first_name} {last_name}",
+        "last_name_prefix": last_name[:4],
+        "translit": f"{transliterate(first_name).title()} {transliterate(last_name).title()}",
+        "typo": f"{first_name[:-2]}{first_name[-1]} {last_name[:-2]}{last_name[-1]}",
+        "no_match": "Щщщщщ",
+    }
+
+
+async def _search(query: str, cursor=None):
+    async with AsyncSessionLocal() as session:
+        return await search_clients_page(session, query, cursor)
+
+
+async def _deep_page_cursor(query: str):
+    page = await _search(query)
+    for _ in range(DEEP_PAGE - 1):
+        if not page.has_next:
+            return None
+        page = await _search(query, page.next_cursor)
+    return page.next_cursor
+
+
+def _message(bot: Bot) -> Message:
+    return Message.model_validate({
+        "message_id": 1,
+        "date": int(time.time()),
+        "chat": {"id": OWNER_ID, "type": "private"},
+        "from": {"id": OWNER_ID, "is_bot": False, "first_name": "Owner"},
+        "text": "benchmark",
+    }, context={"bot": bot})
+
+
+def _callback(bot: Bot, data: str) -> CallbackQuery:
+    return CallbackQuery.model_validate({
+        "id": "1",
+        "from": {"id": OWNER_ID, "is_bot": False, "first_name": "Owner"},
+        "chat_instance": "1",
+        "data": data,
+        "message": _message(bot).model_dump(by_alias=True, exclude_none=True),
+    }, context={"bot": bot})
+
+
+async def run_size(size: int, bot: Bot) -> dict:
+    dataset = await seed_dataset(size, ARGS.seed)
+    started = time.perf_counter()
+    await client_name_index.build()
+    index_seconds = time.perf_counter() - started
+
+    client = await _sample_client()
+    cases = {}
+    for name, query in _search_cases(client).items():
+        cases[f"search.{name}"] = await _timeit(lambda q=query: _search(q), ARGS.repeat)
+
+    deep_query = FEMALE_NAMES[0]
+    cursor = await _deep_page_cursor(deep_query)
+    if cursor is not None:
+        cases[f"search.first_name_page_{DEEP_PAGE + 1}"] = await _timeit(lambda: _search(deep_query, cursor), ARGS.repeat)
+
+    state = FSMContext(storage=MemoryStorage(), key=StorageKey(bot_id=bot.id, chat_id=OWNER_ID, user_id=OWNER_ID))
+    person_id = await _client_with_most_visions()
+    async with AsyncSessionLocal() as session:
+        person = await session.get(Person, person_id)
+    cases["profile.render"] = await _timeit(lambda: show_client_profile(_message(bot), person, state, bot), ARGS.repeat)
+    profile_cache.maxsize = 1
+    cases["profile.render_cached"] = await _timeit(lambda: show_client_profile(_message(bot), person, state, bot), ARGS.repeat)
+    profile_cache.maxsize = 0
+    profile_cache.clear()
+
+    cases["vision.open"] = await _timeit(
+        lambda: view_all_visions(_callback(bot, f"view_all_visions_{person_id}"), state, bot), ARGS.repeat
+    )
+
+    async with AsyncSessionLocal() as session:
+        visions = (await session.scalars(
+            select(Vision)
+            .where(Vision.person_id == person_id)
+            .order_by(Vision.visit_date.desc(), Vision.id.desc())
+            .limit(VISION_PAGES)
+        )).all()
+
+    async def flip_pages():
+        # Кнопка ▶ с каждой из первых записей — как если бы владелец листал подряд
+        for index, vision in enumerate(visions):
+            await navigate_vision(_callback(bot, vision_nav_callback("vision_next_", index, vision)), state, bot)
+
+    flips = await _timeit(flip_pages, max(1, ARGS.repeat // 5))
+    cases["vision.next_page"] = {k: round(v / len(visions), 3) if k.endswith("_ms") else v for k, v in flips.items()}
+
+    async with AsyncSessionLocal() as session:
+        visions_of_person = await session.scalar(select(func.count()).where(Vision.person_id == person_id))
+
+    return {
+        "clients": dataset["clients"],
+        "visions": dataset["visions"],
+        "seed_seconds": dataset["seconds"],
+        "fuzzy_index_seconds": round(index_seconds, 2),
+        "profile_visions": visions_of_person,
+        "cases": cases,
+    }
+
+
+def _print_report(report: dict, baseline: dict | None) -> None:
+    for size, result in report["sizes"].items():
+        print(
+            f"\n== {int(size):,} клиентов, {result['visions']:,} визитов "
+            f"(генерация {result['seed_seconds']} сек, индекс имён {result['fuzzy_index_seconds']} сек)"
+        )
+        old_cases = ((baseline or {}).get("sizes", {}).get(size) or {}).get("cases", {})
+        for name, stats in result["cases"].items():
+            line = f"  {name:<28} p50 {stats['p50_ms']:>9.3f} мс   p95 {stats['p95_ms']:>9.3f} мс"
+            old = old_cases.get(name)
+            if old and old["p50_ms"]:
+                line += f"   было {old['p50_ms']:>9.3f} мс ({stats['p50_ms'] / old['p50_ms']:.2f}x)"
+            print(line)
+
+
+async def main() -> None:
+    logging.basicConfig(level=logging.ERROR)
+    await init_db()
+
+    api = FakeTelegramAPI(latency_ms=0, jitter_ms=0, flood_probability=0, server_rate_limit=0, blocked_ratio=0)
+    runner, base_url = await start_fake_api(api)
+    bot = Bot(token=os.environ["BOT_TOKEN"], session=AiohttpSession(api=TelegramAPIServer.from_base(base_url)))
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "repeat": ARGS.repeat,
+        "seed": ARGS.seed,
+        "sizes": {},
+    }
+    try:
+        for size in ARGS.sizes:
+            report["sizes"][str(size)] = await run_size(size, bot)
+    finally:
+        await bot.session.close()
+        await runner.cleanup()
+
+    baseline = json.loads(ARGS.compare.read_text(encoding="utf-8")) if ARGS.compare else None
+    if ARGS.output:
+        ARGS.output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    if ARGS.json:
+        print(json.dumps(report, ensure_ascii=False))
+    else:
+        _print_report(report, baseline)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
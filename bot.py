@@ -7,6 +7,8 @@ from pathlib import Path
 
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.enums import ParseMode
 
 from database.init_db import init_db
@@ -15,6 +17,7 @@ from database.init_db import init_db
 from handlers.owner.dev_panel_router import dev_panel_router
 from handlers.start import start_router
 from handlers.client import client_router
+from handlers.inline_search import inline_search_router
 
 from handlers.owner.owner_main import owner_main_router
 from handlers.owner.client_button import owner_content_router
@@ -37,11 +40,16 @@ from middlewares.private import PrivateChatOnlyMiddleware
 from keyboards.client_kb import set_commands
 from middlewares.private import PrivateChatOnlyMiddleware
 from services.content import get_bot_content, init_bot_content
-from config import BOT_TOKEN, OWNER_IDS, AUTO_BACKUP_INTERVAL_HOURS, AUTO_BACKUP_TARGET_IDS
+from config import BOT_TOKEN, OWNER_IDS, AUTO_BACKUP_INTERVAL_HOURS, AUTO_BACKUP_TARGET_IDS, TELEGRAM_API_URL
 from middlewares.anti_spam import RateLimitMiddleware
 from middlewares.metrics import MetricsMiddleware
+from middlewares.db_session import DbSessionMiddleware
+from middlewares.roles import RoleMiddleware
 from utils.owner_alerts import OwnerAlertHandler
 from utils.backup_service import auto_backup_worker
+from services.broadcast import broadcast_worker
+from services.broadcast_scheduler import broadcast_scheduler
+from services.fuzzy_search import client_name_index
 
 
 # Настройка логирования
@@ -74,9 +82,22 @@ async def main():
         logger.error(f"Ошибка инициализации БД: {e}", exc_info=True)
         return
 
+    # Индекс нечёткого поиска по именам клиентов (в памяти, дальше обновляется событиями ORM).
+    # Без него бот работает: поиск остаётся точным и полнотекстовым, без опечаток и транслита
+    try:
+        await client_name_index.build()
+    except Exception as e:
+        logger.error(f"Не удалось построить индекс нечёткого поиска: {e}", exc_info=True)
+
     # 2. Создание бота
+    session = None
+    if TELEGRAM_API_URL:
+        logger.info(f"Используется Bot API сервер: {TELEGRAM_API_URL}")
+        session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL))
+
     bot = Bot(
         token=str(BOT_TOKEN),
+        session=session,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
     owner_alert_handler.bind_bot(bot)
@@ -116,13 +137,20 @@ async def main():
     metrics_middleware = MetricsMiddleware()
     dp.message.middleware(metrics_middleware)
     dp.callback_query.middleware(metrics_middleware)
+    dp.inline_query.middleware(metrics_middleware)
 
 
     dp.update.middleware(PrivateChatOnlyMiddleware())
+    # Одна ленивая сессия БД на апдейт (data["db_session"]) со счётчиком соединений и транзакций
+    dp.update.middleware(DbSessionMiddleware())
+    # Роль отправителя — один раз на апдейт из кэша в памяти, в хендлерах доступна как user_role
+    dp.update.middleware(RoleMiddleware())
     # 6. Подключение роутеров (ВАЖНО: порядок!)
     # Сначала общие
     dp.include_router(start_router)
     dp.include_router(client_router)
+    # Inline-поиск клиентов и /client — до роутеров с FSM-состояниями, чтобы команда работала из любого шага
+    dp.include_router(inline_search_router)
 
     # Потом владелец
     dp.include_router(owner_main_router)
@@ -146,20 +174,23 @@ async def main():
     auto_backup_task = asyncio.create_task(
         auto_backup_worker(bot, target_ids=AUTO_BACKUP_TARGET_IDS, interval_hours=AUTO_BACKUP_INTERVAL_HOURS)
     )
+    broadcast_task = asyncio.create_task(broadcast_worker(bot))
+    scheduler_task = asyncio.create_task(broadcast_scheduler.run())
 
     # 7. Запуск поллинга
     try:
         logger.info("Бот запущен! Ожидание обновлений...")
         await bot.delete_webhook(drop_pending_updates=True)
-        await dp.start_polling(bot, allowed_updates=["message", "callback_query"])
+        await dp.start_polling(bot, allowed_updates=["message", "callback_query", "inline_query"])
     except Exception as e:
         logger.error(f"Ошибка поллинга: {e}", exc_info=True)
     finally:
-        auto_backup_task.cancel()
-        try:
-            await auto_backup_task
-        except asyncio.CancelledError:
-            pass
+        for task in (auto_backup_task, broadcast_task, scheduler_task):
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
         await bot.session.close()
         logger.info("Бот остановлен")
 
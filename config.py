@@ -40,4 +40,20 @@ OWNER_IDS = _parse_id_list(_get_required_env("OWNER_IDS"))
 
 
 AUTO_BACKUP_INTERVAL_HOURS = int(os.getenv("AUTO_BACKUP_INTERVAL_HOURS", "24"))
-AUTO_BACKUP_TARGET_IDS = _parse_id_list(os.getenv("AUTO_BACKUP_TARGET_IDS", "")) or OWNER_IDS
\ No newline at end of file
+AUTO_BACKUP_TARGET_IDS = _parse_id_list(os.getenv("AUTO_BACKUP_TARGET_IDS", "")) or OWNER_IDS
+
+
+# Рассылки: глобальный лимит Telegram ~30 сообщений/сек на бота, держим небольшой запас
+BROADCAST_RATE_LIMIT = float(os.getenv("BROADCAST_RATE_LIMIT", "25"))
+BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", "8"))
+
+# Свой адрес Bot API (локальный telegram-bot-api или фейковый сервер из benchmarks/); пусто — api.telegram.org
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
+
+# Кэш результатов поиска клиентов: повторный запрос ("назад к поиску" и тот же текст) не идёт в БД
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "60"))
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "256"))
+
+# Кэш готовых карточек профиля клиента; сбрасывается при изменении клиента или его записей зрения
+PROFILE_CACHE_TTL_SECONDS = float(os.getenv("PROFILE_CACHE_TTL_SECONDS", "600"))
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "1024"))
@@ -0,0 +1,107 @@
+import logging
+import re
+from typing import Optional
+
+from sqlalchemy import column, func, literal, literal_column, or_, select, table, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.sql import Subquery
+
+from config import DATABASE_URL
+from .models import Person
+
+logger = logging.getLogger(__name__)
+
+# Полнотекстовый индекс клиентов (SQLite FTS5, external content — данные не дублируются).
+# prefix='2 3' — готовые префиксные индексы, поэтому "айб*" не сканирует весь словарь.
+PERSONS_FTS_COLUMNS = ("first_name", "last_name", "username", "phone")
+# Веса bm25 в порядке колонок: совпадение по имени важнее, чем по username и телефону
+PERSONS_FTS_WEIGHTS = (3.0, 3.0, 1.5, 1.0)
+
+_columns = ", ".join(PERSONS_FTS_COLUMNS)
+_new_values = ", ".join(f"new.{name}" for name in PERSONS_FTS_COLUMNS)
+_old_values = ", ".join(f"old.{name}" for name in PERSONS_FTS_COLUMNS)
+
+_PERSONS_FTS_DDL = (
+    f"""
+    CREATE VIRTUAL TABLE persons_fts USING fts5(
+        {_columns},
+        content='persons', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS persons_fts_ai AFTER INSERT ON persons BEGIN
+        INSERT INTO persons_fts(rowid, {_columns}) VALUES (new.id, {_new_values});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS persons_fts_ad AFTER DELETE ON persons BEGIN
+        INSERT INTO persons_fts(persons_fts, rowid, {_columns}) VALUES ('delete', old.id, {_old_values});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS persons_fts_au AFTER UPDATE OF {_columns} ON persons BEGIN
+        INSERT INTO persons_fts(persons_fts, rowid, {_columns}) VALUES ('delete', old.id, {_old_values});
+        INSERT INTO persons_fts(rowid, {_columns}) VALUES (new.id, {_new_values});
+    END
+    """,
+)
+
+persons_fts = table("persons_fts", column("rowid"), *(column(name) for name in PERSONS_FTS_COLUMNS))
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def ensure_persons_fts(conn: Connection) -> None:
+    """Создаёт FTS-таблицу и триггеры синхронизации (только SQLite); при первом создании индексирует всех клиентов."""
+    if conn.dialect.name != "sqlite":
+        return
+
+    exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'persons_fts'")).first()
+    if not exists:
+        conn.execute(text(_PERSONS_FTS_DDL[0]))
+    for ddl in _PERSONS_FTS_DDL[1:]:
+        conn.execute(text(ddl))
+    if not exists:
+        conn.execute(text("INSERT INTO persons_fts(persons_fts) VALUES ('rebuild')"))
+        logger.info("Создан полнотекстовый индекс клиентов persons_fts")
+
+
+def build_match_query(raw: str) -> Optional[str]:
+    """Строка поиска → выражение MATCH: каждое слово как префикс, все слова обязательны.
+
+    Слова берутся в кавычки, поэтому спецсимволы FTS5 (AND, OR, *, :) в запросе ничего не ломают.
+    """
+    words = _WORD_RE.findall(raw)
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def ranked_person_ids(raw: str, limit: Optional[int] = None) -> Optional[Subquery]:
+    """Подзапрос (person_id, rank) по FTS-индексу, лучшие совпадения по bm25 первыми.
+
+    Без limit — все совпадения: так подзапрос используется для постраничной выдачи по (rank, id).
+    """
+    match = build_match_query(raw)
+    if match is None:
+        return None
+
+    if not DATABASE_URL.startswith("sqlite"):
+        # FTS5 есть только в SQLite — на других БД прежний поиск по подстроке, без ранжирования.
+        # Ранг отрицательный, как у bm25: полнотекстовые совпадения всегда идут раньше нечётких
+        query = raw.strip()
+        ranked = (
+            select(Person.id.label("person_id"), literal(-1.0).label("rank"))
+            .where(or_(*(getattr(Person, name).ilike(f"%{query}%") for name in PERSONS_FTS_COLUMNS)))
+        )
+    else:
+        rank = func.bm25(literal_column("persons_fts"), *PERSONS_FTS_WEIGHTS)
+        ranked = (
+            select(persons_fts.c.rowid.label("person_id"), rank.label("rank"))
+            .where(literal_column("persons_fts").op("MATCH")(match))
+        )
+
+    if limit is not None:
+        ranked = ranked.order_by(ranked.selected_columns.rank).limit(limit)
+    return ranked.subquery("fts")
@@ -1,11 +1,88 @@
+import logging
+
+from sqlalchemy import bindparam, inspect, select, text, update
+from sqlalchemy.engine import Connection
 from sqlalchemy.ext.asyncio import AsyncEngine
 
 from .engine import async_engine
+from .fts import ensure_persons_fts
 from .base import Base
-from .models import Person, Vision
+from .models import Person, Vision, BroadcastJob, BroadcastDelivery
   # ОБЯЗАТЕЛЬНО: чтобы модели зарегистрировались
+from utils.phone import normalize_phone
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 1000
+# Одноколоночные индексы, которые перекрыты составными (ix_visions_person_visit, ix_persons_role_full_name):
+# лишняя запись на каждый INSERT, а планировщик может выбрать их и досортировать выдачу
+STALE_INDEXES = ("ix_visions_person_id", "ix_persons_role")
+
+
+def _sync_schema(conn: Connection) -> None:
+    # create_all не трогает уже существующие таблицы, поэтому новые колонки и индексы
+    # добавляем сами (только nullable-колонки — для SQLite это безопасный ALTER TABLE)
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable or column.computed is not None:
+                continue
+            column_type = column.type.compile(dialect=conn.dialect)
+            conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}'))
+            logger.info("Добавлена колонка %s.%s", table.name, column.name)
+
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+    for name in STALE_INDEXES:
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+def _backfill_phone_digits(conn: Connection) -> None:
+    # Разовая миграция: канонический номер для клиентов, сохранённых до появления phone_digits.
+    # Пачками по id, чтобы не держать в памяти всю таблицу; на заполненной базе — один пустой запрос
+    last_id = 0
+    filled = 0
+    while True:
+        rows = conn.execute(
+            select(Person.id, Person.phone)
+            .where(Person.id > last_id, Person.phone.is_not(None), Person.phone_digits.is_(None))
+            .order_by(Person.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        candidates = {person_id: normalize_phone(phone) for person_id, phone in rows}
+        taken = set(conn.scalars(
+            select(Person.phone_digits).where(Person.phone_digits.in_({d for d in candidates.values() if d}))
+        ))
+        values = []
+        for person_id, phone in rows:
+            digits = candidates[person_id]
+            if digits is None:
+                continue
+            if digits in taken:
+                # Один номер в разных форматах у двух клиентов — уникальный индекс не даст записать второй
+                logger.warning("Телефон %s клиента id=%s уже есть у другого клиента, phone_digits не заполнен", phone, person_id)
+                continue
+            taken.add(digits)
+            values.append({"person_id": person_id, "phone_digits": digits})
+
+        if values:
+            persons = Person.__table__
+            conn.execute(update(persons).where(persons.c.id == bindparam("person_id")), values)
+            filled += len(values)
+
+    if filled:
+        logger.info("Заполнен phone_digits у %s клиентов", filled)
 
 
 async def init_db(engine: AsyncEngine = async_engine) -> None:
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_sync_schema)
+        await conn.run_sync(_backfill_phone_digits)
+        await conn.run_sync(ensure_persons_fts)
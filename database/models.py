@@ -1,16 +1,29 @@
 from datetime import datetime, timezone, timedelta, date
 from typing import Optional
 from sqlalchemy import BigInteger, Boolean, Column, Computed, Date, DateTime, Float, Index, Integer, String, ForeignKey, Text, func
-from sqlalchemy.orm import relationship, Mapped, mapped_column
+from sqlalchemy.orm import relationship, Mapped, mapped_column, validates
 
 from database.base import Base
+from utils.phone import normalize_phone
+
+KG_TIMEZONE = timezone(timedelta(hours=6))
 
 # Функция для получения текущего времени в Бишкеке (UTC+6)
 def get_kg_time():
-    return datetime.now(timezone(timedelta(hours=6)))
+    return datetime.now(KG_TIMEZONE)
+
+# SQLite возвращает datetime без tzinfo, хотя сохраняли время UTC+6
+def as_kg_time(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=KG_TIMEZONE)
+    return value.astimezone(KG_TIMEZONE)
 
 class Person(Base):
     __tablename__ = "persons"
+    __table_args__ = (
+        # Список админов: WHERE role = 'admin' ORDER BY full_name — без сортировки во временном B-дереве
+        Index("ix_persons_role_full_name", "role", "full_name"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
 
@@ -36,15 +49,21 @@ class Person(Base):
     phone: Mapped[Optional[str]] = mapped_column(
         String, unique=True, nullable=True, index=True
     )
+    # Тот же номер в каноническом виде (цифры E.164: 996XXXXXXXXX) — по нему ищут и проверяют дубликаты.
+    # Заполняется автоматически при любой записи phone, см. _set_phone_digits
+    phone_digits: Mapped[Optional[str]] = mapped_column(
+        String, unique=True, nullable=True, index=True
+    )
 
-    age: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
-    role: Mapped[str] = mapped_column(String, nullable=False, default="client", index=True)
+    age: Mapped[Optional[int]] = mapped_column(Integer, nullable=True, index=True)
+    role: Mapped[str] = mapped_column(String, nullable=False, default="client")
 
     # Используем default=get_kg_time для записи времени UTC+6
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         default=get_kg_time, 
-        nullable=False
+        nullable=False,
+        index=True
     )
 
     updated_at: Mapped[datetime] = mapped_column(
@@ -54,20 +73,36 @@ class Person(Base):
         nullable=False
     )
 
-    last_visit_date: Mapped[Optional[date]] = mapped_column(Date, nullable=True)
+    last_visit_date: Mapped[Optional[date]] = mapped_column(Date, nullable=True, index=True)
+
+    # Когда рассылка выяснила, что бот заблокирован или чат удалён; такие клиенты не получают рассылки
+    unreachable_since: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
 
     visions: Mapped[list["Vision"]] = relationship(
         "Vision", back_populates="person", cascade="all, delete-orphan"
     )
+
+    @validates("phone")
+    def _set_phone_digits(self, key: str, value: Optional[str]) -> Optional[str]:
+        self.phone_digits = normalize_phone(value)
+        return value
+
+
 class Vision(Base):
     __tablename__ = "visions"
+    __table_args__ = (
+        # Сегмент рассылки "линзы:X": person_id IN (SELECT person_id FROM visions WHERE lens_type = ?)
+        Index("ix_visions_lens_type_person", "lens_type", "person_id"),
+        # Записи клиента от новых к старым: WHERE person_id = ? ORDER BY visit_date DESC, id DESC LIMIT k —
+        # профиль, листание записей (keyset по (visit_date, id)), последняя запись в рассылке и выгрузке
+        Index("ix_visions_person_visit", "person_id", "visit_date", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
 
     person_id: Mapped[int] = mapped_column(
         ForeignKey("persons.id", ondelete="CASCADE"),
-        nullable=False,
-        index=True
+        nullable=False
     )
 
     visit_date: Mapped[date] = mapped_column(Date, nullable=False, index=True)
@@ -104,4 +139,49 @@ class BotContent(Base):
     value: Mapped[str] = mapped_column(Text, nullable=False)
 
 
+class BroadcastJob(Base):
+    __tablename__ = "broadcast_jobs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    text: Mapped[str] = mapped_column(Text, nullable=False)
+    # JSON-список вложений [{"type": "photo", "file_id": "..."}]; text тогда используется как подпись
+    media: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    # scheduled → pending → running → done / cancelled
+    status: Mapped[str] = mapped_column(String, nullable=False, default="pending", index=True)
+    # Время запуска (Бишкек) для запланированных рассылок и период повтора: daily / weekly
+    scheduled_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    repeat: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    # JSON-фильтр аудитории (services.recipients.BroadcastSegment); пусто — все клиенты
+    segment: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    requested_by: Mapped[int] = mapped_column(Integer, nullable=False)
+    progress_message_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    total: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=get_kg_time, nullable=False)
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    deliveries: Mapped[list["BroadcastDelivery"]] = relationship(
+        "BroadcastDelivery", back_populates="job", cascade="all, delete-orphan"
+    )
+
+
+class BroadcastDelivery(Base):
+    __tablename__ = "broadcast_deliveries"
+    __table_args__ = (
+        # Воркер выбирает очередную пачку: WHERE job_id = ? AND status = 'pending' ORDER BY id
+        Index("ix_broadcast_deliveries_job_status", "job_id", "status", "id"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    job_id: Mapped[int] = mapped_column(ForeignKey("broadcast_jobs.id", ondelete="CASCADE"), nullable=False)
+    telegram_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    # Текст по персональному шаблону; пусто — общий текст рассылки
+    text: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    # pending → sending → sent / failed / unreachable; cancelled — рассылку остановили до отправки
+    status: Mapped[str] = mapped_column(String, nullable=False, default="pending")
+    updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
 
+    job: Mapped["BroadcastJob"] = relationship("BroadcastJob", back_populates="deliveries")
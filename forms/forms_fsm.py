@@ -30,6 +30,8 @@ class OwnerBroadcastStates(StatesGroup):
     viewing_profile = State()               # просмотр профиля (data: person_id)
     waiting_message_text = State()          # ожидание текста сообщения (data: person_id)
     waiting_broadcast_text = State()  # ожидание текста рассылки (data: list of person_ids)
+    waiting_segment = State()         # ожидание условий сегмента аудитории
+    waiting_schedule_time = State()   # ожидание даты/времени запланированной рассылки
 
 class OwnerClientsStates(StatesGroup):
     clients_menu = State()           # главное меню клиентов
@@ -1,13 +1,17 @@
+from typing import Optional
+
 from aiogram import Router, F, Bot
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.exceptions import TelegramBadRequest
 
-from sqlalchemy import select, or_
+from sqlalchemy import select
 
 from database.models import Person, Vision
 from database.session import AsyncSessionLocal
-from config import OWNER_IDS
+from services.search import search_clients_page
+from keyboards.search_kb import get_search_results_keyboard, show_search_results_page
+from middlewares.roles import STAFF_ROLES
 from forms.forms_fsm import AdminMainStates, AdminBroadcastStates
 from handlers.owner.crud.clients_router import show_client_profile
 from keyboards.admin_kb import get_admin_main_keyboard  # если клавиатура админа отдельная
@@ -16,35 +20,12 @@ admin_broadcast_router = Router()
 
 
 
-async def has_admin_access(user_id: int) -> bool:
-    """
-    Проверяет, имеет ли пользователь права администратора или владельца.
-    - Если user_id в OWNER_IDS → доступ есть (даже если role не "owner").
-    - Если role в БД == "admin" или "owner" → доступ есть.
-    """
-    if user_id in OWNER_IDS:
-        return True
-
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(Person.role).where(Person.telegram_id == user_id)
-        )
-        role = result.scalar_one_or_none()
-        return role in ("admin", "owner")
-
-def normalize_phone(input_str: str) -> str | None:
-    digits = ''.join(filter(str.isdigit, input_str))
-    if len(digits) == 10 and digits.startswith('0'):
-        return '996' + digits[1:]
-    elif len(digits) == 12 and digits.startswith('996'):
-        return digits
-    return None
+def has_admin_access(user_role: Optional[str]) -> bool:
+    return user_role in STAFF_ROLES
 
 @admin_broadcast_router.callback_query(AdminMainStates.admin_menu, F.data == "admin_broadcast_one")
-async def start_broadcast_one(callback: CallbackQuery, message: Message, state: FSMContext, bot: Bot):
-    user_id = message.from_user.id
-
-    if not await has_admin_access(user_id):
+async def start_broadcast_one(callback: CallbackQuery, message: Message, state: FSMContext, bot: Bot, user_role: Optional[str]):
+    if not has_admin_access(user_role):
         await message.answer("❌ Доступ запрещён.")
         await state.clear()
         return
@@ -67,10 +48,8 @@ async def start_broadcast_one(callback: CallbackQuery, message: Message, state:
 
 # Отмена поиска
 @admin_broadcast_router.callback_query(AdminBroadcastStates.waiting_search_query, F.data == "admin_cancel_broadcast")
-async def cancel_broadcast(callback: CallbackQuery, message: Message, state: FSMContext, bot: Bot):
-    user_id = message.from_user.id
-
-    if not await has_admin_access(user_id):
+async def cancel_broadcast(callback: CallbackQuery, message: Message, state: FSMContext, bot: Bot, user_role: Optional[str]):
+    if not has_admin_access(user_role):
         await message.answer("❌ Доступ запрещён.")
         await state.clear()
         return
@@ -91,10 +70,8 @@ async def cancel_broadcast(callback: CallbackQuery, message: Message, state: FSM
 
 # Поиск клиента
 @admin_broadcast_router.message(AdminBroadcastStates.waiting_search_query)
-async def process_search(message: Message, state: FSMContext, bot: Bot):
-    user_id = message.from_user.id
-
-    if not await has_admin_access(user_id):
+async def process_search(message: Message, state: FSMContext, bot: Bot, user_role: Optional[str]):
+    if not has_admin_access(user_role):
         await message.answer("❌ Доступ запрещён.")
         await state.clear()
         return
@@ -106,31 +83,12 @@ async def process_search(message: Message, state: FSMContext, bot: Bot):
         return
 
     async with AsyncSessionLocal() as session:
-        conditions = []
-
-        # По telegram_id
-        if query.isdigit() and len(query) > 8:  # telegram_id обычно длиннее
-            conditions.append(Person.telegram_id == int(query))
-
-        # По телефону
-        normalized = normalize_phone(query)
-        if normalized:
-            conditions.append(Person.phone == normalized)
-
-        # По имени/фамилии
-        if query:
-            conditions.append(or_(
-                Person.first_name.ilike(f"%{query}%"),
-                Person.last_name.ilike(f"%{query}%"),
-                Person.full_name.ilike(f"%{query}%")
-            ))
-
-        result = await session.execute(
-            select(Person).where(or_(*conditions)).limit(15)
-        )
-        persons = result.scalars().all()
+        page = await search_clients_page(session, query, scope="admin")
+        results = page.results
+        # Единственное совпадение — сразу открываем профиль
+        person = await session.get(Person, results[0].id) if len(results) == 1 else None
 
-    if not persons:
+    if not results:
         await message.answer(
             "❌ Клиент не найден. Попробуйте другой запрос.",
             reply_markup=InlineKeyboardMarkup(inline_keyboard=[
@@ -139,29 +97,33 @@ async def process_search(message: Message, state: FSMContext, bot: Bot):
         )
         return
 
-    if len(persons) == 1:
-        await show_profile(message, persons[0], state, bot)
+    if person is not None:
+        await show_profile(message, person, state, bot)
         return
 
-    # Несколько совпадений — список
-    kb = []
-    for p in persons:
-        name = p.full_name or p.phone or str(p.telegram_id)
-        kb.append([InlineKeyboardButton(text=name, callback_data=f"admin_profile_{p.id}")])
-
-    kb.append([InlineKeyboardButton(text="◀ Отмена", callback_data="admin_cancel_broadcast")])
-
+    # Несколько совпадений — список по страницам, запрос нужен для кнопок "Назад"/"Далее"
+    await state.update_data(search_query=query)
     await message.answer(
-        f"🔍 Найдено {len(persons)} клиентов. Выберите:",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=kb)
+        "🔍 Найденные клиенты. Выберите:",
+        reply_markup=get_search_results_keyboard(page, "admin_profile_", "admin_search_page_", "admin_cancel_broadcast")
     )
+
+
+# Листание результатов поиска
+@admin_broadcast_router.callback_query(AdminBroadcastStates.waiting_search_query, F.data.startswith("admin_search_page_"))
+async def search_results_page(callback: CallbackQuery, state: FSMContext, user_role: Optional[str]):
+    if not has_admin_access(user_role):
+        await callback.answer("Доступ запрещён", show_alert=True)
+        return
+    await show_search_results_page(callback, state, "admin_profile_", "admin_search_page_", "admin_cancel_broadcast", scope="admin")
+
 # Показ профиля клиента
 async def show_profile(trigger, person: Person, state: FSMContext, bot: Bot):
     async with AsyncSessionLocal() as session:
         last_vision = await session.execute(
             select(Vision)
             .where(Vision.person_id == person.id)
-            .order_by(Vision.visit_date.desc())
+            .order_by(Vision.visit_date.desc(), Vision.id.desc())
             .limit(1)
         )
         last_vision = last_vision.scalar_one_or_none()
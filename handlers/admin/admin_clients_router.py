@@ -1,42 +1,31 @@
 # Новый файл: routers/admin_clients_router.py
 
+from typing import Optional
+
 from aiogram import Router, F, Bot
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.exceptions import TelegramBadRequest
 
-from sqlalchemy import select, or_
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database.models import Person, Vision
+from database.models import Person
 from database.session import AsyncSessionLocal
-from config import OWNER_IDS
+from services.profiles import ClientProfile, ProfileCard, profile_cache
+from services.search import search_clients_page
+from keyboards.search_kb import get_search_results_keyboard, show_search_results_page
+from middlewares.roles import STAFF_ROLES
 from forms.forms_fsm import AdminClientsStates, AdminMainStates
 from keyboards.admin_kb import get_admin_main_keyboard
 
 admin_clients_router = Router()
 
-async def has_admin_access(user_id: int) -> bool:
-    if user_id in OWNER_IDS:
-        return True
-
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(Person.role).where(Person.telegram_id == user_id)
-        )
-        role = result.scalar_one_or_none()
-        return role in ("admin", "owner")
-
-def normalize_phone(input_str: str) -> str | None:
-    digits = ''.join(filter(str.isdigit, input_str))
-    if len(digits) == 10 and digits.startswith('0'):
-        return '996' + digits[1:]
-    elif len(digits) == 12 and digits.startswith('996'):
-        return digits
-    return None
+def has_admin_access(user_role: Optional[str]) -> bool:
+    return user_role in STAFF_ROLES
 
 @admin_clients_router.callback_query(AdminMainStates.admin_menu, F.data == "admin_clients")
-async def start_clients_search(callback: CallbackQuery, state: FSMContext, bot: Bot):
-    if not await has_admin_access(callback.from_user.id):
+async def start_clients_search(callback: CallbackQuery, state: FSMContext, bot: Bot, user_role: Optional[str]):
+    if not has_admin_access(user_role):
         await callback.answer("Доступ запрещён", show_alert=True)
         return
 
@@ -58,8 +47,8 @@ async def start_clients_search(callback: CallbackQuery, state: FSMContext, bot:
 
 # Отмена поиска — возврат в админ-меню
 @admin_clients_router.callback_query(AdminClientsStates.waiting_search_query, F.data == "admin_clients_cancel")
-async def cancel_search(callback: CallbackQuery, state: FSMContext, bot: Bot):
-    if not await has_admin_access(callback.from_user.id):
+async def cancel_search(callback: CallbackQuery, state: FSMContext, bot: Bot, user_role: Optional[str]):
+    if not has_admin_access(user_role):
         return
 
     try:
@@ -77,37 +66,20 @@ async def cancel_search(callback: CallbackQuery, state: FSMContext, bot: Bot):
 
 # Поиск клиента
 @admin_clients_router.message(AdminClientsStates.waiting_search_query)
-async def process_search(message: Message, state: FSMContext, bot: Bot):
-    if not await has_admin_access(message.from_user.id):
+async def process_search(message: Message, state: FSMContext, bot: Bot, user_role: Optional[str], db_session: AsyncSession):
+    if not has_admin_access(user_role):
         await message.answer("❌ Доступ запрещён.")
         await state.clear()
         return
 
     query = message.text.strip()
 
-    async with AsyncSessionLocal() as session:
-        conditions = []
-
-        if query.isdigit():
-            conditions.append(Person.telegram_id == int(query))
-
-        normalized = normalize_phone(query)
-        if normalized:
-            conditions.append(Person.phone == normalized)
-
-        if query:
-            conditions.append(or_(
-                Person.first_name.ilike(f"%{query}%"),
-                Person.last_name.ilike(f"%{query}%"),
-                Person.full_name.ilike(f"%{query}%")
-            ))
-
-        result = await session.execute(
-            select(Person).where(or_(*conditions)).limit(15)
-        )
-        persons = result.scalars().all()
+    page = await search_clients_page(db_session, query, scope="admin")
+    results = page.results
+    # Единственное совпадение — сразу открываем профиль
+    person = await db_session.get(Person, results[0].id) if len(results) == 1 else None
 
-    if not persons:
+    if not results:
         await message.answer(
             "❌ Клиенты не найдены. Попробуйте другой запрос.",
             reply_markup=InlineKeyboardMarkup(inline_keyboard=[
@@ -116,32 +88,29 @@ async def process_search(message: Message, state: FSMContext, bot: Bot):
         )
         return
 
-    if len(persons) == 1:
-        await admin_show_profile(message, persons[0], state, bot)
+    if person is not None:
+        await admin_show_profile(message, person, state, bot, session=db_session)
         return
 
-    kb = []
-    for p in persons:
-        name = p.full_name or p.phone or str(p.telegram_id)
-        kb.append([InlineKeyboardButton(text=name, callback_data=f"admin_client_profile_{p.id}")])
-
-    kb.append([InlineKeyboardButton(text="◀ Отмена", callback_data="admin_clients_cancel")])
-
+    # Несколько совпадений — список по страницам, запрос нужен для кнопок "Назад"/"Далее"
+    await state.update_data(search_query=query)
     await message.answer(
-        f"🔍 Найдено {len(persons)} клиентов. Выберите:",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=kb)
+        "🔍 Найденные клиенты. Выберите:",
+        reply_markup=get_search_results_keyboard(page, "admin_client_profile_", "admin_clients_page_", "admin_clients_cancel")
     )
 
-# Показ профиля клиента (краткий формат + ваши кнопки)
-async def admin_show_profile(trigger, person: Person, state: FSMContext, bot: Bot):
-    async with AsyncSessionLocal() as session:
-        last_vision = await session.execute(
-            select(Vision)
-            .where(Vision.person_id == person.id)
-            .order_by(Vision.visit_date.desc())
-            .limit(1)
-        )
-        last_vision = last_vision.scalar_one_or_none()
+
+# Листание результатов поиска
+@admin_clients_router.callback_query(AdminClientsStates.waiting_search_query, F.data.startswith("admin_clients_page_"))
+async def search_results_page(callback: CallbackQuery, state: FSMContext, user_role: Optional[str]):
+    if not has_admin_access(user_role):
+        await callback.answer("Доступ запрещён", show_alert=True)
+        return
+    await show_search_results_page(callback, state, "admin_client_profile_", "admin_clients_page_", "admin_clients_cancel", scope="admin")
+
+# Текст и кнопки профиля клиента (краткий формат + ваши кнопки)
+def build_admin_profile_card(profile: ClientProfile) -> ProfileCard:
+    person, last_vision = profile.person, profile.last_vision
 
     profile_text = "<b>Профиль клиента:</b>\n\n"
     profile_text += f"ФИО: {person.full_name or '—'}\n"
@@ -172,9 +141,22 @@ async def admin_show_profile(trigger, person: Person, state: FSMContext, bot: Bo
         [InlineKeyboardButton(text="◀ Назад к поиску", callback_data="admin_back_to_search")],
         [InlineKeyboardButton(text="◀ В админ-меню", callback_data="admin_back_to_menu")],
     ]
+    return profile_text, InlineKeyboardMarkup(inline_keyboard=kb)
+
+# Показ профиля клиента по id: карточка из кэша или одним запросом; False — клиента уже нет.
+# session — сессия апдейта из DbSessionMiddleware; без неё открываем свою (только если карточки нет в кэше)
+async def admin_show_profile_by_id(trigger, person_id: int, state: FSMContext, bot: Bot, session: Optional[AsyncSession] = None) -> bool:
+    if session is None:
+        async with AsyncSessionLocal() as session:
+            profile = await profile_cache.render(session, person_id, "admin", build_admin_profile_card)
+    else:
+        profile = await profile_cache.render(session, person_id, "admin", build_admin_profile_card)
+    if profile is None:
+        return False
+    profile_text, reply_markup = profile
 
     if isinstance(trigger, Message):
-        await trigger.answer(profile_text, reply_markup=InlineKeyboardMarkup(inline_keyboard=kb))
+        await trigger.answer(profile_text, reply_markup=reply_markup)
     else:
         try:
             await trigger.message.delete()
@@ -184,20 +166,21 @@ async def admin_show_profile(trigger, person: Person, state: FSMContext, bot: Bo
         await bot.send_message(
             trigger.from_user.id,
             profile_text,
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=kb)
+            reply_markup=reply_markup
         )
 
-    await state.update_data(person_id=person.id)
+    await state.update_data(person_id=person_id)
     await state.set_state(AdminClientsStates.viewing_profile)
+    return True
+
+async def admin_show_profile(trigger, person: Person, state: FSMContext, bot: Bot, session: Optional[AsyncSession] = None):
+    await admin_show_profile_by_id(trigger, person.id, state, bot, session)
 
 # Выбор профиля из списка
 @admin_clients_router.callback_query(F.data.startswith("admin_client_profile_"))
-async def select_admin_profile(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def select_admin_profile(callback: CallbackQuery, state: FSMContext, bot: Bot, db_session: AsyncSession):
     person_id = int(callback.data.split("_")[3])
-    async with AsyncSessionLocal() as session:
-        person = await session.get(Person, person_id)
-    if person:
-        await admin_show_profile(callback, person, state, bot)
+    await admin_show_profile_by_id(callback, person_id, state, bot, session=db_session)
     await callback.answer()
 
 # Назад к поиску
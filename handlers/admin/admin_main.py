@@ -1,14 +1,13 @@
+from typing import Optional
+
 from aiogram import Router, F, Bot
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.exceptions import TelegramBadRequest
 
-from sqlalchemy import select
-
-from database.models import Person
-from database.session import AsyncSessionLocal
 from config import OWNER_IDS
+from middlewares.roles import STAFF_ROLES
 from forms.forms_fsm import AdminBroadcastStates, AdminClientsStates, AdminMainStates, OwnerMainStates
 from keyboards.client_kb import get_client_keyboard
 
@@ -20,13 +19,8 @@ def is_admin_or_owner(user_id: int) -> bool:
     # Владелец тоже может войти в админ-панель
     return user_id in OWNER_IDS
 
-async def is_admin(user_id: int) -> bool:
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(Person.role).where(Person.telegram_id == user_id)
-        )
-        role = result.scalar_one_or_none()
-        return role == "admin" or role == "owner"
+def is_admin(user_role: Optional[str]) -> bool:
+    return user_role in STAFF_ROLES
 
 # Главное меню админа (Inline)
 def get_admin_main_keyboard():
@@ -37,10 +31,8 @@ def get_admin_main_keyboard():
     ])
 
 @admin_main_router.message(Command("admin"))
-async def cmd_admin(message: Message, state: FSMContext):
-    user_id = message.from_user.id
-
-    if not await is_admin(user_id):
+async def cmd_admin(message: Message, state: FSMContext, user_role: Optional[str]):
+    if not is_admin(user_role):
         await message.answer("❌ Доступ запрещён. У вас нет прав администратора.")
         return
 
@@ -53,9 +45,8 @@ async def cmd_admin(message: Message, state: FSMContext):
     write_audit_event(message.from_user.id, "admin", "open_admin_panel")
 
 @admin_main_router.callback_query(AdminMainStates.admin_menu, F.data.startswith("admin_"))
-async def admin_menu_handler(callback: CallbackQuery, state: FSMContext, bot: Bot):
-    user_id = callback.from_user.id
-    if not await is_admin(user_id):
+async def admin_menu_handler(callback: CallbackQuery, state: FSMContext, bot: Bot, user_role: Optional[str]):
+    if not is_admin(user_role):
         await callback.answer("Доступ запрещён", show_alert=True)
         return
 
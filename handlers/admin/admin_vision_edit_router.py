@@ -1,62 +1,49 @@
+from typing import Optional
+
 from aiogram import Router, F, Bot
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.exceptions import TelegramBadRequest
 
-from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from database.models import Person, Vision
-from database.session import AsyncSessionLocal
-from config import OWNER_IDS
+from middlewares.roles import STAFF_ROLES
 from forms.forms_fsm import AdminClientsStates
+from services.visions import count_visions, latest_vision, neighbour_vision, parse_vision_callback, vision_nav_callback
 from datetime import date
 
 # Импорт функции показа профиля админа
-from .admin_clients_router import admin_show_profile  # замените на ваш путь
+from .admin_clients_router import admin_show_profile, admin_show_profile_by_id  # замените на ваш путь
 
 admin_vision_edit_router = Router()
 
-async def has_admin_access(user_id: int) -> bool:
-    if user_id in OWNER_IDS:
-        return True
-
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(Person.role).where(Person.telegram_id == user_id)
-        )
-        role = result.scalar_one_or_none()
-        return role in ("admin", "owner")
+def has_admin_access(user_role: Optional[str]) -> bool:
+    return user_role in STAFF_ROLES
 
 # Просмотр всех записей — показываем первую (последнюю по дате)
 @admin_vision_edit_router.callback_query(F.data.startswith("admin_view_all_visions_"))
-async def admin_view_all_visions(callback: CallbackQuery, state: FSMContext, bot: Bot):
-    if not await has_admin_access(callback.from_user.id):
+async def admin_view_all_visions(callback: CallbackQuery, state: FSMContext, bot: Bot, user_role: Optional[str], db_session: AsyncSession):
+    if not has_admin_access(user_role):
         await callback.answer("Доступ запрещён", show_alert=True)
         return
 
     person_id = int(callback.data.split("_")[4])
 
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(Vision)
-            .where(Vision.person_id == person_id)
-            .order_by(Vision.visit_date.desc())
-        )
-        visions = result.scalars().all()
+    vision = await latest_vision(db_session, person_id)
+    total = await count_visions(db_session, person_id) if vision else 0
 
-    if not visions:
+    if not vision:
         await callback.answer("У клиента нет записей зрения.", show_alert=True)
         return
 
-    # Сохраняем список ID и текущий индекс
-    await state.update_data(visions_ids=[v.id for v in visions], current_vision_index=0, person_id=person_id)
-    await admin_show_vision_record(callback, 0, visions, bot, state)
+    # Всего записей считаем один раз при открытии; дальше листаем по курсору из кнопок
+    await state.update_data(visions_total=total, person_id=person_id)
+    await admin_show_vision_record(callback, 0, vision, total, bot, state)
     await callback.answer()
 
 # Показ одной записи с пагинацией
-async def admin_show_vision_record(trigger, index: int, visions: list[Vision], bot: Bot, state: FSMContext):
-    v = visions[index]
-
+async def admin_show_vision_record(trigger, index: int, v: Vision, total: int, bot: Bot, state: FSMContext):
     text = f"<b>Запись зрения от {v.visit_date}</b>\n\n"
     text += f"Правая: SPH {v.sph_r or '—'} | CYL {v.cyl_r or '—'} | AXIS {v.axis_r or '—'}\n"
     text += f"Левая: SPH {v.sph_l or '—'} | CYL {v.cyl_l or '—'} | AXIS {v.axis_l or '—'}\n"
@@ -65,12 +52,12 @@ async def admin_show_vision_record(trigger, index: int, visions: list[Vision], b
     text += f"Модель оправы: {v.frame_model or '—'}\n"
     if v.note:
         text += f"Примечание: {v.note}\n"
-    text += f"\nЗапись {index + 1} из {len(visions)}"
+    text += f"\nЗапись {index + 1} из {total}"
 
     kb = [
         [
-            InlineKeyboardButton(text="◀", callback_data=f"admin_vision_prev_{index}"),
-            InlineKeyboardButton(text="▶", callback_data=f"admin_vision_next_{index}"),
+            InlineKeyboardButton(text="◀", callback_data=vision_nav_callback("admin_vision_prev_", index, v)),
+            InlineKeyboardButton(text="▶", callback_data=vision_nav_callback("admin_vision_next_", index, v)),
         ],
         [InlineKeyboardButton(text="✏ Редактировать эту запись", callback_data=f"admin_edit_this_vision_{v.id}")],
         [InlineKeyboardButton(text="🗑 Удалить эту запись", callback_data=f"admin_delete_this_vision_{v.id}")],
@@ -82,33 +69,37 @@ async def admin_show_vision_record(trigger, index: int, visions: list[Vision], b
     else:
         await trigger.message.edit_text(text, reply_markup=InlineKeyboardMarkup(inline_keyboard=kb))
 
-# Навигация предыдущая/следующая
+# Навигация предыдущая/следующая: одна запись соседняя по (visit_date, id), без загрузки всего списка
 @admin_vision_edit_router.callback_query(F.data.startswith("admin_vision_prev_") | F.data.startswith("admin_vision_next_"))
-async def admin_navigate_vision(callback: CallbackQuery, state: FSMContext, bot: Bot):
-    if not await has_admin_access(callback.from_user.id):
+async def admin_navigate_vision(callback: CallbackQuery, state: FSMContext, bot: Bot, user_role: Optional[str], db_session: AsyncSession):
+    if not has_admin_access(user_role):
         await callback.answer("Доступ запрещён", show_alert=True)
         return
 
+    older = callback.data.startswith("admin_vision_next_")
+    position = parse_vision_callback(callback.data, "admin_vision_next_" if older else "admin_vision_prev_")
     data = await state.get_data()
-    visions_ids = data.get("visions_ids", [])
-    current_index = int(callback.data.split("_")[3])
+    person_id = data.get("person_id")
+    if position is None or person_id is None:
+        await callback.answer("Откройте записи зрения заново.", show_alert=True)
+        return
 
-    if "prev" in callback.data:
-        new_index = max(0, current_index - 1)
-    else:
-        new_index = min(len(visions_ids) - 1, current_index + 1)
+    index, visit_date, vision_id = position
+    vision = await neighbour_vision(db_session, person_id, visit_date, vision_id, older)
 
-    async with AsyncSessionLocal() as session:
-        visions = [await session.get(Vision, vid) for vid in visions_ids]
+    if vision is None:
+        await callback.answer("Это последняя запись." if older else "Это первая запись.")
+        return
 
-    await admin_show_vision_record(callback, new_index, visions, bot, state)
-    await state.update_data(current_vision_index=new_index)
+    new_index = index + 1 if older else max(0, index - 1)
+    total = max(data.get("visions_total", 0), new_index + 1)
+    await admin_show_vision_record(callback, new_index, vision, total, bot, state)
     await callback.answer()
 
 # Удаление записи
 @admin_vision_edit_router.callback_query(F.data.startswith("admin_delete_this_vision_"))
-async def admin_confirm_delete_vision(callback: CallbackQuery, state: FSMContext, bot: Bot):
-    if not await has_admin_access(callback.from_user.id):
+async def admin_confirm_delete_vision(callback: CallbackQuery, state: FSMContext, bot: Bot, user_role: Optional[str]):
+    if not has_admin_access(user_role):
         await callback.answer("Доступ запрещён", show_alert=True)
         return
 
@@ -128,8 +119,8 @@ async def admin_confirm_delete_vision(callback: CallbackQuery, state: FSMContext
 
 # Подтверждение удаления
 @admin_vision_edit_router.callback_query(F.data.startswith("admin_confirm_delete_vision_"))
-async def admin_process_delete_vision(callback: CallbackQuery, state: FSMContext, bot: Bot):
-    if not await has_admin_access(callback.from_user.id):
+async def admin_process_delete_vision(callback: CallbackQuery, state: FSMContext, bot: Bot, user_role: Optional[str], db_session: AsyncSession):
+    if not has_admin_access(user_role):
         await callback.answer("Доступ запрещён", show_alert=True)
         return
 
@@ -137,17 +128,17 @@ async def admin_process_delete_vision(callback: CallbackQuery, state: FSMContext
     data = await state.get_data()
     person_id = data.get("person_id")
 
-    async with AsyncSessionLocal() as session:
-        await session.execute(delete(Vision).where(Vision.id == vision_id))
-        await session.commit()
+    # Через ORM, а не delete(): так срабатывает сброс кэша карточки профиля этого клиента
+    vision = await db_session.get(Vision, vision_id)
+    if vision:
+        await db_session.delete(vision)
+        await db_session.commit()
 
     await callback.answer("✅ Запись удалена!", show_alert=True)
 
     # Возврат в профиль
-    async with AsyncSessionLocal() as session:
-        person = await session.get(Person, person_id)
-        if person:
-            await admin_show_profile(callback, person, state, bot)
+    if person_id:
+        await admin_show_profile_by_id(callback, person_id, state, bot, session=db_session)
 
 # Отмена удаления
 @admin_vision_edit_router.callback_query(F.data == "admin_cancel_delete_vision")
@@ -156,8 +147,8 @@ async def admin_cancel_delete_vision(callback: CallbackQuery, state: FSMContext,
 
 # Кнопка "Назад в профиль" — перехват
 @admin_vision_edit_router.callback_query(F.data.startswith("admin_back_to_profile_"))
-async def admin_back_to_profile(callback: CallbackQuery, state: FSMContext, bot: Bot):
-    if not await has_admin_access(callback.from_user.id):
+async def admin_back_to_profile(callback: CallbackQuery, state: FSMContext, bot: Bot, user_role: Optional[str], db_session: AsyncSession):
+    if not has_admin_access(user_role):
         await callback.answer("Доступ запрещён", show_alert=True)
         return
 
@@ -168,29 +159,25 @@ async def admin_back_to_profile(callback: CallbackQuery, state: FSMContext, bot:
     except TelegramBadRequest:
         pass
 
-    async with AsyncSessionLocal() as session:
-        person = await session.get(Person, person_id)
-        if not person:
-            await callback.answer("Клиент не найден.", show_alert=True)
-            return
-
-    await admin_show_profile(callback, person, state, bot)
+    # Карточка обычно уже в кэше — без запросов к БД
+    if not await admin_show_profile_by_id(callback, person_id, state, bot, session=db_session):
+        await callback.answer("Клиент не найден.", show_alert=True)
+        return
     await callback.answer("Возврат в профиль")
 
 # Редактирование записи — начало
 @admin_vision_edit_router.callback_query(F.data.startswith("admin_edit_this_vision_"))
-async def admin_start_edit_vision(callback: CallbackQuery, state: FSMContext, bot: Bot):
-    if not await has_admin_access(callback.from_user.id):
+async def admin_start_edit_vision(callback: CallbackQuery, state: FSMContext, bot: Bot, user_role: Optional[str], db_session: AsyncSession):
+    if not has_admin_access(user_role):
         await callback.answer("Доступ запрещён", show_alert=True)
         return
 
     vision_id = int(callback.data.split("_")[4])
 
-    async with AsyncSessionLocal() as session:
-        vision = await session.get(Vision, vision_id)
-        if not vision:
-            await callback.answer("Запись не найдена.", show_alert=True)
-            return
+    vision = await db_session.get(Vision, vision_id)
+    if not vision:
+        await callback.answer("Запись не найдена.", show_alert=True)
+        return
 
     await state.update_data(vision_id=vision_id, person_id=vision.person_id)
 
@@ -212,34 +199,33 @@ async def admin_start_edit_vision(callback: CallbackQuery, state: FSMContext, bo
 
 # Шаг 1 редактирования: SPH, CYL, AXIS
 @admin_vision_edit_router.message(AdminClientsStates.waiting_sph_cyl_axis_edit)
-async def admin_process_sph_cyl_axis_edit(message: Message, state: FSMContext, bot: Bot):
-    if not await has_admin_access(message.from_user.id):
+async def admin_process_sph_cyl_axis_edit(message: Message, state: FSMContext, bot: Bot, user_role: Optional[str], db_session: AsyncSession):
+    if not has_admin_access(user_role):
         return
 
     text = message.text.strip()
     data = await state.get_data()
     vision_id = data["vision_id"]
 
-    async with AsyncSessionLocal() as session:
-        vision = await session.get(Vision, vision_id)
-
-        if text:
-            values = text.split()
-            if len(values) != 6:
-                await message.answer(
-                    "❌ Неверный формат. Нужно ровно 6 значений или пустое сообщение для пропуска."
-                )
-                return
-
-            try:
-                vision.sph_r, vision.cyl_r, vision.axis_r = map(float, values[:3])
-                vision.sph_l, vision.cyl_l, vision.axis_l = map(float, values[3:])
-                vision.axis_r = int(vision.axis_r)
-                vision.axis_l = int(vision.axis_l)
-                await session.commit()
-            except ValueError:
-                await message.answer("❌ Все значения должны быть числами. Повторите.")
-                return
+    vision = await db_session.get(Vision, vision_id)
+
+    if text:
+        values = text.split()
+        if len(values) != 6:
+            await message.answer(
+                "❌ Неверный формат. Нужно ровно 6 значений или пустое сообщение для пропуска."
+            )
+            return
+
+        try:
+            vision.sph_r, vision.cyl_r, vision.axis_r = map(float, values[:3])
+            vision.sph_l, vision.cyl_l, vision.axis_l = map(float, values[3:])
+            vision.axis_r = int(vision.axis_r)
+            vision.axis_l = int(vision.axis_l)
+            await db_session.commit()
+        except ValueError:
+            await message.answer("❌ Все значения должны быть числами. Повторите.")
+            return
 
     current_values = f"Текущие: PD {vision.pd or '—'} | Lens: {vision.lens_type or '—'} | Frame: {vision.frame_model or '—'}\n"
 
@@ -253,36 +239,35 @@ async def admin_process_sph_cyl_axis_edit(message: Message, state: FSMContext, b
 
 # Шаг 2 редактирования: PD, lens_type, frame_model
 @admin_vision_edit_router.message(AdminClientsStates.waiting_pd_lens_frame_edit)
-async def admin_process_pd_lens_frame_edit(message: Message, state: FSMContext, bot: Bot):
-    if not await has_admin_access(message.from_user.id):
+async def admin_process_pd_lens_frame_edit(message: Message, state: FSMContext, bot: Bot, user_role: Optional[str], db_session: AsyncSession):
+    if not has_admin_access(user_role):
         return
 
     text = message.text.strip()
     data = await state.get_data()
     vision_id = data["vision_id"]
 
-    async with AsyncSessionLocal() as session:
-        vision = await session.get(Vision, vision_id)
+    vision = await db_session.get(Vision, vision_id)
 
-        if text:
-            parts = text.split(maxsplit=2)
-            if len(parts) < 1:
-                await message.answer("❌ Укажите хотя бы PD или пустое сообщение для пропуска.")
-                return
+    if text:
+        parts = text.split(maxsplit=2)
+        if len(parts) < 1:
+            await message.answer("❌ Укажите хотя бы PD или пустое сообщение для пропуска.")
+            return
 
-            try:
-                vision.pd = float(parts[0])
-            except ValueError:
-                await message.answer("❌ PD должен быть числом. Повторите.")
-                return
+        try:
+            vision.pd = float(parts[0])
+        except ValueError:
+            await message.answer("❌ PD должен быть числом. Повторите.")
+            return
 
-            if len(parts) >= 2:
-                vision.lens_type = parts[1] or None
+        if len(parts) >= 2:
+            vision.lens_type = parts[1] or None
 
-            if len(parts) >= 3:
-                vision.frame_model = parts[2] or None
+        if len(parts) >= 3:
+            vision.frame_model = parts[2] or None
 
-            await session.commit()
+        await db_session.commit()
 
     current_note = f"Текущий: {vision.note or '—'}\n"
 
@@ -296,8 +281,8 @@ async def admin_process_pd_lens_frame_edit(message: Message, state: FSMContext,
 
 # Шаг 3 редактирования: Note и завершение
 @admin_vision_edit_router.message(AdminClientsStates.waiting_note_edit)
-async def admin_process_note_edit(message: Message, state: FSMContext, bot: Bot):
-    if not await has_admin_access(message.from_user.id):
+async def admin_process_note_edit(message: Message, state: FSMContext, bot: Bot, user_role: Optional[str], db_session: AsyncSession):
+    if not has_admin_access(user_role):
         return
 
     text = message.text.strip()
@@ -305,39 +290,42 @@ async def admin_process_note_edit(message: Message, state: FSMContext, bot: Bot)
     vision_id = data["vision_id"]
     person_id = data["person_id"]
 
-    async with AsyncSessionLocal() as session:
-        vision = await session.get(Vision, vision_id)
-        if text:
-            vision.note = text
-            await session.commit()
+    vision = await db_session.get(Vision, vision_id)
+    if text:
+        vision.note = text
+        await db_session.commit()
 
-        person = await session.get(Person, person_id)
-        await session.refresh(person)
+    person = await db_session.get(Person, person_id)
+    await db_session.refresh(person)
 
     await message.answer("✅ Запись обновлена!")
 
-    await admin_show_profile(message, person, state, bot)
+    await admin_show_profile(message, person, state, bot, session=db_session)
     await state.set_state(AdminClientsStates.viewing_profile)
 
 # Кнопка "Отмена" на этапах редактирования → возврат к списку всех записей
 @admin_vision_edit_router.callback_query(F.data == "admin_cancel_edit_to_list")
-async def admin_cancel_edit_to_list(callback: CallbackQuery, state: FSMContext, bot: Bot):
-    if not await has_admin_access(callback.from_user.id):
+async def admin_cancel_edit_to_list(callback: CallbackQuery, state: FSMContext, bot: Bot, user_role: Optional[str], db_session: AsyncSession):
+    if not has_admin_access(user_role):
         await callback.answer("Доступ запрещён", show_alert=True)
         return
 
     data = await state.get_data()
-    visions_ids = data.get("visions_ids", [])
     person_id = data.get("person_id")
 
-    if not visions_ids or not person_id:
+    if not person_id:
         await callback.answer("Данные не найдены.", show_alert=True)
         await state.clear()
         return
 
-    async with AsyncSessionLocal() as session:
-        visions = [await session.get(Vision, vid) for vid in visions_ids]
+    vision = await latest_vision(db_session, person_id)
+    total = await count_visions(db_session, person_id) if vision else 0
+
+    if not vision:
+        await callback.answer("У клиента нет записей зрения.", show_alert=True)
+        await state.clear()
+        return
 
-    await admin_show_vision_record(callback, 0, visions, bot, state)
-    await state.update_data(current_vision_index=0)
+    await admin_show_vision_record(callback, 0, vision, total, bot, state)
+    await state.update_data(visions_total=total)
     await callback.answer("Редактирование отменено. Возврат к списку записей.")
\ No newline at end of file
@@ -1,13 +1,14 @@
+from typing import Optional
+
 from aiogram import Router, F, Bot
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.exceptions import TelegramBadRequest
 
-from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from database.models import Person, Vision
-from database.session import AsyncSessionLocal
-from config import OWNER_IDS
+from middlewares.roles import STAFF_ROLES
 from forms.forms_fsm import AdminClientsStates  # новые состояния для админа
 from datetime import date
 
@@ -16,21 +17,13 @@ from .admin_clients_router import admin_show_profile  # замените пут
 
 admin_vision_router = Router()
 
-async def has_admin_access(user_id: int) -> bool:
-    if user_id in OWNER_IDS:
-        return True
-
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(Person.role).where(Person.telegram_id == user_id)
-        )
-        role = result.scalar_one_or_none()
-        return role in ("admin", "owner")
+def has_admin_access(user_role: Optional[str]) -> bool:
+    return user_role in STAFF_ROLES
 
 # Начало добавления записи зрения (админ)
 @admin_vision_router.callback_query(F.data.startswith("admin_add_vision_"))
-async def admin_start_add_vision(callback: CallbackQuery, state: FSMContext, bot: Bot):
-    if not await has_admin_access(callback.from_user.id):
+async def admin_start_add_vision(callback: CallbackQuery, state: FSMContext, bot: Bot, user_role: Optional[str]):
+    if not has_admin_access(user_role):
         await callback.answer("Доступ запрещён", show_alert=True)
         return
 
@@ -57,25 +50,24 @@ async def admin_start_add_vision(callback: CallbackQuery, state: FSMContext, bot
 
 # Отмена добавления на любом этапе
 @admin_vision_router.callback_query(F.data == "admin_cancel_add_vision")
-async def admin_cancel_add_vision(callback: CallbackQuery, state: FSMContext, bot: Bot):
-    if not await has_admin_access(callback.from_user.id):
+async def admin_cancel_add_vision(callback: CallbackQuery, state: FSMContext, bot: Bot, user_role: Optional[str], db_session: AsyncSession):
+    if not has_admin_access(user_role):
         return
 
     data = await state.get_data()
     person_id = data.get("person_id")
 
     if person_id:
-        async with AsyncSessionLocal() as session:
-            person = await session.get(Person, person_id)
+        person = await db_session.get(Person, person_id)
         if person:
-            await admin_show_profile(callback, person, state, bot)
+            await admin_show_profile(callback, person, state, bot, session=db_session)
 
     await callback.answer("Добавление записи отменено")
 
 # Шаг 1: Ввод SPH, CYL, AXIS для правого и левого
 @admin_vision_router.message(AdminClientsStates.waiting_sph_cyl_axis)
-async def admin_process_sph_cyl_axis(message: Message, state: FSMContext, bot: Bot):
-    if not await has_admin_access(message.from_user.id):
+async def admin_process_sph_cyl_axis(message: Message, state: FSMContext, bot: Bot, user_role: Optional[str]):
+    if not has_admin_access(user_role):
         return
 
     values = message.text.strip().split()
@@ -118,8 +110,8 @@ async def admin_process_sph_cyl_axis(message: Message, state: FSMContext, bot: B
 
 # Шаг 2: PD, lens_type, frame_model
 @admin_vision_router.message(AdminClientsStates.waiting_pd_lens_frame)
-async def admin_process_pd_lens_frame(message: Message, state: FSMContext, bot: Bot):
-    if not await has_admin_access(message.from_user.id):
+async def admin_process_pd_lens_frame(message: Message, state: FSMContext, bot: Bot, user_role: Optional[str]):
+    if not has_admin_access(user_role):
         return
 
     parts = message.text.strip().split(maxsplit=2)
@@ -151,8 +143,8 @@ async def admin_process_pd_lens_frame(message: Message, state: FSMContext, bot:
 
 # Шаг 3: Note и сохранение
 @admin_vision_router.message(AdminClientsStates.waiting_note)
-async def admin_process_note_and_save(message: Message, state: FSMContext, bot: Bot):
-    if not await has_admin_access(message.from_user.id):
+async def admin_process_note_and_save(message: Message, state: FSMContext, bot: Bot, user_role: Optional[str], db_session: AsyncSession):
+    if not has_admin_access(user_role):
         return
 
     note = message.text.strip() if message.text else None
@@ -160,37 +152,36 @@ async def admin_process_note_and_save(message: Message, state: FSMContext, bot:
     data = await state.get_data()
     person_id = data["person_id"]
 
-    async with AsyncSessionLocal() as session:
-        person = await session.get(Person, person_id)
-        if not person:
-            await message.answer("❌ Клиент не найден.")
-            await state.clear()
-            return
-
-        new_vision = Vision(
-            person_id=person_id,
-            visit_date=date.today(),
-            sph_r=data.get("sph_r"),
-            cyl_r=data.get("cyl_r"),
-            axis_r=data.get("axis_r"),
-            sph_l=data.get("sph_l"),
-            cyl_l=data.get("cyl_l"),
-            axis_l=data.get("axis_l"),
-            pd=data.get("pd"),
-            lens_type=data.get("lens_type"),
-            frame_model=data.get("frame_model"),
-            note=note
-        )
-        session.add(new_vision)
+    person = await db_session.get(Person, person_id)
+    if not person:
+        await message.answer("❌ Клиент не найден.")
+        await state.clear()
+        return
+
+    new_vision = Vision(
+        person_id=person_id,
+        visit_date=date.today(),
+        sph_r=data.get("sph_r"),
+        cyl_r=data.get("cyl_r"),
+        axis_r=data.get("axis_r"),
+        sph_l=data.get("sph_l"),
+        cyl_l=data.get("cyl_l"),
+        axis_l=data.get("axis_l"),
+        pd=data.get("pd"),
+        lens_type=data.get("lens_type"),
+        frame_model=data.get("frame_model"),
+        note=note
+    )
+    db_session.add(new_vision)
 
-        # Обновляем последний визит у клиента
-        person.last_visit_date = date.today()
+    # Обновляем последний визит у клиента
+    person.last_visit_date = date.today()
 
-        await session.commit()
-        await session.refresh(person)  # Перезагружаем person после commit, чтобы избежать DetachedInstanceError
+    await db_session.commit()
+    await db_session.refresh(person)  # Перезагружаем person после commit, чтобы избежать DetachedInstanceError
 
     await message.answer("✅ Новая запись зрения успешно добавлена!")
 
     # Возврат в профиль
-    await admin_show_profile(message, person, state, bot)
+    await admin_show_profile(message, person, state, bot, session=db_session)
     await state.set_state(AdminClientsStates.viewing_profile)
\ No newline at end of file
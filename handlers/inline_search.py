@@ -0,0 +1,133 @@
+import asyncio
+from typing import Optional
+
+from aiogram import Bot, Router
+from aiogram.filters import Command, CommandObject
+from aiogram.fsm.context import FSMContext
+from aiogram.types import InlineQuery, InlineQueryResultArticle, InputTextMessageContent, Message
+
+from config import OWNER_IDS
+from database.models import Person
+from database.session import AsyncSessionLocal
+from handlers.admin.admin_clients_router import admin_show_profile
+from handlers.owner.crud.clients_router import show_client_profile
+from middlewares.roles import STAFF_ROLES
+from services.search import page_callback_data, parse_page_callback, search_clients_page
+
+inline_search_router = Router()
+
+# Пауза после нажатия клавиши: пока человек печатает, запросы к БД не делаем
+INLINE_DEBOUNCE_SECONDS = 0.35
+# Результатов на одну порцию inline-выдачи (Telegram допускает до 50)
+INLINE_PAGE_SIZE = 20
+# Telegram кэширует ответ у себя; дольше не держим — данные клиентов меняются
+INLINE_CACHE_TIME = 10
+
+
+def is_owner(user_id: int) -> bool:
+    return user_id in OWNER_IDS
+
+
+def has_admin_access(user_role: Optional[str]) -> bool:
+    return user_role in STAFF_ROLES
+
+
+class InlineDebouncer:
+    """Дебаунс inline-запросов по пользователю.
+
+    Каждый новый запрос сразу отменяет ожидание предыдущего того же пользователя:
+    устаревший обработчик выходит, не обращаясь к БД и не отвечая Telegram.
+    """
+
+    def __init__(self, delay: float = INLINE_DEBOUNCE_SECONDS) -> None:
+        self.delay = delay
+        self._pending: dict[int, asyncio.Future] = {}
+        self.superseded = 0
+
+    async def wait(self, user_id: int) -> bool:
+        """True — запрос актуален и его пора выполнять, False — пришёл более новый."""
+        previous = self._pending.get(user_id)
+        if previous is not None and not previous.done():
+            previous.set_result(False)
+            self.superseded += 1
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._pending[user_id] = waiter
+        timer = asyncio.get_running_loop().call_later(self.delay, lambda: waiter.done() or waiter.set_result(True))
+        try:
+            return await waiter
+        finally:
+            timer.cancel()
+            if self._pending.get(user_id) is waiter:
+                del self._pending[user_id]
+
+
+inline_debouncer = InlineDebouncer()
+
+
+@inline_search_router.inline_query()
+async def inline_client_search(inline_query: InlineQuery, bot: Bot, user_role: Optional[str]):
+    user_id = inline_query.from_user.id
+    query = inline_query.query.strip()
+
+    # Карточки клиентов — только владельцу и админам и только в чате с самим ботом ("sender"):
+    # не в группах и не в личной переписке с третьим человеком
+    if not query or inline_query.chat_type != "sender" or not has_admin_access(user_role):
+        await inline_query.answer([], cache_time=INLINE_CACHE_TIME, is_personal=True)
+        return
+
+    if not await inline_debouncer.wait(user_id):
+        return
+
+    # offset — курсор keyset-выдачи с прошлой порции, в том же формате, что у кнопок "Далее"
+    cursor = parse_page_callback(inline_query.offset, "")[1] if inline_query.offset else None
+
+    async with AsyncSessionLocal() as session:
+        page = await search_clients_page(
+            session,
+            query,
+            cursor,
+            page_size=INLINE_PAGE_SIZE,
+            scope="owner" if is_owner(user_id) else "admin",
+        )
+
+    results = [
+        InlineQueryResultArticle(
+            id=str(r.id),
+            title=r.title,
+            description=f"📞 {r.phone or '—'} · Telegram ID: {r.telegram_id or '—'} · {r.role}",
+            input_message_content=InputTextMessageContent(message_text=f"/client {r.id}"),
+        )
+        for r in page.results
+    ]
+    next_cursor = page.next_cursor
+    await inline_query.answer(
+        results,
+        cache_time=INLINE_CACHE_TIME,
+        is_personal=True,
+        next_offset=page_callback_data("", True, next_cursor) if next_cursor else "",
+    )
+
+
+# Выбор карточки в inline-выдаче отправляет "/client <id>" — открываем профиль
+@inline_search_router.message(Command("client"))
+async def open_client_by_id(message: Message, command: CommandObject, state: FSMContext, bot: Bot, user_role: Optional[str]):
+    user_id = message.from_user.id
+    if not has_admin_access(user_role):
+        return
+
+    if not command.args or not command.args.strip().isdigit():
+        await message.answer("Укажите id клиента: /client 123\nИли наберите @имя_бота и часть имени клиента.")
+        return
+
+    async with AsyncSessionLocal() as session:
+        person = await session.get(Person, int(command.args.strip()))
+
+    if person is None:
+        await message.answer("❌ Клиент не найден.")
+        return
+
+    if is_owner(user_id):
+        await show_client_profile(message, person, state, bot)
+    else:
+        await admin_show_profile(message, person, state, bot)
@@ -8,7 +8,9 @@ from sqlalchemy import select
 
 from database.models import Person
 from database.session import AsyncSessionLocal
+from services.search import find_exact
 from config import OWNER_IDS
+from middlewares.roles import role_cache
 from forms.forms_fsm import OwnerAdminsStates, OwnerMainStates
 from keyboards.owner_kb import get_owner_main_keyboard
 from keyboards.client_kb import get_client_keyboard
@@ -40,17 +42,6 @@ async def get_admins_list_text():
         text += f"   📞 {a.phone or 'не указан'}\n\n"
     return text
 
-def normalize_phone(input_str: str) -> str | None:
-    digits = ''.join(filter(str.isdigit, input_str))
-    
-    if len(digits) == 10 and digits.startswith('0'):
-        return '996' + digits[1:]
-    elif len(digits) == 12 and digits.startswith('996'):
-        return digits
-    elif len(digits) == 13 and digits.startswith('996'):
-        return digits[1:]
-    return None
-
 @owner_admins_router.callback_query(OwnerAdminsStates.admins_menu, F.data.startswith("admins_"))
 async def admins_handler(callback: CallbackQuery, state: FSMContext, bot: Bot):
     if not is_owner(callback.from_user.id):
@@ -126,17 +117,8 @@ async def process_add_admin(message: Message, state: FSMContext, bot: Bot):
     input_str = message.text.strip()
 
     async with AsyncSessionLocal() as session:
-        person = None
-
-        if input_str.isdigit() and len(input_str) > 9:
-            result = await session.execute(select(Person).where(Person.telegram_id == int(input_str)))
-            person = result.scalar_one_or_none()
-
-        if not person:
-            normalized = normalize_phone(input_str)
-            if normalized:
-                result = await session.execute(select(Person).where(Person.phone == normalized))
-                person = result.scalar_one_or_none()
+        found = await find_exact(session, input_str)
+        person = await session.get(Person, found[0].id) if found else None
 
         if not person:
             await message.answer("❌ Пользователь не найден.\nПроверьте telegram_id или формат телефона.")
@@ -154,6 +136,8 @@ async def process_add_admin(message: Message, state: FSMContext, bot: Bot):
         else:
             person.role = "admin"
             await session.commit()
+            # Новая роль действует сразу, а не после истечения кэша ролей
+            role_cache.invalidate(person.telegram_id)
             await message.answer(f"✅ {display_name} успешно добавлен в админы!")
 
         # Обновлённый список после всех действий
@@ -169,17 +153,8 @@ async def process_delete_admin(message: Message, state: FSMContext, bot: Bot):
     input_str = message.text.strip()
 
     async with AsyncSessionLocal() as session:
-        person = None
-
-        if input_str.isdigit() and len(input_str) > 9:
-            result = await session.execute(select(Person).where(Person.telegram_id == int(input_str)))
-            person = result.scalar_one_or_none()
-
-        if not person:
-            normalized = normalize_phone(input_str)
-            if normalized:
-                result = await session.execute(select(Person).where(Person.phone == normalized))
-                person = result.scalar_one_or_none()
+        found = await find_exact(session, input_str)
+        person = await session.get(Person, found[0].id) if found else None
 
         if not person:
             await message.answer("❌ Админ не найден.")
@@ -196,6 +171,8 @@ async def process_delete_admin(message: Message, state: FSMContext, bot: Bot):
         else:
             person.role = "client"
             await session.commit()
+            # Новая роль действует сразу, а не после истечения кэша ролей
+            role_cache.invalidate(person.telegram_id)
             await message.answer(f"✅ {display_name} успешно удалён из админов.")
 
         await bot.send_message(message.from_user.id, await get_admins_list_text(), reply_markup=get_admins_keyboard())
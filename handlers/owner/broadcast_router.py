@@ -2,32 +2,32 @@ from aiogram import Router, F, Bot
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import StateFilter
 import asyncio
+import html
+import math
 
-from sqlalchemy import select, or_
+from sqlalchemy import select
 
-from database.models import Person, Vision
+from database.models import Person, Vision, as_kg_time
 from database.session import AsyncSessionLocal
-from config import OWNER_IDS
+from services.search import search_clients_page
+from keyboards.search_kb import get_search_results_keyboard, show_search_results_page
+from config import OWNER_IDS, BROADCAST_RATE_LIMIT
 from forms.forms_fsm import OwnerBroadcastStates, OwnerMainStates
 from keyboards.owner_kb import get_owner_main_keyboard, get_broadcast_submenu_keyboard
 
-from utils.broadcast_monitor import start as broadcast_start, mark_sent as broadcast_mark_sent, finish as broadcast_finish, status as broadcast_status
 from utils.audit import write_audit_event
+from services.broadcast import CAPTION_LIMIT, BroadcastMessage, caption_length, enqueue_broadcast
+from services.broadcast_template import TEMPLATE_HELP, BroadcastTemplate, TemplateError
+from services.recipients import SEGMENT_HELP, BroadcastSegment, count_recipients
+from services.broadcast_scheduler import REPEAT_NAMES, broadcast_scheduler, cancel_scheduled, list_scheduled, parse_schedule_input
 
 owner_broadcast_router = Router()
 
 def is_owner(user_id: int) -> bool:
     return user_id in OWNER_IDS
 
-def normalize_phone(input_str: str) -> str | None:
-    digits = ''.join(filter(str.isdigit, input_str))
-    if len(digits) == 10 and digits.startswith('0'):
-        return '996' + digits[1:]
-    elif len(digits) == 12 and digits.startswith('996'):
-        return digits
-    return None
-
 @owner_broadcast_router.callback_query(OwnerBroadcastStates.broadcast_menu, F.data.startswith("broadcast_"))
 async def broadcast_handler(callback: CallbackQuery, state: FSMContext, bot: Bot):
     if not is_owner(callback.from_user.id):
@@ -55,25 +55,33 @@ async def broadcast_handler(callback: CallbackQuery, state: FSMContext, bot: Bot
     elif action == "broadcast_all":
         # Подсчёт получателей
         async with AsyncSessionLocal() as session:
-            result = await session.execute(
-                select(Person.telegram_id).where(Person.telegram_id.is_not(None))
-            )
-            recipients = result.scalars().all()
-            count = len(recipients)
+            count = await count_recipients(session)
 
-        await state.update_data(recipients_count=count)
+        await state.update_data(recipients_count=count, broadcast_segment=None)
 
         await bot.send_message(
             callback.from_user.id,
             f"📢 <b>Рассылка всем клиентам</b>\n\n"
-            f"Получателей: <b>{count}</b> (все зарегистрированные пользователи с Telegram ID)\n\n"
-            "Введите текст сообщения для рассылки:",
+            f"Получателей: <b>{count}</b> (все пользователи с Telegram ID, кроме заблокировавших бота)\n\n"
+            "Отправьте текст рассылки или фото/видео/документ/альбом с подписью.\n"
+            f"{TEMPLATE_HELP}\n\n"
+            "Чтобы отправить только части клиентов, выберите сегмент:",
             reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text="🎯 Выбрать сегмент", callback_data="broadcast_segment")],
                 [InlineKeyboardButton(text="◀ Отмена", callback_data="broadcast_cancel_all")]
             ])
         )
         await state.set_state(OwnerBroadcastStates.waiting_broadcast_text)
 
+    elif action == "broadcast_scheduled":
+        await send_scheduled_list(bot, callback.from_user.id)
+
+    elif action.startswith("broadcast_unschedule_"):
+        job_id = int(action.split("_")[2])
+        if await cancel_scheduled(job_id):
+            write_audit_event(callback.from_user.id, "owner", "broadcast_schedule_cancelled", {"job_id": job_id})
+        await send_scheduled_list(bot, callback.from_user.id)
+
     elif action == "broadcast_back":
         await state.set_state(OwnerMainStates.main_menu)
         await bot.send_message(
@@ -105,7 +113,14 @@ async def cancel_search(callback: CallbackQuery, state: FSMContext, bot: Bot):
     await callback.answer("Поиск отменён")
 
 # Отмена ввода текста рассылки всем
-@owner_broadcast_router.callback_query(OwnerBroadcastStates.waiting_broadcast_text, F.data == "broadcast_cancel_all")
+@owner_broadcast_router.callback_query(
+    StateFilter(
+        OwnerBroadcastStates.waiting_broadcast_text,
+        OwnerBroadcastStates.waiting_segment,
+        OwnerBroadcastStates.waiting_schedule_time,
+    ),
+    F.data == "broadcast_cancel_all"
+)
 async def cancel_broadcast_text(callback: CallbackQuery, state: FSMContext, bot: Bot):
     if not is_owner(callback.from_user.id):
         return
@@ -123,35 +138,227 @@ async def cancel_broadcast_text(callback: CallbackQuery, state: FSMContext, bot:
     await state.set_state(OwnerBroadcastStates.broadcast_menu)
     await callback.answer("Рассылка отменена")
 
-# Ввод текста рассылки всем
+# Выбор сегмента аудитории
+@owner_broadcast_router.callback_query(OwnerBroadcastStates.waiting_broadcast_text, F.data == "broadcast_segment")
+async def ask_segment(callback: CallbackQuery, state: FSMContext, bot: Bot):
+    if not is_owner(callback.from_user.id):
+        await callback.answer("Доступ запрещён", show_alert=True)
+        return
+
+    try:
+        await callback.message.delete()
+    except TelegramBadRequest:
+        pass
+
+    await bot.send_message(
+        callback.from_user.id,
+        f"🎯 <b>Сегмент рассылки</b>\n\n{SEGMENT_HELP}",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="◀ Отмена", callback_data="broadcast_cancel_all")]
+        ])
+    )
+    await state.set_state(OwnerBroadcastStates.waiting_segment)
+    await callback.answer()
+
+
+@owner_broadcast_router.message(OwnerBroadcastStates.waiting_segment)
+async def process_segment(message: Message, state: FSMContext, bot: Bot):
+    if not is_owner(message.from_user.id):
+        return
+
+    try:
+        segment = BroadcastSegment.parse(message.text or "")
+    except ValueError as e:
+        await message.answer(f"❌ {html.escape(str(e))}\n\n{SEGMENT_HELP}")
+        return
+
+    # Один COUNT по индексированным колонкам — без загрузки клиентов
+    async with AsyncSessionLocal() as session:
+        count = await count_recipients(session, segment)
+
+    await state.update_data(recipients_count=count, broadcast_segment=segment.to_json())
+    await message.answer(
+        f"🎯 Сегмент: {html.escape(segment.describe())}\n"
+        f"Получателей: <b>{count}</b>\n\n"
+        "Отправьте текст рассылки или фото/видео/документ/альбом с подписью.\n"
+        f"{TEMPLATE_HELP}",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="◀ Отмена", callback_data="broadcast_cancel_all")]
+        ])
+    )
+    await state.set_state(OwnerBroadcastStates.waiting_broadcast_text)
+
+# Сообщения альбома приходят отдельными апдейтами — собираем их по media_group_id
+ALBUM_COLLECT_SECONDS = 1.0
+_album_buffer: dict[str, list[Message]] = {}
+
+MEDIA_NAMES = {"photo": "фото", "video": "видео", "document": "документ"}
+
+
+def _media_item(message: Message) -> dict | None:
+    # Берём file_id уже загруженного владельцем файла — повторно файл не загружается
+    if message.photo:
+        return {"type": "photo", "file_id": message.photo[-1].file_id}
+    if message.video:
+        return {"type": "video", "file_id": message.video.file_id}
+    if message.document:
+        return {"type": "document", "file_id": message.document.file_id}
+    return None
+
+
+# Ввод текста (или фото/видео/документа/альбома) рассылки всем
 @owner_broadcast_router.message(OwnerBroadcastStates.waiting_broadcast_text)
 async def process_broadcast_text(message: Message, state: FSMContext, bot: Bot):
     if not is_owner(message.from_user.id):
         return
 
-    text = message.text.strip()
+    if message.media_group_id:
+        group = _album_buffer.get(message.media_group_id)
+        if group is not None:
+            group.append(message)
+            return
+
+        _album_buffer[message.media_group_id] = [message]
+        await asyncio.sleep(ALBUM_COLLECT_SECONDS)
+        album = sorted(_album_buffer.pop(message.media_group_id), key=lambda m: m.message_id)
+        media = [item for item in map(_media_item, album) if item]
+        text = next((m.caption for m in album if m.caption), "").strip()
+    elif message.text:
+        media = []
+        text = message.text.strip()
+    else:
+        item = _media_item(message)
+        media = [item] if item else []
+        text = (message.caption or "").strip()
+        if not media:
+            await message.answer("Отправьте текст, фото, видео, документ или альбом. Либо отмените рассылку.")
+            return
+
     data = await state.get_data()
     count = data.get("recipients_count", 0)
+    segment = BroadcastSegment.from_json(data.get("broadcast_segment"))
 
-    if not text:
+    if not text and not media:
         await message.answer("Текст не может быть пустым. Введите заново или отмените.")
         return
 
-    await state.update_data(broadcast_text=text)
+    # Шаблон проверяется сейчас, а не посреди рассылки на тысячи клиентов
+    try:
+        template = BroadcastTemplate.compile(text)
+    except TemplateError as e:
+        await message.answer(f"❌ {html.escape(str(e))}\n\nИсправьте текст и отправьте заново.")
+        return
+
+    # С вложениями текст уходит подписью: длиннее CAPTION_LIMIT Telegram не примет.
+    # У шаблона считаем текст со значениями по умолчанию; у кого подпись выйдет длиннее, fill_deliveries пометит failed
+    if media:
+        length = caption_length(template.render({}) if template.is_personalized else template.tail)
+        if length > CAPTION_LIMIT:
+            await message.answer(
+                f"❌ Подпись к вложениям — до {CAPTION_LIMIT} символов, сейчас {length}.\n\n"
+                "Сократите текст и отправьте заново."
+            )
+            return
+
+    await state.update_data(broadcast_text=text, broadcast_media=media)
 
     confirm_kb = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="✅ Да, отправить", callback_data="broadcast_confirm_yes")],
+        [InlineKeyboardButton(text="🕒 Запланировать", callback_data="broadcast_schedule_time")],
         [InlineKeyboardButton(text="❌ Нет, отменить", callback_data="broadcast_confirm_no")],
     ])
 
+    preview = f"<b>Текст:</b>\n{text or '—'}\n\n"
+    if media:
+        preview += f"<b>Вложения:</b> {', '.join(MEDIA_NAMES[item['type']] for item in media)}\n\n"
+    if template.is_personalized:
+        preview += f"<b>Персонализация:</b> {', '.join(template.fields)}\n\n"
+
     await message.answer(
         f"Подтвердите рассылку:\n\n"
-        f"<b>Текст:</b>\n{text}\n\n"
+        f"{preview}"
+        f"<b>Сегмент:</b> {html.escape(segment.describe() if segment else 'все клиенты')}\n"
         f"<b>Получателей:</b> {count}\n\n"
-        f"Рассылка займёт примерно {count} секунд.",
+        f"Рассылка займёт примерно {math.ceil(count * max(1, len(media)) / BROADCAST_RATE_LIMIT)} секунд.",
         reply_markup=confirm_kb
     )
 
+async def send_scheduled_list(bot: Bot, user_id: int):
+    jobs = await list_scheduled()
+
+    if not jobs:
+        text = "🕒 <b>Запланированные рассылки</b>\n\nЗапланированных рассылок нет."
+    else:
+        text = "🕒 <b>Запланированные рассылки</b> (время Бишкека)\n\n"
+        for job in jobs:
+            preview = (job.text or "вложения")[:40]
+            repeat = f" • {REPEAT_NAMES[job.repeat]}" if job.repeat else ""
+            text += f"#{job.id} • {as_kg_time(job.scheduled_at):%d.%m.%Y %H:%M}{repeat}\n{html.escape(preview)}\n\n"
+
+    kb = [
+        [InlineKeyboardButton(text=f"❌ Отменить #{job.id}", callback_data=f"broadcast_unschedule_{job.id}")]
+        for job in jobs
+    ]
+    kb.append([InlineKeyboardButton(text="◀ Назад в главное меню", callback_data="broadcast_back")])
+
+    await bot.send_message(user_id, text, reply_markup=InlineKeyboardMarkup(inline_keyboard=kb))
+
+
+# Запланировать рассылку вместо немедленной отправки
+@owner_broadcast_router.callback_query(OwnerBroadcastStates.waiting_broadcast_text, F.data == "broadcast_schedule_time")
+async def ask_schedule_time(callback: CallbackQuery, state: FSMContext, bot: Bot):
+    if not is_owner(callback.from_user.id):
+        await callback.answer("Доступ запрещён", show_alert=True)
+        return
+
+    try:
+        await callback.message.delete()
+    except TelegramBadRequest:
+        pass
+
+    await bot.send_message(
+        callback.from_user.id,
+        "🕒 <b>Когда отправить?</b> (время Бишкека)\n\n"
+        "Формат: <code>ЧЧ:ММ</code> или <code>ДД.ММ.ГГГГ ЧЧ:ММ</code>\n"
+        "Для повтора добавьте <code>ежедневно</code> или <code>еженедельно</code>.\n\n"
+        "Пример: <code>10:00 ежедневно</code>",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="◀ Отмена", callback_data="broadcast_cancel_all")]
+        ])
+    )
+    await state.set_state(OwnerBroadcastStates.waiting_schedule_time)
+    await callback.answer()
+
+
+@owner_broadcast_router.message(OwnerBroadcastStates.waiting_schedule_time)
+async def process_schedule_time(message: Message, state: FSMContext, bot: Bot):
+    if not is_owner(message.from_user.id):
+        return
+
+    parsed = parse_schedule_input(message.text or "")
+    if parsed is None:
+        await message.answer("❌ Не удалось разобрать время или оно уже прошло. Пример: <code>25.12.2026 10:00</code>")
+        return
+
+    scheduled_at, repeat = parsed
+    data = await state.get_data()
+    broadcast_message = BroadcastMessage(text=data.get("broadcast_text") or "", media=data.get("broadcast_media") or [])
+
+    segment = BroadcastSegment.from_json(data.get("broadcast_segment"))
+
+    job_id = await broadcast_scheduler.schedule(broadcast_message, message.from_user.id, scheduled_at, repeat, segment)
+    write_audit_event(
+        message.from_user.id, "owner", "broadcast_scheduled",
+        {"job_id": job_id, "scheduled_at": scheduled_at.isoformat(), "repeat": repeat},
+    )
+
+    repeat_note = f" ({REPEAT_NAMES[repeat]})" if repeat else ""
+    await message.answer(
+        f"✅ Рассылка #{job_id} запланирована на {scheduled_at:%d.%m.%Y %H:%M}{repeat_note}.",
+        reply_markup=get_broadcast_submenu_keyboard()
+    )
+    await state.set_state(OwnerBroadcastStates.broadcast_menu)
+
 # Подтверждение рассылки всем
 @owner_broadcast_router.callback_query(F.data.startswith("broadcast_confirm_"))
 async def confirm_broadcast(callback: CallbackQuery, state: FSMContext, bot: Bot):
@@ -167,8 +374,9 @@ async def confirm_broadcast(callback: CallbackQuery, state: FSMContext, bot: Bot
         pass
 
     data = await state.get_data()
-    text = data.get("broadcast_text")
+    broadcast_message = BroadcastMessage(text=data.get("broadcast_text") or "", media=data.get("broadcast_media") or [])
     count = data.get("recipients_count", 0)
+    segment = BroadcastSegment.from_json(data.get("broadcast_segment"))
 
     if action == "broadcast_confirm_no":
         await bot.send_message(
@@ -180,57 +388,17 @@ async def confirm_broadcast(callback: CallbackQuery, state: FSMContext, bot: Bot
         await callback.answer()
         return
 
-    # Запуск рассылки
-    broadcast_start(total=count, requested_by=callback.from_user.id)
-    write_audit_event(callback.from_user.id, "owner", "broadcast_all_start", {"total": count})
+    # Рассылка ставится в очередь в БД, отправкой занимается broadcast_worker
     progress_message = await bot.send_message(
         callback.from_user.id,
-        f"📢 Рассылка начата...\nОтправлено: 0 из {count}"
+        f"📢 Рассылка поставлена в очередь...\nОтправлено: 0 из {count}"
     )
-
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(Person).where(Person.telegram_id.is_not(None))
-        )
-        recipients = result.scalars().all()
-
-    sent = 0
-    errors = 0
-
-    for person in recipients:
-        try:
-            await bot.send_message(person.telegram_id, text)
-            sent += 1
-            broadcast_mark_sent(ok=True)
-        except Exception:
-            errors += 1
-            broadcast_mark_sent(ok=False)
-
-        await asyncio.sleep(1.05)  # Безопасная пауза
-
-        if broadcast_status.cancel_requested:
-            break
-
-
-        if sent % 20 == 0 or sent == count:
-            try:
-                await bot.edit_message_text(
-                    chat_id=callback.from_user.id,
-                    message_id=progress_message.message_id,
-                    text=f"📢 Рассылка в процессе...\nОтправлено: {sent} из {count}\nОшибок: {errors}"
-                )
-            except TelegramBadRequest:
-                pass
-    broadcast_finish()
-    write_audit_event(callback.from_user.id, "owner", "broadcast_all_finish", {"sent": sent, "errors": errors})
-
-    cancelled_note = "\n⛔ Остановлена вручную" if broadcast_status.cancel_requested else ""
-
-    await bot.send_message(
-        callback.from_user.id,
-        f"✅ Рассылка завершена!\nУспешно: {sent}\nОшибок: {errors}{cancelled_note}",
-        reply_markup=get_broadcast_submenu_keyboard()
+    job_id = await enqueue_broadcast(broadcast_message, callback.from_user.id, progress_message.message_id, segment)
+    write_audit_event(
+        callback.from_user.id, "owner", "broadcast_all_start",
+        {"job_id": job_id, "total": count, "segment": segment.describe() if segment else None},
     )
+
     await state.set_state(OwnerBroadcastStates.broadcast_menu)
     await callback.answer()
 
@@ -263,28 +431,12 @@ async def process_search(message: Message, state: FSMContext, bot: Bot):
     query = message.text.strip()
 
     async with AsyncSessionLocal() as session:
-        conditions = []
-
-        if query.isdigit():
-            conditions.append(Person.telegram_id == int(query))
-
-        normalized = normalize_phone(query)
-        if normalized:
-            conditions.append(Person.phone == normalized)
-
-        if query:
-            conditions.append(or_(
-                Person.first_name.ilike(f"%{query}%"),
-                Person.last_name.ilike(f"%{query}%"),
-                Person.full_name.ilike(f"%{query}%")
-            ))
-
-        result = await session.execute(
-            select(Person).where(or_(*conditions)).limit(20)
-        )
-        persons = result.scalars().all()
+        page = await search_clients_page(session, query)
+        results = page.results
+        # Единственное совпадение — сразу открываем профиль
+        person = await session.get(Person, results[0].id) if len(results) == 1 else None
 
-    if not persons:
+    if not results:
         await message.answer(
             "❌ Клиенты не найдены. Попробуйте другой запрос.",
             reply_markup=InlineKeyboardMarkup(inline_keyboard=[
@@ -293,28 +445,31 @@ async def process_search(message: Message, state: FSMContext, bot: Bot):
         )
         return
 
-    if len(persons) == 1:
-        await show_profile(message, persons[0], state, bot)
+    if person is not None:
+        await show_profile(message, person, state, bot)
         return
 
-    # Несколько совпадений — список
-    kb = []
-    for p in persons:
-        name = p.full_name or p.phone or str(p.telegram_id)
-        kb.append([InlineKeyboardButton(text=name, callback_data=f"profile_{p.id}")])
-
-    kb.append([InlineKeyboardButton(text="◀ Отмена", callback_data="broadcast_cancel_search")])
-
+    # Несколько совпадений — список по страницам, запрос нужен для кнопок "Назад"/"Далее"
+    await state.update_data(search_query=query)
     await message.answer(
-        f"🔍 Найдено {len(persons)} клиентов. Выберите:",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=kb)
+        "🔍 Найденные клиенты. Выберите:",
+        reply_markup=get_search_results_keyboard(page, "profile_", "broadcast_page_", "broadcast_cancel_search")
     )
 
+
+# Листание результатов поиска
+@owner_broadcast_router.callback_query(OwnerBroadcastStates.waiting_search_query, F.data.startswith("broadcast_page_"))
+async def search_results_page(callback: CallbackQuery, state: FSMContext):
+    if not is_owner(callback.from_user.id):
+        await callback.answer("Доступ запрещён", show_alert=True)
+        return
+    await show_search_results_page(callback, state, "profile_", "broadcast_page_", "broadcast_cancel_search")
+
 # Показ профиля (остальной код без изменений, оставляю как у тебя)
 async def show_profile(trigger, person: Person, state: FSMContext, bot: Bot):
     async with AsyncSessionLocal() as session:
         visions_result = await session.execute(
-            select(Vision).where(Vision.person_id == person.id).order_by(Vision.visit_date.desc()).limit(5)
+            select(Vision).where(Vision.person_id == person.id).order_by(Vision.visit_date.desc(), Vision.id.desc()).limit(5)
         )
         visions = visions_result.scalars().all()
 
@@ -1,12 +1,17 @@
+from typing import Optional
+
 from aiogram import Router, F, Bot
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.exceptions import TelegramBadRequest
 
-from sqlalchemy import select, or_
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database.models import Person, Vision
+from database.models import Person
 from database.session import AsyncSessionLocal
+from services.profiles import ClientProfile, ProfileCard, profile_cache
+from services.search import search_clients_page
+from keyboards.search_kb import get_search_results_keyboard, show_search_results_page
 from config import OWNER_IDS
 from forms.forms_fsm import OwnerClientsStates, OwnerMainStates
 from keyboards.owner_kb import get_owner_main_keyboard
@@ -16,14 +21,6 @@ owner_clients_router = Router()
 def is_owner(user_id: int) -> bool:
     return user_id in OWNER_IDS
 
-def normalize_phone(input_str: str) -> str | None:
-    digits = ''.join(filter(str.isdigit, input_str))
-    if len(digits) == 10 and digits.startswith('0'):
-        return '996' + digits[1:]
-    elif len(digits) == 12 and digits.startswith('996'):
-        return digits
-    return None
-
 # Отмена поиска — возврат в главное меню владельца
 @owner_clients_router.callback_query(OwnerClientsStates.waiting_search_query, F.data == "clients_cancel_search")
 async def cancel_search(callback: CallbackQuery, state: FSMContext, bot: Bot):
@@ -46,35 +43,18 @@ async def cancel_search(callback: CallbackQuery, state: FSMContext, bot: Bot):
 
 # Поиск клиента
 @owner_clients_router.message(OwnerClientsStates.waiting_search_query)
-async def process_search(message: Message, state: FSMContext, bot: Bot):
+async def process_search(message: Message, state: FSMContext, bot: Bot, db_session: AsyncSession):
     if not is_owner(message.from_user.id):
         return
 
     query = message.text.strip()
 
-    async with AsyncSessionLocal() as session:
-        conditions = []
-
-        if query.isdigit():
-            conditions.append(Person.telegram_id == int(query))
-
-        normalized = normalize_phone(query)
-        if normalized:
-            conditions.append(Person.phone == normalized)
-
-        if query:
-            conditions.append(or_(
-                Person.first_name.ilike(f"%{query}%"),
-                Person.last_name.ilike(f"%{query}%"),
-                Person.full_name.ilike(f"%{query}%")
-            ))
+    page = await search_clients_page(db_session, query)
+    results = page.results
+    # Единственное совпадение — сразу открываем профиль
+    person = await db_session.get(Person, results[0].id) if len(results) == 1 else None
 
-        result = await session.execute(
-            select(Person).where(or_(*conditions)).limit(15)
-        )
-        persons = result.scalars().all()
-
-    if not persons:
+    if not results:
         await message.answer(
             "❌ Клиенты не найдены. Попробуйте другой запрос.",
             reply_markup=InlineKeyboardMarkup(inline_keyboard=[
@@ -83,39 +63,29 @@ async def process_search(message: Message, state: FSMContext, bot: Bot):
         )
         return
 
-    if len(persons) == 1:
-        await show_client_profile(message, persons[0], state, bot)
+    if person is not None:
+        await show_client_profile(message, person, state, bot, session=db_session)
         return
 
-    kb = []
-    for p in persons:
-        name = p.full_name or p.phone or str(p.telegram_id)
-        kb.append([InlineKeyboardButton(text=name, callback_data=f"client_profile_{p.id}")])
-
-    kb.append([InlineKeyboardButton(text="◀ Отмена", callback_data="clients_cancel_search")])
-
+    # Несколько совпадений — список по страницам, запрос нужен для кнопок "Назад"/"Далее"
+    await state.update_data(search_query=query)
     await message.answer(
-        f"🔍 Найдено {len(persons)} клиентов. Выберите:",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=kb)
+        "🔍 Найденные клиенты. Выберите:",
+        reply_markup=get_search_results_keyboard(page, "client_profile_", "clients_page_", "clients_cancel_search")
     )
 
-# Показ профиля клиента — всегда новое сообщение
-async def show_client_profile(trigger, person: Person, state: FSMContext, bot: Bot):
-    async with AsyncSessionLocal() as session:
-        last_vision = await session.execute(
-            select(Vision)
-            .where(Vision.person_id == person.id)
-            .order_by(Vision.visit_date.desc())
-            .limit(1)
-        )
-        last_vision = last_vision.scalar_one_or_none()
 
-        all_visions = await session.execute(
-            select(Vision)
-            .where(Vision.person_id == person.id)
-            .order_by(Vision.visit_date.desc())
-        )
-        all_visions = all_visions.scalars().all()
+# Листание результатов поиска
+@owner_clients_router.callback_query(OwnerClientsStates.waiting_search_query, F.data.startswith("clients_page_"))
+async def search_results_page(callback: CallbackQuery, state: FSMContext):
+    if not is_owner(callback.from_user.id):
+        await callback.answer("Доступ запрещён", show_alert=True)
+        return
+    await show_search_results_page(callback, state, "client_profile_", "clients_page_", "clients_cancel_search")
+
+# Текст и кнопки профиля клиента из загруженного профиля
+def build_client_profile_card(profile: ClientProfile) -> ProfileCard:
+    person, last_vision = profile.person, profile.last_vision
 
     profile_text = f"👤 <b>Профиль клиента</b>\n\n"
     profile_text += f"ФИО: {person.full_name or '—'}\n"
@@ -139,7 +109,7 @@ async def show_client_profile(trigger, person: Person, state: FSMContext, bot: B
     else:
         profile_text += "<i>Записей зрения пока нет</i>\n"
 
-    profile_text += f"\nВсего записей зрения: {len(all_visions)}\n"
+    profile_text += f"\nВсего записей зрения: {profile.visions_total}\n"
 
     kb = [
         [InlineKeyboardButton(text="✏ Редактировать данные", callback_data=f"edit_client_{person.id}")],
@@ -148,10 +118,17 @@ async def show_client_profile(trigger, person: Person, state: FSMContext, bot: B
         [InlineKeyboardButton(text="◀ Назад к поиску", callback_data="back_to_clients_search")],
         [InlineKeyboardButton(text="🏠 Главная панель", callback_data="to_main_panel")],
     ]
+    return profile_text, InlineKeyboardMarkup(inline_keyboard=kb)
 
-    # Всегда новое сообщение
+# Карточка профиля: из кэша или одним запросом в переданной сессии (своей или сессии апдейта); None — клиента нет
+async def render_client_profile(session: AsyncSession, person_id: int) -> Optional[ProfileCard]:
+    return await profile_cache.render(session, person_id, "owner", build_client_profile_card)
+
+# Отправка готового профиля — всегда новое сообщение
+async def send_client_profile(trigger, person_id: int, profile: tuple[str, InlineKeyboardMarkup], state: FSMContext, bot: Bot):
+    profile_text, reply_markup = profile
     if isinstance(trigger, Message):
-        await trigger.answer(profile_text, reply_markup=InlineKeyboardMarkup(inline_keyboard=kb))
+        await trigger.answer(profile_text, reply_markup=reply_markup)
     else:
         try:
             await trigger.message.delete()
@@ -161,19 +138,32 @@ async def show_client_profile(trigger, person: Person, state: FSMContext, bot: B
         await bot.send_message(
             trigger.from_user.id,
             profile_text,
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=kb)
+            reply_markup=reply_markup
         )
 
-    await state.update_data(person_id=person.id)
+    await state.update_data(person_id=person_id)
     await state.set_state(OwnerClientsStates.viewing_client_profile)
 
+# Показ профиля клиента — всегда новое сообщение; False — клиента уже нет.
+# session — сессия апдейта из DbSessionMiddleware; без неё открываем свою (только если карточки нет в кэше)
+async def show_client_profile_by_id(trigger, person_id: int, state: FSMContext, bot: Bot, session: Optional[AsyncSession] = None) -> bool:
+    if session is None:
+        async with AsyncSessionLocal() as session:
+            profile = await render_client_profile(session, person_id)
+    else:
+        profile = await render_client_profile(session, person_id)
+    if profile is None:
+        return False
+    await send_client_profile(trigger, person_id, profile, state, bot)
+    return True
+
+async def show_client_profile(trigger, person: Person, state: FSMContext, bot: Bot, session: Optional[AsyncSession] = None):
+    await show_client_profile_by_id(trigger, person.id, state, bot, session)
+
 @owner_clients_router.callback_query(F.data.startswith("client_profile_"))
-async def select_client_profile(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def select_client_profile(callback: CallbackQuery, state: FSMContext, bot: Bot, db_session: AsyncSession):
     person_id = int(callback.data.split("_")[2])
-    async with AsyncSessionLocal() as session:
-        person = await session.get(Person, person_id)
-    if person:
-        await show_client_profile(callback, person, state, bot)
+    await show_client_profile_by_id(callback, person_id, state, bot, session=db_session)
     await callback.answer()
 
 @owner_clients_router.callback_query(OwnerClientsStates.viewing_client_profile, F.data.startswith("edit_client_"))
@@ -204,7 +194,7 @@ async def start_edit_client(callback: CallbackQuery, state: FSMContext, bot: Bot
     await callback.answer()
 
 @owner_clients_router.callback_query(OwnerClientsStates.editing_client_data, F.data == "cancel_edit_client")
-async def cancel_edit_client(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def cancel_edit_client(callback: CallbackQuery, state: FSMContext, bot: Bot, db_session: AsyncSession):
     if not is_owner(callback.from_user.id):
         await callback.answer("Доступ запрещён", show_alert=True)
         return
@@ -218,81 +208,79 @@ async def cancel_edit_client(callback: CallbackQuery, state: FSMContext, bot: Bo
     person_id = data.get("person_id")
 
     if person_id:
-        async with AsyncSessionLocal() as session:
-            person = await session.get(Person, person_id)
+        person = await db_session.get(Person, person_id)
         if person:
-            await show_client_profile(callback, person, state, bot)
+            await show_client_profile(callback, person, state, bot, session=db_session)
 
     await state.set_state(OwnerClientsStates.viewing_client_profile)
     await callback.answer("Редактирование отменено")
 
 @owner_clients_router.message(OwnerClientsStates.editing_client_data)
-async def process_edit_client(message: Message, state: FSMContext, bot: Bot):
+async def process_edit_client(message: Message, state: FSMContext, bot: Bot, db_session: AsyncSession):
     if not is_owner(message.from_user.id):
         return
 
     data = await state.get_data()
     person_id = data.get("person_id")
 
-    async with AsyncSessionLocal() as session:
-        person = await session.get(Person, person_id)
-        if not person:
-            await message.answer("❌ Клиент не найден.")
-            await state.set_state(OwnerClientsStates.waiting_search_query)
-            return
-
-        # Сохраняем все данные ДО commit
-        full_name = person.full_name or '—'
-        age = person.age or '—'
-        phone = person.phone or '—'
-        telegram_id = person.telegram_id or '—'
-        role = person.role
-        reg_date = person.created_at.date() if person.created_at else '—'
-        last_visit = person.last_visit_date or '—'
-
-        words = message.text.strip().split()
-
-        changes = []
-
-        if len(words) >= 1:
-            person.first_name = words[0]
-            changes.append("Имя")
-
-        if len(words) >= 2:
-            person.last_name = words[1]
-            changes.append("Фамилия")
-
-        if len(words) >= 3 and words[2].isdigit():
-            person.age = int(words[2])
-            changes.append("Возраст")
-
-        if changes:
-            await session.commit()
-            await message.answer(f"✅ Данные обновлены: {', '.join(changes)}")
-        else:
-            await message.answer("Ничего не изменено. Укажите хотя бы одно значение.")
-
-        # Формируем обновлённый профиль из сохранённых данных
-        profile_text = "<b>Обновлённый профиль клиента:</b>\n\n"
-        profile_text += f"ФИО: {full_name}\n"
-        profile_text += f"Возраст: {age}\n"
-        profile_text += f"Телефон: {phone}\n"
-        profile_text += f"Telegram ID: {telegram_id}\n"
-        profile_text += f"Роль: {role}\n"
-        profile_text += f"Дата регистрации: {reg_date}\n"
-        profile_text += f"Последний визит: {last_visit}"
-
-        kb = [
-            [InlineKeyboardButton(text="✏ Редактировать данные", callback_data=f"edit_client_{person_id}")],
-            [InlineKeyboardButton(text="➕ Добавить новую запись зрения", callback_data=f"add_vision_{person_id}")],
-            [InlineKeyboardButton(text="📜 Просмотреть все записи зрения", callback_data=f"view_all_visions_{person_id}")],
-            [InlineKeyboardButton(text="◀ Назад к поиску", callback_data="back_to_clients_search")],
-            [InlineKeyboardButton(text="🏠 Главная панель", callback_data="to_main_panel")],
-        ]
-
-        # Отправляем обновлённый профиль сразу после редактирования
-        await message.answer(profile_text, reply_markup=InlineKeyboardMarkup(inline_keyboard=kb))
-        await state.set_state(OwnerClientsStates.viewing_client_profile)
+    person = await db_session.get(Person, person_id)
+    if not person:
+        await message.answer("❌ Клиент не найден.")
+        await state.set_state(OwnerClientsStates.waiting_search_query)
+        return
+
+    # Сохраняем все данные ДО commit
+    full_name = person.full_name or '—'
+    age = person.age or '—'
+    phone = person.phone or '—'
+    telegram_id = person.telegram_id or '—'
+    role = person.role
+    reg_date = person.created_at.date() if person.created_at else '—'
+    last_visit = person.last_visit_date or '—'
+
+    words = message.text.strip().split()
+
+    changes = []
+
+    if len(words) >= 1:
+        person.first_name = words[0]
+        changes.append("Имя")
+
+    if len(words) >= 2:
+        person.last_name = words[1]
+        changes.append("Фамилия")
+
+    if len(words) >= 3 and words[2].isdigit():
+        person.age = int(words[2])
+        changes.append("Возраст")
+
+    if changes:
+        await db_session.commit()
+        await message.answer(f"✅ Данные обновлены: {', '.join(changes)}")
+    else:
+        await message.answer("Ничего не изменено. Укажите хотя бы одно значение.")
+
+    # Формируем обновлённый профиль из сохранённых данных
+    profile_text = "<b>Обновлённый профиль клиента:</b>\n\n"
+    profile_text += f"ФИО: {full_name}\n"
+    profile_text += f"Возраст: {age}\n"
+    profile_text += f"Телефон: {phone}\n"
+    profile_text += f"Telegram ID: {telegram_id}\n"
+    profile_text += f"Роль: {role}\n"
+    profile_text += f"Дата регистрации: {reg_date}\n"
+    profile_text += f"Последний визит: {last_visit}"
+
+    kb = [
+        [InlineKeyboardButton(text="✏ Редактировать данные", callback_data=f"edit_client_{person_id}")],
+        [InlineKeyboardButton(text="➕ Добавить новую запись зрения", callback_data=f"add_vision_{person_id}")],
+        [InlineKeyboardButton(text="📜 Просмотреть все записи зрения", callback_data=f"view_all_visions_{person_id}")],
+        [InlineKeyboardButton(text="◀ Назад к поиску", callback_data="back_to_clients_search")],
+        [InlineKeyboardButton(text="🏠 Главная панель", callback_data="to_main_panel")],
+    ]
+
+    # Отправляем обновлённый профиль сразу после редактирования
+    await message.answer(profile_text, reply_markup=InlineKeyboardMarkup(inline_keyboard=kb))
+    await state.set_state(OwnerClientsStates.viewing_client_profile)
 
 # Кнопка "Главная панель" — сразу в главное меню
 @owner_clients_router.callback_query(F.data == "to_main_panel")
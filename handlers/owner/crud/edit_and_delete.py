@@ -4,15 +4,15 @@ from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKe
 from aiogram.fsm.context import FSMContext
 from aiogram.exceptions import TelegramBadRequest
 
-from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from database.models import Person, Vision
-from database.session import AsyncSessionLocal
 from config import OWNER_IDS
 from forms.forms_fsm import OwnerClientsStates  # добавьте новые состояния
 from datetime import date
 
-from handlers.owner.crud.clients_router import show_client_profile
+from handlers.owner.crud.clients_router import show_client_profile, show_client_profile_by_id
+from services.visions import count_visions, latest_vision, neighbour_vision, parse_vision_callback, vision_nav_callback
 
 
 owner_vision_edit_router = Router()
@@ -23,30 +23,23 @@ def is_owner(user_id: int) -> bool:
 
 # Просмотр всех записей — показываем первую (последнюю по дате)
 @owner_vision_edit_router.callback_query(F.data.startswith("view_all_visions_"))
-async def view_all_visions(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def view_all_visions(callback: CallbackQuery, state: FSMContext, bot: Bot, db_session: AsyncSession):
     person_id = int(callback.data.split("_")[3])
 
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(Vision)
-            .where(Vision.person_id == person_id)
-            .order_by(Vision.visit_date.desc())
-        )
-        visions = result.scalars().all()
+    vision = await latest_vision(db_session, person_id)
+    total = await count_visions(db_session, person_id) if vision else 0
 
-    if not visions:
+    if not vision:
         await callback.answer("У клиента нет записей зрения.", show_alert=True)
         return
 
-    # Показываем первую запись (index 0 = latest)
-    await state.update_data(visions_ids=[v.id for v in visions], current_vision_index=0, person_id=person_id)
-    await show_vision_record(callback, 0, visions, bot, state)
+    # Всего записей считаем один раз при открытии; дальше листаем по курсору из кнопок
+    await state.update_data(visions_total=total, person_id=person_id)
+    await show_vision_record(callback, 0, vision, total, bot, state)
     await callback.answer()
 
 # Показ одной записи с пагинацией
-async def show_vision_record(trigger, index: int, visions: list[Vision], bot: Bot, state: FSMContext):
-    v = visions[index]
-
+async def show_vision_record(trigger, index: int, v: Vision, total: int, bot: Bot, state: FSMContext):
     text = f"<b>Запись зрения от {v.visit_date}</b>\n\n"
     text += f"Правая: SPH {v.sph_r or '—'} | CYL {v.cyl_r or '—'} | AXIS {v.axis_r or '—'}\n"
     text += f"Левая: SPH {v.sph_l or '—'} | CYL {v.cyl_l or '—'} | AXIS {v.axis_l or '—'}\n"
@@ -55,17 +48,17 @@ async def show_vision_record(trigger, index: int, visions: list[Vision], bot: Bo
     text += f"Модель оправы: {v.frame_model or '—'}\n"
     if v.note:
         text += f"Примечание: {v.note}\n"
-    text += f"\nЗапись {index + 1} из {len(visions)}"
+    text += f"\nЗапись {index + 1} из {total}"
 
     kb = [
     [
-        InlineKeyboardButton(text="◀", callback_data=f"vision_prev_{index}"),
-        InlineKeyboardButton(text="▶", callback_data=f"vision_next_{index}"),
+        InlineKeyboardButton(text="◀", callback_data=vision_nav_callback("vision_prev_", index, v)),
+        InlineKeyboardButton(text="▶", callback_data=vision_nav_callback("vision_next_", index, v)),
     ],
     [InlineKeyboardButton(text="✏ Редактировать эту запись", callback_data=f"edit_this_vision_{v.id}")],
     [InlineKeyboardButton(text="🗑 Удалить эту запись", callback_data=f"delete_this_vision_{v.id}")],
     [InlineKeyboardButton(text="📄 Выгрузить в PDF", callback_data=f"export_pdf_{v.id}")],
-    [InlineKeyboardButton(text="◀ Назад в профиль", callback_data=f"back_to_profile_{visions[0].person_id}")],
+    [InlineKeyboardButton(text="◀ Назад в профиль", callback_data=f"back_to_profile_{v.person_id}")],
 ]
 
     if isinstance(trigger, Message):
@@ -73,23 +66,27 @@ async def show_vision_record(trigger, index: int, visions: list[Vision], bot: Bo
     else:
         await trigger.message.edit_text(text, reply_markup=InlineKeyboardMarkup(inline_keyboard=kb))
 
-# Навигация предыдущая/следующая
+# Навигация предыдущая/следующая: одна запись соседняя по (visit_date, id), без загрузки всего списка
 @owner_vision_edit_router.callback_query(F.data.startswith("vision_prev_") | F.data.startswith("vision_next_"))
-async def navigate_vision(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def navigate_vision(callback: CallbackQuery, state: FSMContext, bot: Bot, db_session: AsyncSession):
+    older = callback.data.startswith("vision_next_")
+    position = parse_vision_callback(callback.data, "vision_next_" if older else "vision_prev_")
     data = await state.get_data()
-    visions_ids = data.get("visions_ids", [])
-    current_index = int(callback.data.split("_")[2])
+    person_id = data.get("person_id")
+    if position is None or person_id is None:
+        await callback.answer("Откройте записи зрения заново.", show_alert=True)
+        return
 
-    if "prev" in callback.data:
-        new_index = max(0, current_index - 1)
-    else:
-        new_index = min(len(visions_ids) - 1, current_index + 1)
+    index, visit_date, vision_id = position
+    vision = await neighbour_vision(db_session, person_id, visit_date, vision_id, older)
 
-    async with AsyncSessionLocal() as session:
-        visions = [await session.get(Vision, vid) for vid in visions_ids]
+    if vision is None:
+        await callback.answer("Это последняя запись." if older else "Это первая запись.")
+        return
 
-    await show_vision_record(callback, new_index, visions, bot, state)
-    await state.update_data(current_vision_index=new_index)
+    new_index = index + 1 if older else max(0, index - 1)
+    total = max(data.get("visions_total", 0), new_index + 1)
+    await show_vision_record(callback, new_index, vision, total, bot, state)
     await callback.answer()
 
 # Удаление записи
@@ -111,22 +108,22 @@ async def confirm_delete_vision(callback: CallbackQuery, state: FSMContext, bot:
 
 # Подтверждение удаления
 @owner_vision_edit_router.callback_query(F.data.startswith("confirm_delete_vision_"))
-async def process_delete_vision(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def process_delete_vision(callback: CallbackQuery, state: FSMContext, bot: Bot, db_session: AsyncSession):
     vision_id = int(callback.data.split("_")[3])
     data = await state.get_data()
     person_id = data.get("person_id")
 
-    async with AsyncSessionLocal() as session:
-        await session.execute(delete(Vision).where(Vision.id == vision_id))
-        await session.commit()
+    # Через ORM, а не delete(): так срабатывает сброс кэша карточки профиля этого клиента
+    vision = await db_session.get(Vision, vision_id)
+    if vision:
+        await db_session.delete(vision)
+        await db_session.commit()
 
     await callback.answer("✅ Запись удалена!", show_alert=True)
 
     # Возврат в профиль
-    async with AsyncSessionLocal() as session:
-        person = await session.get(Person, person_id)
-        if person:
-            await show_client_profile(callback, person, state, bot)
+    if person_id:
+        await show_client_profile_by_id(callback, person_id, state, bot, session=db_session)
 
 # Отмена удаления
 @owner_vision_edit_router.callback_query(F.data == "cancel_delete_vision")
@@ -135,14 +132,13 @@ async def cancel_delete_vision(callback: CallbackQuery, state: FSMContext, bot:
 
 # Редактирование записи
 @owner_vision_edit_router.callback_query(F.data.startswith("edit_this_vision_"))
-async def start_edit_vision(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def start_edit_vision(callback: CallbackQuery, state: FSMContext, bot: Bot, db_session: AsyncSession):
     vision_id = int(callback.data.split("_")[3])
 
-    async with AsyncSessionLocal() as session:
-        vision = await session.get(Vision, vision_id)
-        if not vision:
-            await callback.answer("Запись не найдена.", show_alert=True)
-            return
+    vision = await db_session.get(Vision, vision_id)
+    if not vision:
+        await callback.answer("Запись не найдена.", show_alert=True)
+        return
 
     await state.update_data(vision_id=vision_id, person_id=vision.person_id)
 
@@ -164,7 +160,7 @@ async def start_edit_vision(callback: CallbackQuery, state: FSMContext, bot: Bot
 
 # Шаг 1 редактирования: SPH, CYL, AXIS
 @owner_vision_edit_router.message(OwnerClientsStates.waiting_sph_cyl_axis_edit)
-async def process_sph_cyl_axis_edit(message: Message, state: FSMContext, bot: Bot):
+async def process_sph_cyl_axis_edit(message: Message, state: FSMContext, bot: Bot, db_session: AsyncSession):
     if not is_owner(message.from_user.id):
         return
 
@@ -172,8 +168,7 @@ async def process_sph_cyl_axis_edit(message: Message, state: FSMContext, bot: Bo
     data = await state.get_data()
     vision_id = data["vision_id"]
 
-    async with AsyncSessionLocal() as session:
-        vision = await session.get(Vision, vision_id)
+    vision = await db_session.get(Vision, vision_id)
 
     if len(values) == 6:
         try:
@@ -181,7 +176,7 @@ async def process_sph_cyl_axis_edit(message: Message, state: FSMContext, bot: Bo
             vision.sph_l, vision.cyl_l, vision.axis_l = map(float, values[3:])
             vision.axis_r = int(vision.axis_r)
             vision.axis_l = int(vision.axis_l)
-            await session.commit()
+            await db_session.commit()
         except ValueError:
             await message.answer("❌ Неверный формат. Повторите.")
             return
@@ -198,7 +193,7 @@ async def process_sph_cyl_axis_edit(message: Message, state: FSMContext, bot: Bo
 
 # Шаг 2 редактирования: PD, lens_type, frame_model
 @owner_vision_edit_router.message(OwnerClientsStates.waiting_pd_lens_frame_edit)
-async def process_pd_lens_frame_edit(message: Message, state: FSMContext, bot: Bot):
+async def process_pd_lens_frame_edit(message: Message, state: FSMContext, bot: Bot, db_session: AsyncSession):
     if not is_owner(message.from_user.id):
         return
 
@@ -206,8 +201,7 @@ async def process_pd_lens_frame_edit(message: Message, state: FSMContext, bot: B
     data = await state.get_data()
     vision_id = data["vision_id"]
 
-    async with AsyncSessionLocal() as session:
-        vision = await session.get(Vision, vision_id)
+    vision = await db_session.get(Vision, vision_id)
 
     if len(parts) >= 1:
         try:
@@ -222,7 +216,7 @@ async def process_pd_lens_frame_edit(message: Message, state: FSMContext, bot: B
         if len(parts) >= 3:
             vision.frame_model = parts[2] or None
 
-        await session.commit()
+        await db_session.commit()
 
     current_note = f"Текущий: {vision.note or '—'}\n"
 
@@ -236,7 +230,7 @@ async def process_pd_lens_frame_edit(message: Message, state: FSMContext, bot: B
 
 # Шаг 3 редактирования: Note и завершение
 @owner_vision_edit_router.message(OwnerClientsStates.waiting_note_edit)
-async def process_note_edit(message: Message, state: FSMContext, bot: Bot):
+async def process_note_edit(message: Message, state: FSMContext, bot: Bot, db_session: AsyncSession):
     if not is_owner(message.from_user.id):
         return
 
@@ -245,22 +239,21 @@ async def process_note_edit(message: Message, state: FSMContext, bot: Bot):
     vision_id = data["vision_id"]
     person_id = data["person_id"]
 
-    async with AsyncSessionLocal() as session:
-        vision = await session.get(Vision, vision_id)
-        if note is not None:
-            vision.note = note
-            await session.commit()
+    vision = await db_session.get(Vision, vision_id)
+    if note is not None:
+        vision.note = note
+        await db_session.commit()
 
-        person = await session.get(Person, person_id)
+    person = await db_session.get(Person, person_id)
 
     await message.answer("✅ Запись обновлена!")
 
-    await show_client_profile(message, person, state, bot)
+    await show_client_profile(message, person, state, bot, session=db_session)
     await state.set_state(OwnerClientsStates.viewing_client_profile)
 
 
 @owner_vision_edit_router.callback_query(OwnerClientsStates.editing_client_data, F.data == "cancel_edit_client")
-async def cancel_edit_client(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def cancel_edit_client(callback: CallbackQuery, state: FSMContext, bot: Bot, db_session: AsyncSession):
     if not is_owner(callback.from_user.id):
         await callback.answer("Доступ запрещён", show_alert=True)
         return
@@ -274,32 +267,26 @@ async def cancel_edit_client(callback: CallbackQuery, state: FSMContext, bot: Bo
     person_id = data.get("person_id")
 
     if person_id:
-        async with AsyncSessionLocal() as session:
-            person = await session.get(Person, person_id)
-        if person:
-            await show_client_profile(callback, person, state, bot)
+        await show_client_profile_by_id(callback, person_id, state, bot, session=db_session)
 
     await state.set_state(OwnerClientsStates.viewing_client_profile)
     await callback.answer("Редактирование отменено")
 
 # Отмена редактирования
 @owner_vision_edit_router.callback_query(F.data == "cancel_edit_vision")
-async def cancel_edit_vision(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def cancel_edit_vision(callback: CallbackQuery, state: FSMContext, bot: Bot, db_session: AsyncSession):
     data = await state.get_data()
     person_id = data.get("person_id")
 
     if person_id:
-        async with AsyncSessionLocal() as session:
-            person = await session.get(Person, person_id)
-        if person:
-            await show_client_profile(callback, person, state, bot)
+        await show_client_profile_by_id(callback, person_id, state, bot, session=db_session)
 
     await callback.answer("Редактирование отменено")
 
 
 # Хендлер для кнопки "Назад в профиль" (добавьте в конец файла)
 @owner_vision_edit_router.callback_query(F.data.startswith("back_to_profile_"))
-async def back_to_profile(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def back_to_profile(callback: CallbackQuery, state: FSMContext, bot: Bot, db_session: AsyncSession):
     if not is_owner(callback.from_user.id):
         await callback.answer("Доступ запрещён", show_alert=True)
         return
@@ -313,14 +300,10 @@ async def back_to_profile(callback: CallbackQuery, state: FSMContext, bot: Bot):
     except TelegramBadRequest:
         pass  # сообщение уже удалено — нормально
 
-    async with AsyncSessionLocal() as session:
-        person = await session.get(Person, person_id)
-        if not person:
-            await callback.answer("Клиент не найден.", show_alert=True)
-            return
-
-    # Возврат в профиль (используем существующую функцию)
-    await show_client_profile(callback, person, state, bot)
+    # Возврат в профиль: карточка обычно уже в кэше — без запросов к БД
+    if not await show_client_profile_by_id(callback, person_id, state, bot, session=db_session):
+        await callback.answer("Клиент не найден.", show_alert=True)
+        return
     await callback.answer("Возврат в профиль")
 
 
@@ -6,15 +6,14 @@ from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKe
 from aiogram.fsm.context import FSMContext
 from aiogram.exceptions import TelegramBadRequest
 
-from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from database.models import Person, Vision
-from database.session import AsyncSessionLocal
 from config import OWNER_IDS
 from forms.forms_fsm import OwnerClientsStates  # добавьте новые состояния в forms_fsm.py
 from datetime import date
 
-from handlers.owner.crud.clients_router import show_client_profile 
+from handlers.owner.crud.clients_router import render_client_profile, send_client_profile, show_client_profile
 
 
 owner_vision_router = Router()
@@ -50,16 +49,15 @@ async def start_add_vision(callback: CallbackQuery, state: FSMContext, bot: Bot)
 
 # Отмена добавления на любом этапе
 @owner_vision_router.callback_query(F.data == "cancel_add_vision")
-async def cancel_add_vision(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def cancel_add_vision(callback: CallbackQuery, state: FSMContext, bot: Bot, db_session: AsyncSession):
     data = await state.get_data()
     person_id = data.get("person_id")
 
     if person_id:
-        async with AsyncSessionLocal() as session:
-            person = await session.get(Person, person_id)
+        person = await db_session.get(Person, person_id)
         if person:
             from handlers.owner.crud.clients_router  import show_client_profile  # импорт функции профиля
-            await show_client_profile(callback, person, state, bot)
+            await show_client_profile(callback, person, state, bot, session=db_session)
 
     await callback.answer("Добавление записи отменено")
 
@@ -142,7 +140,7 @@ async def process_pd_lens_frame(message: Message, state: FSMContext, bot: Bot):
 
 # Шаг 3: Note и сохранение
 @owner_vision_router.message(OwnerClientsStates.waiting_note)
-async def process_note_and_save(message: Message, state: FSMContext, bot: Bot):
+async def process_note_and_save(message: Message, state: FSMContext, bot: Bot, db_session: AsyncSession):
     if not is_owner(message.from_user.id):
         return
 
@@ -151,37 +149,39 @@ async def process_note_and_save(message: Message, state: FSMContext, bot: Bot):
     data = await state.get_data()
     person_id = data["person_id"]
 
-    async with AsyncSessionLocal() as session:
-        person = await session.get(Person, person_id)
-        if not person:
-            await message.answer("❌ Клиент не найден.")
-            await state.clear()
-            return
-
-        new_vision = Vision(
-            person_id=person_id,
-            visit_date=date.today(),
-            sph_r=data.get("sph_r"),
-            cyl_r=data.get("cyl_r"),
-            axis_r=data.get("axis_r"),
-            sph_l=data.get("sph_l"),
-            cyl_l=data.get("cyl_l"),
-            axis_l=data.get("axis_l"),
-            pd=data.get("pd"),
-            lens_type=data.get("lens_type"),
-            frame_model=data.get("frame_model"),
-            note=note
-        )
-        session.add(new_vision)
+    # Всё в одной сессии апдейта: запись, обновление клиента и чтение профиля — одно соединение и одна транзакция
+    person = await db_session.get(Person, person_id)
+    if not person:
+        await message.answer("❌ Клиент не найден.")
+        await state.clear()
+        return
+
+    new_vision = Vision(
+        person_id=person_id,
+        visit_date=date.today(),
+        sph_r=data.get("sph_r"),
+        cyl_r=data.get("cyl_r"),
+        axis_r=data.get("axis_r"),
+        sph_l=data.get("sph_l"),
+        cyl_l=data.get("cyl_l"),
+        axis_l=data.get("axis_l"),
+        pd=data.get("pd"),
+        lens_type=data.get("lens_type"),
+        frame_model=data.get("frame_model"),
+        note=note
+    )
+    db_session.add(new_vision)
 
-        # Обновляем последний визит у клиента
-        person.last_visit_date = date.today()
+    # Обновляем последний визит у клиента
+    person.last_visit_date = date.today()
+    await db_session.flush()
 
-        await session.commit()
+    # Профиль собираем до commit, а отправляем после: блокировка SQLite не держится на время запросов к Telegram
+    profile = await render_client_profile(db_session, person.id)
+    await db_session.commit()
 
     await message.answer("✅ Новая запись зрения успешно добавлена!")
 
     # Возврат в профиль с обновлёнными данными
- # если в отдельном файле — импорт
-    await show_client_profile(message, person, state, bot)
+    await send_client_profile(message, person.id, profile, state, bot)
     await state.set_state(OwnerClientsStates.viewing_client_profile)
\ No newline at end of file
@@ -18,10 +18,17 @@ from aiogram.types import BufferedInputFile, CallbackQuery, FSInputFile, Message
 from sqlalchemy import func, select
 
 from config import AUTO_BACKUP_INTERVAL_HOURS, AUTO_BACKUP_TARGET_IDS, OWNER_IDS
+from database.engine import async_engine
+from database.init_db import init_db
 from database.models import Person, Vision
 from database.session import AsyncSessionLocal
 from keyboards.owner_kb import get_dev_panel_keyboard, get_owner_main_keyboard
 from middlewares.metrics import metrics_registry
+from services.fuzzy_search import client_name_index
+from services.search_cache import search_cache
+from services.profiles import profile_cache
+from middlewares.roles import role_cache
+from middlewares.db_session import db_usage_stats
 from utils.audit import AUDIT_LOG_PATH, write_audit_event
 from utils.backup_service import create_backup_file, get_latest_backup
 from utils.broadcast_monitor import request_cancel as broadcast_request_cancel, snapshot as broadcast_snapshot
@@ -110,6 +117,7 @@ async def dev_status(callback: CallbackQuery):
     m, s = divmod(rem, 60)
     log_path = _resolve_log_file_path()
     rpm = await metrics_registry.events_per_minute()
+    db_connections, db_transactions = db_usage_stats.per_update()
 
     text = (
         "✅ <b>Статус бота</b>\n"
@@ -117,6 +125,13 @@ async def dev_status(callback: CallbackQuery):
         f"• Uptime: <code>{h:02d}:{m:02d}:{s:02d}</code>\n"
         f"• RAM: <b>{_ram_mb():.1f} MB</b>\n"
         f"• Update rate: <b>{rpm} / мин</b>\n"
+        f"• Кэш поиска: <b>{search_cache.hits}</b> попаданий / <b>{search_cache.misses}</b> промахов "
+        f"({search_cache.hit_rate:.0%}), записей: {len(search_cache)}, сбросов: {search_cache.invalidations}\n"
+        f"• Кэш профилей: <b>{profile_cache.hits}</b> попаданий / <b>{profile_cache.misses}</b> промахов "
+        f"({profile_cache.hit_rate:.0%}), карточек: {len(profile_cache)}\n"
+        f"• Кэш ролей: <b>{role_cache.hits}</b> попаданий / <b>{role_cache.misses}</b> запросов к БД\n"
+        f"• БД на апдейт: <b>{db_connections:.2f}</b> соединений / <b>{db_transactions:.2f}</b> транзакций "
+        f"(апдейтов с БД: {db_usage_stats.updates_with_db} из {db_usage_stats.updates}, максимум соединений: {db_usage_stats.max_connections})\n"
         f"• Автобекап: каждые <b>{AUTO_BACKUP_INTERVAL_HOURS}</b> ч\n"
         f"• Кому шлём автобекап: <code>{', '.join(map(str, AUTO_BACKUP_TARGET_IDS))}</code>\n"
         f"• Лог-файл: <code>{log_path}</code>\n"
@@ -162,12 +177,15 @@ async def dev_db_stats(callback: CallbackQuery):
 async def dev_broadcast_status(callback: CallbackQuery):
     if not await _guard_owner(callback):
         return
-    snap = broadcast_snapshot()
+    snap = await broadcast_snapshot()
     await callback.message.answer(
         "📨 <b>Статус рассылки</b>\n"
+        f"• Job: <b>{snap['job_id'] or '—'}</b>\n"
         f"• Running: <b>{'да' if snap['running'] else 'нет'}</b>\n"
         f"• Sent/Total: <b>{snap['sent']}/{snap['total']}</b>\n"
         f"• Errors: <b>{snap['errors']}</b>\n"
+        f"• Заблокировали бота: <b>{snap['unreachable']}</b>\n"
+        f"• В очереди: <b>{snap['pending']}</b>\n"
         f"• Cancel requested: <b>{'да' if snap['cancel_requested'] else 'нет'}</b>\n"
         f"• Elapsed: <b>{snap['elapsed_seconds']} сек</b>",
         reply_markup=get_dev_panel_keyboard(),
@@ -179,8 +197,8 @@ async def dev_broadcast_status(callback: CallbackQuery):
 async def dev_broadcast_stop(callback: CallbackQuery):
     if not await _guard_owner(callback):
         return
-    broadcast_request_cancel()
-    write_audit_event(callback.from_user.id, "owner", "broadcast_stop_requested")
+    cancelled = await broadcast_request_cancel()
+    write_audit_event(callback.from_user.id, "owner", "broadcast_stop_requested", {"jobs": cancelled})
     await callback.message.answer("⛔ Запрос на остановку рассылки отправлен.", reply_markup=get_dev_panel_keyboard())
     await callback.answer("OK")
 
@@ -307,6 +325,15 @@ async def dev_restore_last_backup(callback: CallbackQuery):
         return
 
     shutil.copy2(latest, DB_PATH)
+    # Соединения пула открыты на старый файл; бэкап мог быть снят до появления новых колонок,
+    # индексов и persons_fts — досинхронизируем схему, как при старте
+    await async_engine.dispose()
+    await init_db()
+    # Индекс нечёткого поиска, кэши поиска, профилей и ролей строились по старой базе
+    await client_name_index.build()
+    search_cache.clear()
+    profile_cache.clear()
+    role_cache.clear()
     write_audit_event(callback.from_user.id, "owner", "db_restore_from_backup", {"file": str(latest)})
     await callback.message.answer(
         f"♻ Восстановлено из: <code>{latest}</code>\nРекомендуется перезапустить бота.",
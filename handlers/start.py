@@ -3,10 +3,11 @@ from aiogram.types import Message, ReplyKeyboardRemove, ReplyKeyboardMarkup, Key
 from aiogram.filters import CommandStart
 from aiogram.fsm.context import FSMContext
 
-from sqlalchemy import select
+from sqlalchemy import or_, select
 from database.models import Person
 from database.session import AsyncSessionLocal
 from datetime import date
+from utils.phone import normalize_phone
 
 from forms.forms_fsm import RegistrationStates
 from keyboards.client_kb import get_client_keyboard
@@ -51,6 +52,10 @@ async def cmd_start(message: Message, state: FSMContext):
         else:
             # Обновляем данные (username и имена могут измениться)
             person.username = message.from_user.username or person.username
+            # Клиент снова написал боту — значит, рассылки до него снова доходят.
+            # Присваиваем только при смене, чтобы не делать UPDATE и не сбрасывать кэши на каждый /start
+            if person.unreachable_since is not None:
+                person.unreachable_since = None
 
             await session.commit()
 
@@ -87,11 +92,16 @@ async def process_phone(message: Message, state: FSMContext):
         )
         person: Person = result.scalar_one()
 
-        # Проверяем, не занят ли номер другим пользователем
+        # Проверяем, не занят ли номер другим пользователем — в том числе записанный в другом формате
+        same_phone = [Person.phone == phone_number]
+        phone_digits = normalize_phone(phone_number)
+        if phone_digits:
+            same_phone.append(Person.phone_digits == phone_digits)
+        # Совпасть могут двое: один по phone, другой по phone_digits (бэкфилл оставляет его пустым при коллизии форматов)
         existing = await session.execute(
-            select(Person).where(Person.phone == phone_number, Person.id != person.id)
+            select(Person.id).where(or_(*same_phone), Person.id != person.id).limit(1)
         )
-        if existing.scalar_one_or_none():
+        if existing.scalars().first() is not None:
             await message.answer(
                 "Этот номер телефона уже зарегистрирован за другим аккаунтом.\n"
                 "Если это ошибка — обратитесь к администратору.",
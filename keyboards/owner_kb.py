@@ -45,6 +45,7 @@ def get_broadcast_submenu_keyboard():
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="Сообщение одному клиенту", callback_data="broadcast_one")],
         [InlineKeyboardButton(text="Рассылка всем клиентам", callback_data="broadcast_all")],
+        [InlineKeyboardButton(text="🕒 Запланированные рассылки", callback_data="broadcast_scheduled")],
         [InlineKeyboardButton(text="◀ Назад в главное меню", callback_data="broadcast_back")],
     ])
 
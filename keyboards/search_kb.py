@@ -0,0 +1,53 @@
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.fsm.context import FSMContext
+from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
+
+from database.session import AsyncSessionLocal
+from services.search import SearchPage, page_callback_data, parse_page_callback, search_clients_page
+
+
+def get_search_results_keyboard(page: SearchPage, profile_prefix: str, page_prefix: str, cancel_data: str):
+    """Страница результатов поиска: клиенты, "Назад"/"Далее" с курсорами и отмена."""
+    kb = [
+        [InlineKeyboardButton(text=r.title, callback_data=f"{profile_prefix}{r.id}")]
+        for r in page.results
+    ]
+
+    nav = []
+    if page.prev_cursor is not None:
+        nav.append(InlineKeyboardButton(text="◀ Назад", callback_data=page_callback_data(page_prefix, False, page.prev_cursor)))
+    if page.next_cursor is not None:
+        nav.append(InlineKeyboardButton(text="Далее ▶", callback_data=page_callback_data(page_prefix, True, page.next_cursor)))
+    if nav:
+        kb.append(nav)
+
+    kb.append([InlineKeyboardButton(text="◀ Отмена", callback_data=cancel_data)])
+    return InlineKeyboardMarkup(inline_keyboard=kb)
+
+
+async def show_search_results_page(
+    callback: CallbackQuery,
+    state: FSMContext,
+    profile_prefix: str,
+    page_prefix: str,
+    cancel_data: str,
+    scope: str = "owner",
+) -> None:
+    """Листание результатов поиска: курсор страницы в callback_data, запрос — в состоянии (search_query)."""
+    forward, cursor = parse_page_callback(callback.data, page_prefix)
+    query = (await state.get_data()).get("search_query", "")
+
+    async with AsyncSessionLocal() as session:
+        page = await search_clients_page(session, query, cursor, forward, scope=scope)
+
+    if not page.results:
+        await callback.answer("Больше результатов нет")
+        return
+
+    try:
+        await callback.message.edit_reply_markup(
+            reply_markup=get_search_results_keyboard(page, profile_prefix, page_prefix, cancel_data)
+        )
+    except TelegramBadRequest:
+        pass
+    await callback.answer()
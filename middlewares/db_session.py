@@ -0,0 +1,95 @@
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from sqlalchemy import event
+
+from database.engine import async_engine
+from database.session import AsyncSessionLocal
+
+
+@dataclass
+class DbUsage:
+    """Сколько раз за апдейт брали соединение из пула и начинали транзакцию."""
+
+    connections: int = 0
+    transactions: int = 0
+
+
+class DbUsageStats:
+    """Сводка по всем апдейтам — для панели разработчика."""
+
+    def __init__(self) -> None:
+        self.updates = 0
+        self.updates_with_db = 0
+        self.connections = 0
+        self.transactions = 0
+        self.max_connections = 0
+
+    def record(self, usage: DbUsage) -> None:
+        self.updates += 1
+        if usage.connections:
+            self.updates_with_db += 1
+        self.connections += usage.connections
+        self.transactions += usage.transactions
+        self.max_connections = max(self.max_connections, usage.connections)
+
+    def per_update(self) -> tuple[float, float]:
+        """Среднее (соединений, транзакций) на апдейт, который вообще обращался к БД."""
+        if not self.updates_with_db:
+            return 0.0, 0.0
+        return self.connections / self.updates_with_db, self.transactions / self.updates_with_db
+
+
+db_usage_stats = DbUsageStats()
+_current_usage: ContextVar[Optional[DbUsage]] = ContextVar("db_usage", default=None)
+
+
+@event.listens_for(async_engine.sync_engine, "checkout")
+def _count_checkout(dbapi_connection, connection_record, connection_proxy) -> None:
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.connections += 1
+
+
+@event.listens_for(async_engine.sync_engine, "begin")
+def _count_begin(connection) -> None:
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.transactions += 1
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """Одна сессия БД на апдейт: data["db_session"], в конце commit или rollback.
+
+    Сессия ленивая: соединение берётся из пула при первом запросе, поэтому апдейты,
+    которые в БД не ходят, ничего не стоят. Хендлер может закоммитить раньше сам —
+    например, до отправки сообщений, чтобы не держать блокировку SQLite на время запросов к Telegram.
+    Счётчик соединений и транзакций апдейта — data["db_usage"].
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        usage = DbUsage()
+        token = _current_usage.set(usage)
+        try:
+            async with AsyncSessionLocal() as session:
+                data["db_session"] = session
+                data["db_usage"] = usage
+                try:
+                    result = await handler(event, data)
+                except BaseException:
+                    await session.rollback()
+                    raise
+                if session.in_transaction():
+                    await session.commit()
+                return result
+        finally:
+            _current_usage.reset(token)
+            db_usage_stats.record(usage)
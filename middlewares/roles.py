@@ -0,0 +1,78 @@
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User
+from sqlalchemy import select
+
+from config import OWNER_IDS
+from database.models import Person
+from database.session import AsyncSessionLocal
+
+STAFF_ROLES = ("admin", "owner")
+
+
+class RoleCache:
+    """Роли пользователей в памяти: один SELECT на пользователя, дальше — без БД.
+
+    Сбрасывается точечно при назначении/снятии админа и целиком при восстановлении базы из бэкапа;
+    TTL — страховка на случай правки роли мимо бота (прямо в БД); сверх max_size вытесняются
+    давно не спрашивавшиеся пользователи.
+    """
+
+    def __init__(self, ttl_seconds: float = 600.0, max_size: int = 50_000) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._roles: OrderedDict[int, Tuple[Optional[str], float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def get_role(self, user_id: int) -> Optional[str]:
+        """Роль из config/кэша/БД; None — пользователя нет в базе."""
+        if user_id in OWNER_IDS:
+            return "owner"
+
+        now = time.monotonic()
+        cached = self._roles.get(user_id)
+        if cached is not None and cached[1] > now:
+            self._roles.move_to_end(user_id)
+            self.hits += 1
+            return cached[0]
+
+        self.misses += 1
+        async with AsyncSessionLocal() as session:
+            role = await session.scalar(select(Person.role).where(Person.telegram_id == user_id))
+
+        self._roles[user_id] = (role, now + self.ttl_seconds)
+        self._roles.move_to_end(user_id)
+        while len(self._roles) > self.max_size:
+            self._roles.popitem(last=False)
+        return role
+
+    async def is_staff(self, user_id: int) -> bool:
+        return await self.get_role(user_id) in STAFF_ROLES
+
+    def invalidate(self, user_id: Optional[int]) -> None:
+        if user_id is not None:
+            self._roles.pop(user_id, None)
+
+    def clear(self) -> None:
+        self._roles.clear()
+
+
+role_cache = RoleCache()
+
+
+class RoleMiddleware(BaseMiddleware):
+    """Определяет роль отправителя один раз на апдейт и кладёт её в data["user_role"]."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user: Optional[User] = data.get("event_from_user")
+        data["user_role"] = await role_cache.get_role(user.id) if user is not None else None
+        return await handler(event, data)
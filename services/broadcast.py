@@ -0,0 +1,585 @@
+import asyncio
+import html
+import json
+import logging
+import re
+import time
+from collections import deque
+from dataclasses import dataclass, field, replace
+from typing import Awaitable, Callable, Iterable, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from aiogram.types import InputMediaDocument, InputMediaPhoto, InputMediaVideo
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import BROADCAST_RATE_LIMIT, BROADCAST_WORKERS
+from database.models import BroadcastDelivery, BroadcastJob, Person, get_kg_time
+from database.session import AsyncSessionLocal
+from keyboards.owner_kb import get_broadcast_submenu_keyboard
+from services.broadcast_template import BroadcastTemplate
+from services.recipients import BroadcastSegment, iter_recipient_rows
+from utils.audit import write_audit_event
+
+logger = logging.getLogger(__name__)
+
+# Сколько получателей воркер забирает из БД за один раз.
+# При падении процесса повторно могут уйти не больше одной пачки сообщений.
+DELIVERY_BATCH_SIZE = 100
+
+# Итоговые статусы доставки
+DELIVERY_SENT = "sent"
+DELIVERY_FAILED = "failed"
+DELIVERY_UNREACHABLE = "unreachable"
+# Рассылку остановили раньше, чем дошла очередь до получателя
+DELIVERY_CANCELLED = "cancelled"
+
+# Подпись к фото/видео/документу Telegram ограничивает 1024 символами (после разбора HTML-разметки)
+CAPTION_LIMIT = 1024
+_HTML_TAG_RE = re.compile(r"<[^>]+>")
+
+# Как часто обновлять сообщение с прогрессом и за какое окно считать скорость отправки
+PROGRESS_INTERVAL_SECONDS = 5.0
+PROGRESS_RATE_WINDOW_SECONDS = 30.0
+
+
+def is_unreachable_error(error: Exception) -> bool:
+    # Бот заблокирован / аккаунт удалён, либо чата больше не существует
+    if isinstance(error, TelegramForbiddenError):
+        return True
+    return isinstance(error, TelegramBadRequest) and "chat not found" in str(error).lower()
+
+
+class TokenBucket:
+    """Глобальный лимитер отправки: не больше `rate` сообщений в секунду на весь бот."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        self.rate = max(0.1, rate)
+        self.capacity = capacity if capacity is not None else max(1.0, self.rate / 5)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        # После 429 Telegram блокирует весь бот, поэтому останавливаем всех отправителей сразу
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+broadcast_bucket = TokenBucket(rate=BROADCAST_RATE_LIMIT)
+
+
+def caption_length(text: str) -> int:
+    """Длина подписи так, как её считает Telegram: без HTML-тегов, сущности — по одному символу."""
+    return len(html.unescape(_HTML_TAG_RE.sub("", text)))
+
+
+_INPUT_MEDIA = {
+    "photo": InputMediaPhoto,
+    "video": InputMediaVideo,
+    "document": InputMediaDocument,
+}
+
+
+@dataclass
+class BroadcastMessage:
+    """Содержимое рассылки: текст или вложения, уже загруженные в Telegram (по file_id).
+
+    Файл загружает владелец один раз, дальше каждому получателю уходит только file_id.
+    """
+
+    text: str
+    media: list[dict] = field(default_factory=list)
+
+    @classmethod
+    def from_job(cls, job: BroadcastJob) -> "BroadcastMessage":
+        return cls(text=job.text, media=json.loads(job.media) if job.media else [])
+
+    @property
+    def cost(self) -> int:
+        # Альбом из N файлов Telegram считает как N сообщений
+        return max(1, len(self.media))
+
+    async def send(self, bot: Bot, chat_id: int) -> None:
+        caption = self.text or None
+        if not self.media:
+            await bot.send_message(chat_id, self.text)
+        elif len(self.media) == 1:
+            item = self.media[0]
+            if item["type"] == "photo":
+                await bot.send_photo(chat_id, item["file_id"], caption=caption)
+            elif item["type"] == "video":
+                await bot.send_video(chat_id, item["file_id"], caption=caption)
+            else:
+                await bot.send_document(chat_id, item["file_id"], caption=caption)
+        else:
+            await bot.send_media_group(chat_id, [
+                _INPUT_MEDIA[item["type"]](media=item["file_id"], caption=caption if i == 0 else None)
+                for i, item in enumerate(self.media)
+            ])
+
+
+class BroadcastSender:
+    """Пул асинхронных воркеров, которые рассылают сообщения через общий TokenBucket."""
+
+    def __init__(
+        self,
+        bot: Bot,
+        bucket: TokenBucket = broadcast_bucket,
+        workers: int = BROADCAST_WORKERS,
+        max_retries: int = 3,
+    ) -> None:
+        self.bot = bot
+        self.bucket = bucket
+        self.workers = max(1, workers)
+        self.max_retries = max_retries
+        self.sent = 0
+        self.errors = 0
+        self.unreachable = 0
+
+    @property
+    def processed(self) -> int:
+        return self.sent + self.errors + self.unreachable
+
+    async def send(self, chat_id: int, message: BroadcastMessage) -> str:
+        for _ in range(self.max_retries + 1):
+            for _ in range(message.cost):
+                await self.bucket.acquire()
+            try:
+                await message.send(self.bot, chat_id)
+                return DELIVERY_SENT
+            except TelegramRetryAfter as e:
+                logger.warning("Flood control при рассылке: пауза %s сек", e.retry_after)
+                self.bucket.pause(e.retry_after)
+            except Exception as e:
+                if is_unreachable_error(e):
+                    return DELIVERY_UNREACHABLE
+                logger.debug("Не удалось отправить сообщение %s: %s", chat_id, e)
+                return DELIVERY_FAILED
+        return DELIVERY_FAILED
+
+    async def run(
+        self,
+        recipients: Iterable[int],
+        message: BroadcastMessage,
+        on_result: Optional[Callable[[int, str], Awaitable[None]]] = None,
+        texts: Optional[dict[int, str]] = None,
+    ) -> tuple[int, int]:
+        """texts — персональные тексты по chat_id; для остальных уходит общий message."""
+        queue: asyncio.Queue[int] = asyncio.Queue(maxsize=self.workers * 2)
+
+        async def worker() -> None:
+            while True:
+                chat_id = await queue.get()
+                try:
+                    text = texts.get(chat_id) if texts else None
+                    result = await self.send(chat_id, message if text is None else replace(message, text=text))
+                    if result == DELIVERY_SENT:
+                        self.sent += 1
+                    elif result == DELIVERY_UNREACHABLE:
+                        self.unreachable += 1
+                    else:
+                        self.errors += 1
+                    if on_result is not None:
+                        await on_result(chat_id, result)
+                finally:
+                    queue.task_done()
+
+        tasks = [asyncio.create_task(worker()) for _ in range(self.workers)]
+        try:
+            for chat_id in recipients:
+                await queue.put(chat_id)
+            await queue.join()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        return self.sent, self.errors
+
+
+# Будит воркер, когда появилась новая рассылка
+_new_job_event = asyncio.Event()
+
+
+def notify_worker() -> None:
+    _new_job_event.set()
+
+
+async def fill_deliveries(session: AsyncSession, job: BroadcastJob) -> None:
+    # Шаблон разбирается один раз; ошибки в нём отлавливаются ещё при подтверждении рассылки
+    template = BroadcastTemplate.compile(job.text)
+    if not template.is_personalized:
+        job.text = template.tail
+    # Общую подпись проверяют при подтверждении; персональную можно проверить только после подстановки
+    check_caption = bool(job.media) and template.is_personalized
+
+    total = 0
+    too_long = 0
+    async for rows in iter_recipient_rows(
+        session,
+        BroadcastSegment.from_json(job.segment),
+        columns=template.columns(),
+        join_latest_vision=template.uses_vision,
+    ):
+        deliveries = []
+        for row in rows:
+            text = template.render(row._mapping) if template.is_personalized else None
+            # Telegram отклонит такую подпись — сразу failed, не тратя на неё запрос
+            failed = check_caption and caption_length(text) > CAPTION_LIMIT
+            too_long += failed
+            deliveries.append({
+                "job_id": job.id,
+                "telegram_id": row.telegram_id,
+                "text": text,
+                "status": DELIVERY_FAILED if failed else "pending",
+            })
+        await session.execute(insert(BroadcastDelivery), deliveries)
+        total += len(rows)
+    job.total = total
+    if too_long:
+        logger.warning("Рассылка %s: у %s получателей подпись длиннее %s символов", job.id, too_long, CAPTION_LIMIT)
+
+
+async def enqueue_broadcast(
+    message: BroadcastMessage,
+    requested_by: int,
+    progress_message_id: Optional[int] = None,
+    segment: Optional[BroadcastSegment] = None,
+) -> int:
+    # Только строка задания: выборку получателей и доставки делает broadcast_worker,
+    # чтобы подтверждение рассылки не ждало обхода всей базы клиентов
+    async with AsyncSessionLocal() as session:
+        job = BroadcastJob(
+            text=message.text,
+            media=json.dumps(message.media) if message.media else None,
+            segment=segment.to_json() if segment else None,
+            requested_by=requested_by,
+            progress_message_id=progress_message_id,
+        )
+        session.add(job)
+        await session.commit()
+        job_id = job.id
+
+    notify_worker()
+    return job_id
+
+
+async def _count_deliveries(job_id: int) -> dict[str, int]:
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(BroadcastDelivery.status, func.count(BroadcastDelivery.id))
+            .where(BroadcastDelivery.job_id == job_id)
+            .group_by(BroadcastDelivery.status)
+        )
+        return {status: count for status, count in result.all()}
+
+
+async def _claim_batch(job_id: int) -> list[tuple[int, int, Optional[str]]]:
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(BroadcastDelivery.id, BroadcastDelivery.telegram_id, BroadcastDelivery.text)
+            .where(BroadcastDelivery.job_id == job_id, BroadcastDelivery.status == "pending")
+            .order_by(BroadcastDelivery.id)
+            .limit(DELIVERY_BATCH_SIZE)
+        )
+        batch = [tuple(row) for row in result.all()]
+        if batch:
+            await session.execute(
+                update(BroadcastDelivery)
+                .where(BroadcastDelivery.id.in_([delivery_id for delivery_id, _, _ in batch]))
+                .values(status="sending", updated_at=get_kg_time())
+            )
+            await session.commit()
+        return batch
+
+
+async def _save_results(results: dict[int, str], unreachable_chat_ids: list[int]) -> None:
+    now = get_kg_time()
+    by_status: dict[str, list[int]] = {}
+    for delivery_id, status in results.items():
+        by_status.setdefault(status, []).append(delivery_id)
+
+    async with AsyncSessionLocal() as session:
+        for status, delivery_ids in by_status.items():
+            await session.execute(
+                update(BroadcastDelivery).where(BroadcastDelivery.id.in_(delivery_ids)).values(status=status, updated_at=now)
+            )
+        if unreachable_chat_ids:
+            await session.execute(
+                update(Person)
+                .where(Person.telegram_id.in_(unreachable_chat_ids), Person.unreachable_since.is_(None))
+                .values(unreachable_since=now)
+            )
+        await session.commit()
+
+
+async def _job_status(job_id: int) -> Optional[str]:
+    async with AsyncSessionLocal() as session:
+        return await session.scalar(select(BroadcastJob.status).where(BroadcastJob.id == job_id))
+
+
+async def _next_job() -> Optional[BroadcastJob]:
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(BroadcastJob)
+            .where(BroadcastJob.status.in_(("pending", "running")))
+            .order_by(BroadcastJob.id)
+            .limit(1)
+        )
+        job = result.scalar_one_or_none()
+        if job is not None and job.status == "pending":
+            # Доставки и статус "running" фиксируются одной транзакцией: если процесс упадёт посреди
+            # выборки получателей, задание останется "pending" без доставок и начнётся заново
+            await fill_deliveries(session, job)
+            job.status = "running"
+            job.started_at = get_kg_time()
+            await session.commit()
+        return job
+
+
+def _format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours} ч {minutes} мин"
+    if minutes:
+        return f"{minutes} мин {seconds} сек"
+    return f"{seconds} сек"
+
+
+class ProgressReporter:
+    """Обновляет сообщение с прогрессом рассылки раз в `interval` секунд отдельной задачей.
+
+    Счётчики берутся у BroadcastSender (плюс то, что было отправлено до перезапуска),
+    поэтому прогресс не зависит от соотношения успехов и ошибок. Если ничего не изменилось — правки нет.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        job: BroadcastJob,
+        sender: BroadcastSender,
+        base_counts: dict[str, int],
+        interval: float = PROGRESS_INTERVAL_SECONDS,
+    ) -> None:
+        self.bot = bot
+        self.job = job
+        self.sender = sender
+        self.base_counts = base_counts
+        self.interval = interval
+        self._samples: deque[tuple[float, int]] = deque()
+        self._last_shown: Optional[tuple[int, int, int]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._started_at = time.monotonic()
+
+    def counts(self) -> tuple[int, int, int]:
+        return (
+            self.base_counts.get(DELIVERY_SENT, 0) + self.sender.sent,
+            self.base_counts.get(DELIVERY_FAILED, 0) + self.sender.errors,
+            self.base_counts.get(DELIVERY_UNREACHABLE, 0) + self.sender.unreachable,
+        )
+
+    def rate(self) -> float:
+        # Скорость за последние PROGRESS_RATE_WINDOW_SECONDS — по фактическим ответам Telegram
+        now = time.monotonic()
+        self._samples.append((now, self.sender.processed))
+        while len(self._samples) > 2 and now - self._samples[0][0] > PROGRESS_RATE_WINDOW_SECONDS:
+            self._samples.popleft()
+        first_at, first_processed = self._samples[0]
+        if now - first_at <= 0:
+            return 0.0
+        return (self.sender.processed - first_processed) / (now - first_at)
+
+    async def report(self) -> None:
+        counts = self.counts()
+        rate = self.rate()
+        if counts == self._last_shown or self.job.progress_message_id is None:
+            return
+
+        sent, errors, unreachable = counts
+        remaining = max(0, self.job.total - sent - errors - unreachable)
+        eta = _format_duration(remaining / rate) if rate > 0 else "—"
+        try:
+            await self.bot.edit_message_text(
+                chat_id=self.job.requested_by,
+                message_id=self.job.progress_message_id,
+                text=(
+                    "📢 Рассылка в процессе...\n"
+                    f"Отправлено: {sent} из {self.job.total}\n"
+                    f"Ошибок: {errors}\n"
+                    f"Недоступны: {unreachable}\n"
+                    f"Скорость: {rate:.1f} сообщ./сек\n"
+                    f"Осталось: ~{eta}"
+                ),
+            )
+            self._last_shown = counts
+        except TelegramRetryAfter as e:
+            # Правка прогресса не важнее самой рассылки — просто пропускаем
+            logger.debug("Прогресс рассылки #%s: flood control %s сек", self.job.id, e.retry_after)
+        except TelegramBadRequest:
+            self._last_shown = counts
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.report()
+            except Exception as e:
+                logger.warning("Не удалось обновить прогресс рассылки #%s: %s", self.job.id, e)
+
+    def start(self) -> None:
+        self.rate()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def summary(self) -> str:
+        elapsed = time.monotonic() - self._started_at
+        average = self.sender.processed / elapsed if elapsed > 0 else 0.0
+        return f"Время: {_format_duration(elapsed)}, в среднем {average:.1f} сообщ./сек"
+
+
+async def _finish_job(bot: Bot, job: BroadcastJob, cancelled: bool, stats: str = "") -> None:
+    now = get_kg_time()
+    async with AsyncSessionLocal() as session:
+        # Отмену (utils/broadcast_monitor.request_cancel) могли запросить во время последней пачки —
+        # "done" ставим только задаче, которая всё ещё "running", а "cancelled" не затираем
+        await session.execute(
+            update(BroadcastJob)
+            .where(BroadcastJob.id == job.id, BroadcastJob.status == "running")
+            .values(status="done")
+        )
+        cancelled = cancelled or await session.scalar(
+            select(BroadcastJob.status).where(BroadcastJob.id == job.id)
+        ) == "cancelled"
+        await session.execute(update(BroadcastJob).where(BroadcastJob.id == job.id).values(finished_at=now))
+        if cancelled:
+            # Неотправленные доставки закрываем, иначе они навсегда остаются "в очереди" в сводках
+            await session.execute(
+                update(BroadcastDelivery)
+                .where(BroadcastDelivery.job_id == job.id, BroadcastDelivery.status.in_(("pending", "sending")))
+                .values(status=DELIVERY_CANCELLED, updated_at=now)
+            )
+        await session.commit()
+
+    counts = await _count_deliveries(job.id)
+    sent = counts.get(DELIVERY_SENT, 0)
+    errors = counts.get(DELIVERY_FAILED, 0)
+    unreachable = counts.get(DELIVERY_UNREACHABLE, 0)
+    write_audit_event(
+        job.requested_by, "owner", "broadcast_all_finish",
+        {"job_id": job.id, "sent": sent, "errors": errors, "unreachable": unreachable},
+    )
+
+    cancelled_note = f"\n⛔ Остановлена вручную, не отправлено: {counts.get(DELIVERY_CANCELLED, 0)}" if cancelled else ""
+    try:
+        await bot.send_message(
+            job.requested_by,
+            f"✅ Рассылка завершена!\nУспешно: {sent}\nОшибок: {errors}\n"
+            f"Заблокировали бота (исключены из рассылок): {unreachable}\n{stats}{cancelled_note}",
+            reply_markup=get_broadcast_submenu_keyboard()
+        )
+    except Exception as e:
+        logger.warning("Не удалось отправить итог рассылки #%s: %s", job.id, e)
+
+
+async def _process_job(bot: Bot, job: BroadcastJob) -> None:
+    logger.info("Рассылка #%s: старт/продолжение, получателей %s", job.id, job.total)
+    sender = BroadcastSender(bot)
+    message = BroadcastMessage.from_job(job)
+    reporter = ProgressReporter(bot, job, sender, await _count_deliveries(job.id))
+    reporter.start()
+    try:
+        cancelled = await _send_pending(job, sender, message)
+    finally:
+        await reporter.stop()
+    # Последнее обновление, чтобы сообщение с прогрессом не застыло на промежуточных цифрах
+    await reporter.report()
+    await _finish_job(bot, job, cancelled=cancelled, stats=reporter.summary())
+
+
+async def _send_pending(job: BroadcastJob, sender: BroadcastSender, message: BroadcastMessage) -> bool:
+    """Рассылает все оставшиеся доставки задания. Возвращает True, если рассылку остановили."""
+    while True:
+        if await _job_status(job.id) == "cancelled":
+            return True
+
+        batch = await _claim_batch(job.id)
+        if not batch:
+            return False
+
+        delivery_by_chat = {telegram_id: delivery_id for delivery_id, telegram_id, _ in batch}
+        texts = {telegram_id: text for _, telegram_id, text in batch if text is not None}
+        results: dict[int, str] = {}
+        unreachable_chat_ids: list[int] = []
+
+        async def collect(chat_id: int, status: str) -> None:
+            results[delivery_by_chat[chat_id]] = status
+            if status == DELIVERY_UNREACHABLE:
+                unreachable_chat_ids.append(chat_id)
+
+        try:
+            await sender.run(delivery_by_chat.keys(), message, on_result=collect, texts=texts)
+        finally:
+            # При остановке бота сохраняем уже отправленное, чтобы не слать повторно
+            await _save_results(results, unreachable_chat_ids)
+
+
+async def _requeue_interrupted() -> None:
+    # Пачка, которая была "в полёте" при остановке процесса, снова уходит в очередь
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            update(BroadcastDelivery)
+            .where(BroadcastDelivery.status == "sending")
+            .values(status="pending")
+        )
+        await session.commit()
+        if result.rowcount:
+            logger.info("Возвращено в очередь прерванных доставок: %s", result.rowcount)
+
+
+async def broadcast_worker(bot: Bot, idle_poll_seconds: float = 30.0) -> None:
+    logger.info("Broadcast worker started")
+    await _requeue_interrupted()
+
+    while True:
+        try:
+            _new_job_event.clear()
+            job = await _next_job()
+            if job is None:
+                try:
+                    await asyncio.wait_for(_new_job_event.wait(), timeout=idle_poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await _process_job(bot, job)
+        except asyncio.CancelledError:
+            logger.info("Broadcast worker cancelled")
+            raise
+        except Exception as e:
+            logger.error("Broadcast worker failed: %s", e, exc_info=True)
+            await asyncio.sleep(5)
@@ -0,0 +1,212 @@
+import asyncio
+import heapq
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select
+
+from database.models import BroadcastJob, as_kg_time, get_kg_time
+from database.session import AsyncSessionLocal
+from services.broadcast import BroadcastMessage, notify_worker
+from services.recipients import BroadcastSegment
+from utils.audit import write_audit_event
+
+logger = logging.getLogger(__name__)
+
+REPEAT_INTERVALS = {
+    "daily": timedelta(days=1),
+    "weekly": timedelta(weeks=1),
+}
+
+
+# Повтор запуска, если _fire упал (БД занята и т.п.): 5 сек, 10, 20... но не реже раза в 5 минут
+FIRE_RETRY_BASE_SECONDS = 5.0
+FIRE_RETRY_MAX_SECONDS = 300.0
+
+
+REPEAT_WORDS = {
+    "ежедневно": "daily",
+    "еженедельно": "weekly",
+}
+REPEAT_NAMES = {value: key for key, value in REPEAT_WORDS.items()}
+
+
+def parse_schedule_input(raw: str, now: Optional[datetime] = None) -> Optional[tuple[datetime, Optional[str]]]:
+    """Разбирает "ЧЧ:ММ" или "ДД.ММ.ГГГГ ЧЧ:ММ" (время Бишкека) и необязательное "ежедневно"/"еженедельно"."""
+    now = now or get_kg_time()
+    words = raw.lower().split()
+    repeat = None
+    if words and words[-1] in REPEAT_WORDS:
+        repeat = REPEAT_WORDS[words.pop()]
+
+    try:
+        if len(words) == 1:
+            moment = datetime.strptime(words[0], "%H:%M")
+            due_at = now.replace(hour=moment.hour, minute=moment.minute, second=0, microsecond=0)
+            if due_at <= now:
+                due_at += timedelta(days=1)
+        elif len(words) == 2:
+            due_at = datetime.strptime(" ".join(words), "%d.%m.%Y %H:%M").replace(tzinfo=now.tzinfo)
+        else:
+            return None
+    except ValueError:
+        return None
+
+    if due_at <= now:
+        return None
+    return due_at, repeat
+
+
+class BroadcastScheduler:
+    """Запланированные рассылки: одна куча таймеров на все задания вместо отдельной задачи на каждое.
+
+    Сами задания лежат в broadcast_jobs со статусом "scheduled", куча восстанавливается из БД при старте.
+    """
+
+    def __init__(self) -> None:
+        # (когда запускать, id задания, на какое время оно назначено): при повторе после ошибки
+        # запуск откладывается, а назначенное время остаётся прежним — по нему _fire сверяет задание с БД
+        self._heap: list[tuple[float, int, float]] = []
+        self._attempts: dict[int, int] = {}
+        self._wakeup = asyncio.Event()
+
+    def _push(self, job_id: int, due_at: datetime) -> None:
+        due_ts = as_kg_time(due_at).timestamp()
+        heapq.heappush(self._heap, (due_ts, job_id, due_ts))
+        self._wakeup.set()
+
+    def _retry_later(self, job_id: int, due_ts: float) -> float:
+        attempt = self._attempts.get(job_id, 0) + 1
+        self._attempts[job_id] = attempt
+        delay = min(FIRE_RETRY_MAX_SECONDS, FIRE_RETRY_BASE_SECONDS * 2 ** (attempt - 1))
+        heapq.heappush(self._heap, (get_kg_time().timestamp() + delay, job_id, due_ts))
+        return delay
+
+    async def load(self) -> None:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(BroadcastJob.id, BroadcastJob.scheduled_at).where(BroadcastJob.status == "scheduled")
+            )
+            rows = result.all()
+
+        self._heap = []
+        for job_id, scheduled_at in rows:
+            self._push(job_id, scheduled_at)
+        logger.info("Загружено запланированных рассылок: %s", len(rows))
+
+    async def schedule(
+        self,
+        message: BroadcastMessage,
+        requested_by: int,
+        scheduled_at: datetime,
+        repeat: Optional[str] = None,
+        segment: Optional[BroadcastSegment] = None,
+    ) -> int:
+        async with AsyncSessionLocal() as session:
+            job = BroadcastJob(
+                text=message.text,
+                media=json.dumps(message.media) if message.media else None,
+                segment=segment.to_json() if segment else None,
+                requested_by=requested_by,
+                status="scheduled",
+                scheduled_at=scheduled_at,
+                repeat=repeat,
+            )
+            session.add(job)
+            await session.commit()
+            job_id = job.id
+
+        self._push(job_id, scheduled_at)
+        return job_id
+
+    async def _fire(self, job_id: int, due_ts: float) -> None:
+        async with AsyncSessionLocal() as session:
+            job = await session.get(BroadcastJob, job_id)
+            # Отменённые или перенесённые задания просто выпадают из кучи
+            if job is None or job.status != "scheduled" or abs(as_kg_time(job.scheduled_at).timestamp() - due_ts) > 1:
+                return
+
+            if job.repeat in REPEAT_INTERVALS:
+                run = BroadcastJob(
+                    text=job.text, media=job.media, segment=job.segment, requested_by=job.requested_by
+                )
+                session.add(run)
+                await session.flush()
+
+                next_at = as_kg_time(job.scheduled_at)
+                while next_at <= get_kg_time():
+                    next_at += REPEAT_INTERVALS[job.repeat]
+                job.scheduled_at = next_at
+                run_id = run.id
+            else:
+                # Получателей выберет broadcast_worker при старте задания
+                job.status = "pending"
+                run_id = job.id
+                next_at = None
+
+            await session.commit()
+            requested_by = job.requested_by
+
+        if next_at is not None:
+            self._push(job_id, next_at)
+        write_audit_event(requested_by, "system", "broadcast_schedule_fired", {"job_id": job_id, "run_id": run_id})
+        notify_worker()
+
+    async def run(self) -> None:
+        await self.load()
+        logger.info("Broadcast scheduler started")
+
+        while True:
+            try:
+                self._wakeup.clear()
+                now = get_kg_time().timestamp()
+                if self._heap and self._heap[0][0] <= now:
+                    _, job_id, due_ts = heapq.heappop(self._heap)
+                    try:
+                        await self._fire(job_id, due_ts)
+                    except Exception as e:
+                        # Задание не должно выпасть из кучи: до перезапуска бота о нём больше никто не вспомнит
+                        delay = self._retry_later(job_id, due_ts)
+                        logger.error(
+                            "Не удалось запустить запланированную рассылку #%s, повтор через %.0f сек: %s",
+                            job_id, delay, e, exc_info=True,
+                        )
+                    else:
+                        self._attempts.pop(job_id, None)
+                    continue
+
+                # Спим до ближайшего задания (не дольше минуты) или до появления нового
+                timeout = min(60.0, self._heap[0][0] - now) if self._heap else 60.0
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                logger.info("Broadcast scheduler cancelled")
+                raise
+            except Exception as e:
+                logger.error("Broadcast scheduler failed: %s", e, exc_info=True)
+                await asyncio.sleep(5)
+
+
+async def list_scheduled() -> list[BroadcastJob]:
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(BroadcastJob).where(BroadcastJob.status == "scheduled").order_by(BroadcastJob.scheduled_at)
+        )
+        return list(result.scalars().all())
+
+
+async def cancel_scheduled(job_id: int) -> bool:
+    async with AsyncSessionLocal() as session:
+        job = await session.get(BroadcastJob, job_id)
+        if job is None or job.status != "scheduled":
+            return False
+        job.status = "cancelled"
+        await session.commit()
+    return True
+
+
+broadcast_scheduler = BroadcastScheduler()
@@ -0,0 +1,110 @@
+import html
+import re
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Optional
+
+from database.models import Person, Vision
+
+# Переменные шаблона: поля клиента и его последней записи зрения
+PERSON_FIELDS = {
+    "first_name": Person.first_name,
+    "last_name": Person.last_name,
+    "full_name": Person.full_name,
+    "username": Person.username,
+    "phone": Person.phone,
+    "age": Person.age,
+    "last_visit_date": Person.last_visit_date,
+}
+VISION_FIELDS = {
+    "visit_date": Vision.visit_date,
+    "lens_type": Vision.lens_type,
+    "frame_model": Vision.frame_model,
+    "sph_r": Vision.sph_r,
+    "cyl_r": Vision.cyl_r,
+    "axis_r": Vision.axis_r,
+    "sph_l": Vision.sph_l,
+    "cyl_l": Vision.cyl_l,
+    "axis_l": Vision.axis_l,
+    "pd": Vision.pd,
+}
+TEMPLATE_FIELDS = {**PERSON_FIELDS, **VISION_FIELDS}
+
+TEMPLATE_HELP = (
+    "Можно персонализировать текст: <code>{first_name}</code>, <code>{full_name}</code>, "
+    "<code>{last_visit_date}</code>, <code>{lens_type}</code>, <code>{frame_model}</code> и др.\n"
+    "Значение по умолчанию, если поле пустое: <code>{first_name|клиент}</code>. "
+    "Остальные фигурные скобки остаются как есть; переменную как текст: <code>{{first_name}}</code>."
+)
+
+# Переменная — только {имя} или {имя|значение по умолчанию}, где имя — латинский идентификатор;
+# {{имя}} — та же запись как текст. Прочие скобки ("скидка {только сегодня}", JSON, одиночная "}")
+# остаются в тексте как есть
+_TOKEN_RE = re.compile(
+    r"\{\{(?P<escaped>\s*[A-Za-z_][A-Za-z0-9_]*\s*(?:\|[^{}]*)?)\}\}"
+    r"|\{\s*(?P<name>[A-Za-z_][A-Za-z0-9_]*)\s*(?:\|(?P<default>[^{}]*))?\}"
+)
+
+
+class TemplateError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class BroadcastTemplate:
+    """Шаблон рассылки, разобранный один раз: чередование готового текста и переменных."""
+
+    parts: tuple[tuple[str, Optional[str], str], ...]  # (текст перед переменной, переменная, значение по умолчанию)
+    tail: str
+
+    @classmethod
+    def compile(cls, text: str) -> "BroadcastTemplate":
+        parts = []
+        literal = []
+        position = 0
+        for match in _TOKEN_RE.finditer(text):
+            literal.append(text[position:match.start()])
+            position = match.end()
+            if match.group("escaped") is not None:
+                literal.append(f"{{{match.group('escaped')}}}")
+                continue
+
+            name, default = match.group("name"), match.group("default") or ""
+            if name not in TEMPLATE_FIELDS:
+                raise TemplateError(f"Неизвестная переменная {{{name}}}. Доступны: {', '.join(TEMPLATE_FIELDS)}")
+            parts.append(("".join(literal), name, default.strip()))
+            literal = []
+
+        literal.append(text[position:])
+        return cls(parts=tuple(parts), tail="".join(literal))
+
+    @property
+    def fields(self) -> list[str]:
+        return list(dict.fromkeys(name for _, name, _ in self.parts))
+
+    @property
+    def is_personalized(self) -> bool:
+        return bool(self.parts)
+
+    @property
+    def uses_vision(self) -> bool:
+        return any(name in VISION_FIELDS for name in self.fields)
+
+    def columns(self) -> list:
+        return [TEMPLATE_FIELDS[name].label(name) for name in self.fields]
+
+    def render(self, values: dict[str, Any]) -> str:
+        chunks = []
+        for literal, name, default in self.parts:
+            chunks.append(literal)
+            chunks.append(html.escape(_format_value(values.get(name)) or default))
+        chunks.append(self.tail)
+        return "".join(chunks)
+
+
+def _format_value(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, date):
+        return value.strftime("%d.%m.%Y")
+    return str(value)
@@ -0,0 +1,146 @@
+import asyncio
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Sequence
+
+from openpyxl import Workbook
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import Person, Vision
+
+# Строк из БД за один заход: столько же держим в памяти и столько же пишем в лист за один переход в поток
+EXPORT_BATCH_SIZE = 1000
+
+CLIENT_HEADERS = (
+    "ID", "ФИО", "Имя", "Фамилия", "Возраст", "Телефон", "Telegram ID", "Роль", "Дата регистрации", "Последний визит",
+)
+CLIENT_COLUMNS = (
+    Person.id, Person.full_name, Person.first_name, Person.last_name, Person.age, Person.phone,
+    Person.telegram_id, Person.role, Person.created_at, Person.last_visit_date,
+)
+VISION_HEADERS = (
+    "Client ID", "ФИО клиента", "Дата визита", "SPH R", "CYL R", "AXIS R", "SPH L", "CYL L", "AXIS L",
+    "PD", "Тип линз", "Модель оправы", "Примечание",
+)
+VISION_COLUMNS = (
+    Vision.person_id, Person.full_name, Vision.visit_date, Vision.sph_r, Vision.cyl_r, Vision.axis_r,
+    Vision.sph_l, Vision.cyl_l, Vision.axis_l, Vision.pd, Vision.lens_type, Vision.frame_model, Vision.note,
+)
+LAST_VISION_HEADERS = (
+    "Дата последней записи зрения", "SPH R", "CYL R", "AXIS R", "SPH L", "CYL L", "AXIS L",
+    "PD", "Тип линз", "Модель оправы", "Примечание",
+)
+LAST_VISION_FIELDS = (
+    "visit_date", "sph_r", "cyl_r", "axis_r", "sph_l", "cyl_l", "axis_l", "pd", "lens_type", "frame_model", "note",
+)
+
+Row = Sequence[Any]
+
+
+def client_cells(row: Row) -> list:
+    """Строка выгрузки клиента из значений CLIENT_COLUMNS; пустые — прочерком, как в карточке профиля."""
+    person_id, full_name, first_name, last_name, age, phone, telegram_id, role, created_at, last_visit_date = row
+    return [
+        person_id,
+        full_name or "—",
+        first_name or "—",
+        last_name or "—",
+        age or "—",
+        phone or "—",
+        telegram_id or "—",
+        role,
+        created_at.date() if created_at else "—",
+        last_visit_date or "—",
+    ]
+
+
+def vision_cells(row: Row) -> list:
+    """Строка выгрузки записи зрения из значений VISION_COLUMNS."""
+    person_id, full_name, visit_date, *values = row
+    return [person_id, full_name or "—", visit_date, *(value or "—" for value in values)]
+
+
+def client_last_vision_cells(row: Row) -> list:
+    """Строка выгрузки "клиенты + последняя запись" из значений clients_last_vision_query()."""
+    client, (visit_date, *values) = row[:len(CLIENT_COLUMNS)], row[len(CLIENT_COLUMNS):]
+    if visit_date is None:
+        return client_cells(client) + ["—"] * len(LAST_VISION_HEADERS)
+    return client_cells(client) + [visit_date, *(value or "—" for value in values)]
+
+
+def clients_query() -> Select:
+    """Все клиенты по порядку id — строки для client_cells()."""
+    return select(*CLIENT_COLUMNS).order_by(Person.id)
+
+
+def visions_query() -> Select:
+    """Все записи зрения с ФИО клиента по порядку id — строки для vision_cells()."""
+    return select(*VISION_COLUMNS).join(Person, Vision.person).order_by(Vision.id)
+
+
+def clients_last_vision_query() -> Select:
+    """Все клиенты с их последней записью зрения — одним запросом.
+
+    Последняя запись — коррелированный подзапрос по ix_visions_person_visit (как в services/recipients.py):
+    на SQLite это вдвое быстрее ROW_NUMBER() OVER (PARTITION BY person_id ...), который сначала
+    нумерует и сортирует все визиты во временной таблице (см. benchmarks/export_benchmark.py).
+    Клиенты без визитов остаются с пустыми колонками.
+    """
+    latest_vision_id = (
+        select(Vision.id)
+        .where(Vision.person_id == Person.id)
+        .order_by(Vision.visit_date.desc(), Vision.id.desc())
+        .limit(1)
+        .correlate(Person)
+        .scalar_subquery()
+    )
+    return (
+        select(*CLIENT_COLUMNS, *(getattr(Vision, field) for field in LAST_VISION_FIELDS))
+        .outerjoin(Vision, Vision.id == latest_vision_id)
+        .order_by(Person.id)
+    )
+
+
+async def stream_rows(session: AsyncSession, stmt: Select, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[Sequence[Row]]:
+    """Результат запроса пачками через серверный курсор — в памяти не больше batch_size строк."""
+    result = await session.stream(stmt.execution_options(yield_per=batch_size))
+    async for partition in result.partitions():
+        yield partition
+
+
+def _append_rows(sheet, batch: Sequence[Row], cells: Callable[[Row], list]) -> int:
+    for row in batch:
+        sheet.append(cells(row))
+    return len(batch)
+
+
+async def write_xlsx(
+    batches: AsyncIterator[Sequence[Row]],
+    headers: Sequence[str],
+    cells: Callable[[Row], list],
+    title: str,
+) -> tuple[Path, int]:
+    """Пишет пачки строк во временный .xlsx (openpyxl write-only) и возвращает (путь, число строк).
+
+    Лист в режиме write-only сразу уходит на диск, поэтому память не растёт с размером выгрузки;
+    запись в лист и сохранение идут в отдельном потоке, чтобы не держать event loop.
+    Файл удаляет вызывающий — после отправки.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title)
+    sheet.append(list(headers))
+
+    rows = 0
+    async for batch in batches:
+        rows += await asyncio.to_thread(_append_rows, sheet, batch, cells)
+
+    fd, path = tempfile.mkstemp(prefix="optic_export_", suffix=".xlsx")
+    os.close(fd)
+    try:
+        await asyncio.to_thread(workbook.save, path)
+    except BaseException:
+        Path(path).unlink(missing_ok=True)
+        raise
+    return Path(path), rows
@@ -0,0 +1,196 @@
+import logging
+import math
+import re
+import unicodedata
+from typing import Optional
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session, object_session
+
+from database.models import Person
+from database.session import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Порог похожести (коэффициент Жаккара по триграммам), как у pg_trgm по умолчанию
+SIMILARITY_THRESHOLD = 0.3
+
+# Кириллица (включая кыргызские ң, ө, ү) → латиница; латиница дальше упрощается одинаково для обоих алфавитов
+_CYRILLIC_TO_LATIN = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e", "ж": "zh", "з": "z",
+    "и": "i", "й": "i", "к": "k", "л": "l", "м": "m", "н": "n", "ң": "ng", "о": "o", "ө": "o",
+    "п": "p", "р": "r", "с": "s", "т": "t", "у": "u", "ү": "u", "ф": "f", "х": "h", "һ": "h",
+    "ц": "ts", "ч": "ch", "ш": "sh", "щ": "sh", "ъ": "", "ы": "i", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+})
+# Разные латинские записи одного звука: Jyldyz/Zhyldyz, Aikhan/Aihan, Nurlanov/Nurlanow
+_LATIN_RULES = (("kh", "h"), ("j", "zh"), ("y", "i"), ("w", "v"), ("q", "k"), ("x", "ks"))
+_NON_LETTERS_RE = re.compile(r"[^a-z]+")
+_REPEATS_RE = re.compile(r"(.)\1+")
+
+
+def normalize_name(text: str) -> str:
+    """Ключ для нечёткого поиска: "Айгуль", "Aigul" и "Айгул" дают одно и то же "aigul"."""
+    text = text.lower().translate(_CYRILLIC_TO_LATIN)
+    if not text.isascii():
+        # Латиница с диакритикой (ö, ü, é) → базовые буквы
+        text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode()
+    for source, target in _LATIN_RULES:
+        text = text.replace(source, target)
+    text = _NON_LETTERS_RE.sub(" ", text)
+    return _REPEATS_RE.sub(r"\1", text).strip()
+
+
+def trigrams(key: str) -> set[str]:
+    result = set()
+    for word in key.split():
+        padded = f"  {word} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+def _display_name(first_name: str | None, last_name: str | None) -> str:
+    # full_name — вычисляемая колонка и в событиях ORM ещё не загружена, поэтому собираем имя сами
+    return " ".join(part.strip() for part in (first_name, last_name) if part and part.strip())
+
+
+class TrigramIndex:
+    """Триграммный индекс имён клиентов в памяти процесса.
+
+    Индексируются различные нормализованные имена (у сотни "Айгуль Асановых" один ключ),
+    а не каждый клиент — списки триграмм получаются короче.
+    Строится один раз при старте и обновляется событиями ORM при изменении Person.
+    Поиск — один проход по спискам самых редких триграмм запроса, без обращения к БД.
+    """
+
+    def __init__(self) -> None:
+        self._postings: dict[str, set[str]] = {}  # триграмма → ключи имён
+        self._grams: dict[str, frozenset[str]] = {}  # ключ имени → его триграммы
+        self._persons: dict[str, set[int]] = {}  # ключ имени → id клиентов
+        self._keys: dict[int, str] = {}  # id клиента → ключ имени
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, person_id: int, name: str) -> None:
+        if person_id in self._keys:
+            self.remove(person_id)
+        key = normalize_name(name)
+        if not key:
+            return
+
+        self._keys[person_id] = key
+        persons = self._persons.get(key)
+        if persons is not None:
+            persons.add(person_id)
+            return
+
+        self._persons[key] = {person_id}
+        grams = frozenset(trigrams(key))
+        self._grams[key] = grams
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(key)
+
+    def remove(self, person_id: int) -> None:
+        key = self._keys.pop(person_id, None)
+        if key is None:
+            return
+        persons = self._persons[key]
+        persons.discard(person_id)
+        if persons:
+            return
+
+        del self._persons[key]
+        for gram in self._grams.pop(key):
+            posting = self._postings[gram]
+            posting.discard(key)
+            if not posting:
+                del self._postings[gram]
+
+    def search(self, query: str, limit: int = 15, threshold: float = SIMILARITY_THRESHOLD) -> list[tuple[int, float]]:
+        """Топ-k (person_id, похожесть) по убыванию похожести."""
+        query_grams = trigrams(normalize_name(query))
+        if not query_grams:
+            return []
+
+        # Похожесть >= threshold возможна только при min_shared общих триграммах, значит кандидат
+        # обязательно встречается среди (n - min_shared + 1) самых редких триграмм запроса.
+        # Частые триграммы вроде "  a" (начало половины имён) в отбор кандидатов не попадают.
+        postings = sorted((self._postings.get(gram, ()) for gram in query_grams), key=len)
+        min_shared = max(1, math.ceil(threshold * len(query_grams)))
+        candidates: set[str] = set()
+        for posting in postings[:len(postings) - min_shared + 1]:
+            candidates.update(posting)
+
+        query_size = len(query_grams)
+        scored = []
+        for key in candidates:
+            grams = self._grams[key]
+            shared = len(query_grams & grams)
+            similarity = shared / (query_size + len(grams) - shared)
+            if similarity >= threshold:
+                scored.append((similarity, key))
+        scored.sort(reverse=True)
+
+        matches = []
+        for similarity, key in scored:
+            for person_id in sorted(self._persons[key]):
+                matches.append((person_id, similarity))
+                if len(matches) >= limit:
+                    return matches
+        return matches
+
+    async def build(self) -> None:
+        self.__init__()
+        async with AsyncSessionLocal() as session:
+            result = await session.stream(select(Person.id, Person.first_name, Person.last_name))
+            async for rows in result.partitions(5000):
+                for person_id, first_name, last_name in rows:
+                    self.add(person_id, _display_name(first_name, last_name))
+        logger.info("Индекс нечёткого поиска построен: %s клиентов, %s разных имён", len(self._keys), len(self._persons))
+
+
+client_name_index = TrigramIndex()
+
+
+# Изменения копятся в сессии на flush и попадают в индекс только после commit:
+# flush с последующим rollback (например, ошибка хендлера в DbSessionMiddleware) индекс не трогает
+_PENDING_KEY = "fuzzy_index_pending"
+
+
+def _queue(target: Person, display_name: Optional[str]) -> None:
+    session = object_session(target)
+    if session is None:
+        return
+    # person_id → новое имя; None — клиент удалён. Поздний flush в той же транзакции перекрывает ранний
+    session.info.setdefault(_PENDING_KEY, {})[target.id] = display_name
+
+
+@event.listens_for(Person, "after_insert")
+def _index_new_person(mapper, connection, target: Person) -> None:
+    _queue(target, _display_name(target.first_name, target.last_name))
+
+
+@event.listens_for(Person, "after_update")
+def _reindex_person(mapper, connection, target: Person) -> None:
+    state = inspect(target)
+    if state.attrs.first_name.history.has_changes() or state.attrs.last_name.history.has_changes():
+        _queue(target, _display_name(target.first_name, target.last_name))
+
+
+@event.listens_for(Person, "after_delete")
+def _unindex_person(mapper, connection, target: Person) -> None:
+    _queue(target, None)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending(session: Session) -> None:
+    for person_id, display_name in session.info.pop(_PENDING_KEY, {}).items():
+        if display_name is None:
+            client_name_index.remove(person_id)
+        else:
+            client_name_index.add(person_id, display_name)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
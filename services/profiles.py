@@ -0,0 +1,170 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Hashable, Optional
+
+from aiogram.types import InlineKeyboardMarkup
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, object_session
+
+from config import PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL_SECONDS
+from database.models import Person, Vision
+
+# Сколько последних записей зрения нужно карточке профиля
+PROFILE_VISIONS = 1
+
+ProfileCard = tuple[str, InlineKeyboardMarkup]
+
+
+@dataclass(frozen=True)
+class ClientProfile:
+    person: Person
+    visions: list[Vision]  # последние записи, от новых к старым
+    visions_total: int
+
+    @property
+    def last_vision(self) -> Optional[Vision]:
+        return self.visions[0] if self.visions else None
+
+
+async def load_client_profile(session: AsyncSession, person_id: int, visions_limit: int = PROFILE_VISIONS) -> Optional[ClientProfile]:
+    """Клиент, его последние visions_limit записей и их общее число — одним запросом."""
+    latest_ids = (
+        select(Vision.id)
+        .where(Vision.person_id == person_id)
+        .order_by(Vision.visit_date.desc(), Vision.id.desc())
+        .limit(visions_limit)
+    )
+    total = (
+        select(func.count())
+        .select_from(Vision)
+        .where(Vision.person_id == Person.id)
+        .correlate(Person)
+        .scalar_subquery()
+    )
+    result = await session.execute(
+        select(Person, Vision, total)
+        .outerjoin(Vision, Vision.id.in_(latest_ids))
+        .where(Person.id == person_id)
+    )
+    rows = result.all()
+    if not rows:
+        return None
+    # Строк не больше visions_limit — порядок наводим здесь, а не сортировкой в SQLite
+    visions = sorted((row[1] for row in rows if row[1] is not None), key=lambda v: (v.visit_date, v.id), reverse=True)
+    return ClientProfile(rows[0][0], visions, rows[0][2])
+
+
+class ProfileCache:
+    """Готовые карточки профиля (текст + клавиатура) по (person_id, раздел).
+
+    Сбрасывается точечно: изменение клиента или любой его записи зрения удаляет только его карточки.
+    TTL — страховка на случай правки мимо ORM (прямо в БД или массовым UPDATE).
+    """
+
+    def __init__(self, maxsize: int = PROFILE_CACHE_SIZE, ttl: float = PROFILE_CACHE_TTL_SECONDS) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[tuple[int, Hashable], tuple[float, ProfileCard]] = OrderedDict()
+        self._kinds: set[Hashable] = set()
+        # Растёт при каждом сбросе: карточку, собранную до сброса, в кэш уже не кладём
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, person_id: int, kind: Hashable) -> Optional[ProfileCard]:
+        key = (person_id, kind)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, person_id: int, kind: Hashable, card: ProfileCard, generation: int) -> None:
+        if generation != self.generation or self.maxsize <= 0:
+            return
+        key = (person_id, kind)
+        self._kinds.add(kind)
+        self._entries[key] = (time.monotonic() + self.ttl, card)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, person_id: int) -> None:
+        for kind in self._kinds:
+            self._entries.pop((person_id, kind), None)
+        self.generation += 1
+        self.invalidations += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.generation += 1
+        self.invalidations += 1
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    async def render(
+        self,
+        session: AsyncSession,
+        person_id: int,
+        kind: Hashable,
+        build: Callable[[ClientProfile], ProfileCard],
+    ) -> Optional[ProfileCard]:
+        """Карточка из кэша или build(профиль из БД); None — клиента нет."""
+        card = self.get(person_id, kind)
+        if card is not None:
+            return card
+        generation = self.generation
+        profile = await load_client_profile(session, person_id)
+        if profile is None:
+            return None
+        card = build(profile)
+        self.put(person_id, kind, card, generation)
+        return card
+
+
+profile_cache = ProfileCache()
+
+
+def _mark_dirty(target, person_id: Optional[int]) -> None:
+    # Сбрасываем сразу при flush и ещё раз после commit/rollback: между ними другой запрос
+    # (или этот же — до commit) мог закэшировать карточку, которую commit сделал устаревшей
+    if person_id is None:
+        return
+    profile_cache.invalidate(person_id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("profile_cache_dirty", set()).add(person_id)
+
+
+@event.listens_for(Person, "after_insert")
+@event.listens_for(Person, "after_update")
+@event.listens_for(Person, "after_delete")
+def _invalidate_on_person_change(mapper, connection, target: Person) -> None:
+    _mark_dirty(target, target.id)
+
+
+@event.listens_for(Vision, "after_insert")
+@event.listens_for(Vision, "after_update")
+@event.listens_for(Vision, "after_delete")
+def _invalidate_on_vision_change(mapper, connection, target: Vision) -> None:
+    _mark_dirty(target, target.person_id)
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _invalidate_after_transaction(session: Session) -> None:
+    for person_id in session.info.pop("profile_cache_dirty", ()):
+        profile_cache.invalidate(person_id)
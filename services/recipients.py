@@ -0,0 +1,180 @@
+import json
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, timedelta
+from typing import AsyncIterator, Optional, Sequence
+
+from sqlalchemy import Row, and_, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import Person, Vision, get_kg_time
+
+RECIPIENTS_BATCH_SIZE = 1000
+SEGMENT_ROLES = ("client", "admin", "owner")
+
+SEGMENT_HELP = (
+    "Условия через пробел (все необязательные):\n"
+    "• <code>роль:client</code> — роль (client / admin / owner)\n"
+    "• <code>возраст:18-35</code> — диапазон возраста\n"
+    "• <code>визит&gt;90</code> — последний визит больше 90 дней назад\n"
+    "• <code>визит&lt;30</code> — последний визит за последние 30 дней\n"
+    "• <code>линзы:progressive</code> — есть запись зрения с таким типом линз\n"
+    "• <code>регистрация&gt;01.01.2025</code> / <code>регистрация&lt;01.06.2025</code> — дата регистрации\n\n"
+    "Пример: <code>возраст:40-70 визит&gt;180 линзы:progressive</code>"
+)
+
+
+@dataclass
+class BroadcastSegment:
+    """Фильтр аудитории рассылки. Каждое условие ложится на индексированную колонку."""
+
+    role: Optional[str] = None
+    age_min: Optional[int] = None
+    age_max: Optional[int] = None
+    visit_older_days: Optional[int] = None
+    visit_newer_days: Optional[int] = None
+    lens_type: Optional[str] = None
+    registered_after: Optional[date] = None
+    registered_before: Optional[date] = None
+
+    @classmethod
+    def parse(cls, raw: str) -> "BroadcastSegment":
+        segment = cls()
+        for token in raw.split():
+            lowered = token.lower()
+            try:
+                if lowered.startswith("роль:"):
+                    segment.role = lowered.split(":", 1)[1]
+                    if segment.role not in SEGMENT_ROLES:
+                        raise ValueError
+                elif lowered.startswith("возраст:"):
+                    low, high = lowered.split(":", 1)[1].split("-")
+                    segment.age_min, segment.age_max = int(low), int(high)
+                elif lowered.startswith("визит>"):
+                    segment.visit_older_days = int(lowered[len("визит>"):])
+                elif lowered.startswith("визит<"):
+                    segment.visit_newer_days = int(lowered[len("визит<"):])
+                elif lowered.startswith("линзы:"):
+                    segment.lens_type = token.split(":", 1)[1]
+                elif lowered.startswith("регистрация>"):
+                    segment.registered_after = datetime.strptime(lowered[len("регистрация>"):], "%d.%m.%Y").date()
+                elif lowered.startswith("регистрация<"):
+                    segment.registered_before = datetime.strptime(lowered[len("регистрация<"):], "%d.%m.%Y").date()
+                else:
+                    raise ValueError
+            except ValueError:
+                raise ValueError(f"Не понял условие: {token}")
+        return segment
+
+    @classmethod
+    def from_json(cls, raw: Optional[str]) -> Optional["BroadcastSegment"]:
+        if not raw:
+            return None
+        data = json.loads(raw)
+        for key in ("registered_after", "registered_before"):
+            if data.get(key):
+                data[key] = date.fromisoformat(data[key])
+        return cls(**data)
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), default=str)
+
+    def conditions(self) -> list:
+        today = get_kg_time().date()
+        conditions = []
+        if self.role:
+            conditions.append(Person.role == self.role)
+        if self.age_min is not None:
+            conditions.append(Person.age >= self.age_min)
+        if self.age_max is not None:
+            conditions.append(Person.age <= self.age_max)
+        if self.visit_older_days is not None:
+            conditions.append(Person.last_visit_date < today - timedelta(days=self.visit_older_days))
+        if self.visit_newer_days is not None:
+            conditions.append(Person.last_visit_date >= today - timedelta(days=self.visit_newer_days))
+        if self.lens_type:
+            conditions.append(Person.id.in_(select(Vision.person_id).where(Vision.lens_type == self.lens_type)))
+        if self.registered_after:
+            conditions.append(Person.created_at >= datetime.combine(self.registered_after, datetime.min.time()))
+        if self.registered_before:
+            conditions.append(Person.created_at < datetime.combine(self.registered_before, datetime.min.time()))
+        return conditions
+
+    def describe(self) -> str:
+        parts = []
+        if self.role:
+            parts.append(f"роль {self.role}")
+        if self.age_min is not None:
+            parts.append(f"возраст {self.age_min}–{self.age_max}")
+        if self.visit_older_days is not None:
+            parts.append(f"визит более {self.visit_older_days} дн. назад")
+        if self.visit_newer_days is not None:
+            parts.append(f"визит за последние {self.visit_newer_days} дн.")
+        if self.lens_type:
+            parts.append(f"линзы {self.lens_type}")
+        if self.registered_after:
+            parts.append(f"регистрация с {self.registered_after:%d.%m.%Y}")
+        if self.registered_before:
+            parts.append(f"регистрация до {self.registered_before:%d.%m.%Y}")
+        return ", ".join(parts) or "все клиенты"
+
+
+def _recipients_filter(segment: Optional[BroadcastSegment] = None):
+    # Клиенты, заблокировавшие бота, пропускаются, чтобы не тратить лимит отправки
+    conditions = [Person.telegram_id.is_not(None), Person.unreachable_since.is_(None)]
+    if segment is not None:
+        conditions.extend(segment.conditions())
+    return and_(*conditions)
+
+
+async def count_recipients(session: AsyncSession, segment: Optional[BroadcastSegment] = None) -> int:
+    return await session.scalar(select(func.count(Person.id)).where(_recipients_filter(segment))) or 0
+
+
+async def iter_recipient_rows(
+    session: AsyncSession,
+    segment: Optional[BroadcastSegment] = None,
+    columns: Sequence = (),
+    join_latest_vision: bool = False,
+    batch_size: int = RECIPIENTS_BATCH_SIZE,
+) -> AsyncIterator[list[Row]]:
+    """Отдаёт получателей пачками по keyset-пагинации (WHERE id > :last ORDER BY id LIMIT n).
+
+    Каждая строка — telegram_id и дополнительные `columns` (для персональных шаблонов).
+    При join_latest_vision подтягивается последняя запись зрения клиента — тем же запросом.
+    """
+    query = select(Person.id, Person.telegram_id, *columns)
+    if join_latest_vision:
+        latest_vision_id = (
+            select(Vision.id)
+            .where(Vision.person_id == Person.id)
+            .order_by(Vision.visit_date.desc(), Vision.id.desc())
+            .limit(1)
+            .correlate(Person)
+            .scalar_subquery()
+        )
+        query = query.outerjoin(Vision, Vision.id == latest_vision_id)
+
+    last_id = 0
+    while True:
+        result = await session.execute(
+            query.where(_recipients_filter(segment), Person.id > last_id).order_by(Person.id).limit(batch_size)
+        )
+        rows = result.all()
+        if not rows:
+            return
+
+        last_id = rows[-1].id
+        yield rows
+
+
+async def iter_recipient_batches(
+    session: AsyncSession,
+    segment: Optional[BroadcastSegment] = None,
+    batch_size: int = RECIPIENTS_BATCH_SIZE,
+) -> AsyncIterator[list[int]]:
+    """Отдаёт только telegram_id получателей пачками.
+
+    В памяти держится только одна пачка целых чисел, а не все ORM-объекты Person.
+    """
+    async for rows in iter_recipient_rows(session, segment, batch_size=batch_size):
+        yield [row.telegram_id for row in rows]
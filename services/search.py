@@ -0,0 +1,215 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import or_, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.fts import ranked_person_ids
+from database.models import Person
+from services.fuzzy_search import client_name_index
+from services.search_cache import search_cache
+from utils.phone import normalize_phone
+
+SEARCH_LIMIT = 15
+# Клиентов на одной странице результатов поиска
+SEARCH_PAGE_SIZE = 10
+# Нечёткие совпадения дальше этого числа не листаются — там уже мало похожие имена
+FUZZY_LIMIT = 200
+
+
+@dataclass(frozen=True)
+class ClientSearchResult:
+    """Строка результата поиска — только то, что нужно для списка, без ORM-объекта."""
+
+    id: int
+    telegram_id: Optional[int]
+    full_name: Optional[str]
+    phone: Optional[str]
+    role: str
+    # Меньше — лучше: 0 — точное совпадение, отрицательные — bm25 полнотекстового поиска,
+    # от 0 до 1 — нечёткие совпадения (1 - похожесть), они идут после полнотекстовых
+    rank: float = 0.0
+
+    @property
+    def title(self) -> str:
+        return self.full_name or self.phone or str(self.telegram_id)
+
+
+_RESULT_COLUMNS = (Person.id, Person.telegram_id, Person.full_name, Person.phone, Person.role)
+
+
+def _exact_conditions(query: str) -> list:
+    conditions = []
+    # Ведущий ноль — это телефон, а не telegram_id
+    if query.isdigit() and not query.startswith('0'):
+        conditions.append(Person.telegram_id == int(query))
+
+    normalized = normalize_phone(query)
+    if normalized:
+        conditions.append(Person.phone_digits == normalized)
+    return conditions
+
+
+async def find_exact(session: AsyncSession, query: str) -> list[ClientSearchResult]:
+    """Поиск по telegram_id или телефону — точечные запросы по уникальным индексам."""
+    conditions = _exact_conditions(query.strip())
+    if not conditions:
+        return []
+
+    result = await session.execute(select(*_RESULT_COLUMNS).where(or_(*conditions)))
+    results = [ClientSearchResult(*row) for row in result.all()]
+    # Совпадение по telegram_id важнее совпадения по телефону
+    return sorted(results, key=lambda r: str(r.telegram_id) != query.strip())
+
+
+# Курсор страницы — (rank, id) крайнего клиента на ней; в callback_data: "<префикс>n_<rank>_<id>"
+SearchCursor = tuple[float, int]
+
+
+@dataclass(frozen=True)
+class SearchPage:
+    results: list[ClientSearchResult]
+    has_prev: bool = False
+    has_next: bool = False
+
+    @property
+    def prev_cursor(self) -> Optional[SearchCursor]:
+        return (self.results[0].rank, self.results[0].id) if self.has_prev and self.results else None
+
+    @property
+    def next_cursor(self) -> Optional[SearchCursor]:
+        return (self.results[-1].rank, self.results[-1].id) if self.has_next and self.results else None
+
+
+def page_callback_data(prefix: str, forward: bool, cursor: SearchCursor) -> str:
+    rank, person_id = cursor
+    # repr float обратим без потерь — курсор укажет ровно на ту же позицию
+    return f"{prefix}{'n' if forward else 'p'}_{rank!r}_{person_id}"
+
+
+def parse_page_callback(data: str, prefix: str) -> tuple[bool, SearchCursor]:
+    """callback_data кнопки "Далее"/"Назад" → (вперёд ли, курсор)."""
+    direction, rank, person_id = data[len(prefix):].split("_")
+    return direction == "n", (float(rank), int(person_id))
+
+
+async def search_clients(session: AsyncSession, query: str, limit: int = SEARCH_LIMIT) -> list[ClientSearchResult]:
+    """Первые limit результатов поиска — для мест, где листать не нужно."""
+    page = await search_clients_page(session, query, page_size=limit)
+    return page.results
+
+
+async def search_clients_page(
+    session: AsyncSession,
+    query: str,
+    cursor: Optional[SearchCursor] = None,
+    forward: bool = True,
+    page_size: int = SEARCH_PAGE_SIZE,
+    scope: str = "owner",
+) -> SearchPage:
+    """Единый поиск клиентов для всех разделов владельца и админов, по страницам.
+
+    Сначала точное совпадение по telegram_id/телефону; если его нет — полнотекстовый поиск по имени,
+    фамилии, username и телефону с ранжированием bm25, за ним нечёткие совпадения по триграммам
+    с транслитерацией ("Aigul" найдёт "Айгуль").
+
+    Выдача упорядочена по (rank, id), страницы — keyset по курсору крайнего клиента соседней
+    страницы: WHERE (rank, id) > курсор ORDER BY rank, id LIMIT n + 1, без OFFSET.
+    Лишняя (n + 1)-я строка только говорит, есть ли следующая страница.
+
+    Страницы кэшируются по (нормализованный запрос, scope — раздел владельца/админа, курсор);
+    кэш сбрасывается при любом изменении клиентов, см. services/search_cache.py.
+    """
+    query = " ".join(query.split())
+    if not query:
+        return SearchPage([])
+
+    key = (query.lower(), scope, cursor, forward, page_size)
+    page = search_cache.get(key)
+    if page is None:
+        generation = search_cache.generation
+        page = await _search_page(session, query, cursor, forward, page_size)
+        search_cache.put(key, page, generation)
+    return page
+
+
+async def _search_page(
+    session: AsyncSession, query: str, cursor: Optional[SearchCursor], forward: bool, page_size: int,
+) -> SearchPage:
+    if cursor is None:
+        exact = await find_exact(session, query)
+        if exact:
+            return SearchPage(exact)
+
+    # Полнотекстовые ранги отрицательные, нечёткие — от 0 до 1, поэтому уровни идут строго друг за другом:
+    # вперёд — сначала полнотекстовые, потом нечёткие; назад — в обратном порядке
+    in_fts = cursor is None or cursor[0] < 0
+    if forward:
+        rows = await _load_fts(session, query, cursor, forward, page_size + 1) if in_fts else []
+        if len(rows) <= page_size:
+            rows += await _load_fuzzy(session, query, None if in_fts else cursor, forward, page_size + 1 - len(rows))
+    else:
+        rows = [] if in_fts else await _load_fuzzy(session, query, cursor, forward, page_size + 1)
+        if len(rows) <= page_size:
+            rows += await _load_fts(session, query, cursor if in_fts else None, forward, page_size + 1 - len(rows))
+
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if forward:
+        return SearchPage(rows, has_prev=cursor is not None, has_next=has_more)
+    return SearchPage(rows[::-1], has_prev=has_more, has_next=True)
+
+
+async def _load_fts(
+    session: AsyncSession, query: str, cursor: Optional[SearchCursor], forward: bool, limit: int,
+) -> list[ClientSearchResult]:
+    fts = ranked_person_ids(query)
+    if fts is None:
+        return []
+
+    key = tuple_(fts.c.rank, Person.id)
+    stmt = select(*_RESULT_COLUMNS, fts.c.rank).join(fts, fts.c.person_id == Person.id)
+    if forward:
+        stmt = stmt.order_by(fts.c.rank, Person.id)
+        if cursor is not None:
+            stmt = stmt.where(key > tuple_(*cursor))
+    else:
+        stmt = stmt.order_by(fts.c.rank.desc(), Person.id.desc())
+        if cursor is not None:
+            stmt = stmt.where(key < tuple_(*cursor))
+
+    result = await session.execute(stmt.limit(limit))
+    return [ClientSearchResult(*row) for row in result.all()]
+
+
+async def _load_fuzzy(
+    session: AsyncSession, query: str, cursor: Optional[SearchCursor], forward: bool, limit: int,
+) -> list[ClientSearchResult]:
+    """Нечёткие совпадения из индекса в памяти — страница по тому же ключу (rank, id).
+
+    Клиенты, которые уже нашлись полнотекстовым поиском, исключаются, чтобы не повторяться на страницах.
+    """
+    matches = [(1 - similarity, person_id) for person_id, similarity in client_name_index.search(query, limit=FUZZY_LIMIT)]
+    matches.sort(reverse=not forward)
+    if cursor is not None:
+        matches = [m for m in matches if (m > cursor if forward else m < cursor)]
+    if not matches:
+        return []
+
+    fts = ranked_person_ids(query)
+    rows = []
+    # Пачками с запасом: часть кандидатов отсеется как полнотекстовые совпадения или удалённые клиенты
+    chunk = limit * 3
+    for start in range(0, len(matches), chunk):
+        rank = {person_id: r for r, person_id in matches[start:start + chunk]}
+        stmt = select(*_RESULT_COLUMNS).where(Person.id.in_(rank))
+        if fts is not None:
+            stmt = stmt.where(Person.id.not_in(select(fts.c.person_id).where(fts.c.person_id.in_(rank))))
+        result = await session.execute(stmt)
+        # Индекс в памяти может ссылаться на уже удалённых клиентов — такие id просто не вернутся из БД
+        rows.extend(ClientSearchResult(*row, rank=rank[row.id]) for row in result.all())
+        if len(rows) >= limit:
+            break
+
+    rows.sort(key=lambda r: (r.rank, r.id), reverse=not forward)
+    return rows[:limit]
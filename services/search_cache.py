@@ -0,0 +1,96 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from config import SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL_SECONDS
+from database.models import Person
+
+
+class SearchCache:
+    """LRU-кэш страниц поиска клиентов с коротким TTL.
+
+    Изменение искомых полей Person сбрасывает кэш целиком: клиентов мало меняют, а ищут часто,
+    поэтому точечная инвалидация по запросам не окупается.
+    """
+
+    def __init__(self, maxsize: int = SEARCH_CACHE_SIZE, ttl: float = SEARCH_CACHE_TTL_SECONDS) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        # Растёт при каждом сбросе: результат запроса, начатого до сброса, в кэш уже не кладём
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: Hashable, value: Any, generation: int) -> None:
+        if generation != self.generation or self.maxsize <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.generation += 1
+        self.invalidations += 1
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+search_cache = SearchCache()
+
+
+# Колонки, по которым ищут или которые видны в результатах поиска
+SEARCHED_COLUMNS = ("first_name", "last_name", "full_name", "username", "phone", "phone_digits", "telegram_id", "role")
+
+
+def _mark_dirty(target: Person) -> None:
+    # Сбрасываем сразу при flush и ещё раз после commit: между ними другой запрос
+    # мог закэшировать данные, которые commit сделал устаревшими
+    search_cache.clear()
+    session = object_session(target)
+    if session is not None:
+        session.info["search_cache_dirty"] = True
+
+
+@event.listens_for(Person, "after_insert")
+@event.listens_for(Person, "after_delete")
+def _invalidate_on_person_change(mapper, connection, target: Person) -> None:
+    _mark_dirty(target)
+
+
+@event.listens_for(Person, "after_update")
+def _invalidate_on_person_update(mapper, connection, target: Person) -> None:
+    # after_update срабатывает для любого "грязного" объекта, даже без реальных изменений
+    # (например, /start заново присваивает username) — кэш сбрасываем только при смене искомых полей
+    attrs = inspect(target).attrs
+    if any(getattr(attrs, column).history.has_changes() for column in SEARCHED_COLUMNS):
+        _mark_dirty(target)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session) -> None:
+    if session.info.pop("search_cache_dirty", False):
+        search_cache.clear()
@@ -0,0 +1,51 @@
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import Vision
+
+# Записи зрения листаются от новых к старым: (visit_date, id) по убыванию.
+# Соседняя запись — один запрос по (person_id, visit_date, id) с LIMIT 1, сколько бы визитов ни было у клиента.
+VisionPosition = tuple[int, date, int]  # (номер записи с 0, visit_date, id)
+
+
+async def count_visions(session: AsyncSession, person_id: int) -> int:
+    return await session.scalar(select(func.count()).select_from(Vision).where(Vision.person_id == person_id))
+
+
+async def latest_vision(session: AsyncSession, person_id: int) -> Optional[Vision]:
+    result = await session.execute(
+        select(Vision)
+        .where(Vision.person_id == person_id)
+        .order_by(Vision.visit_date.desc(), Vision.id.desc())
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+
+async def neighbour_vision(session: AsyncSession, person_id: int, visit_date: date, vision_id: int, older: bool) -> Optional[Vision]:
+    """Следующая (older=True — более старая) или предыдущая запись относительно (visit_date, id)."""
+    key = tuple_(Vision.visit_date, Vision.id)
+    stmt = select(Vision).where(Vision.person_id == person_id)
+    if older:
+        stmt = stmt.where(key < tuple_(visit_date, vision_id)).order_by(Vision.visit_date.desc(), Vision.id.desc())
+    else:
+        stmt = stmt.where(key > tuple_(visit_date, vision_id)).order_by(Vision.visit_date, Vision.id)
+    result = await session.execute(stmt.limit(1))
+    return result.scalar_one_or_none()
+
+
+def vision_nav_callback(prefix: str, index: int, vision: Vision) -> str:
+    # Позиция и курсор текущей записи едут в callback_data: "<префикс><номер>_<ГГГГ-ММ-ДД>_<id>"
+    return f"{prefix}{index}_{vision.visit_date.isoformat()}_{vision.id}"
+
+
+def parse_vision_callback(data: str, prefix: str) -> Optional[VisionPosition]:
+    """callback_data кнопки ◀/▶ → позиция; None — кнопка из старого формата, листать не с чего."""
+    try:
+        index, visit_date, vision_id = data[len(prefix):].split("_")
+        return int(index), date.fromisoformat(visit_date), int(vision_id)
+    except ValueError:
+        return None
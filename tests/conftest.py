@@ -0,0 +1,14 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Настройки читаются из окружения при импорте config, поэтому выставляем их до импорта модулей бота:
+# тесты работают со своей временной базой и никогда не трогают data/database.db
+_DB_DIR = tempfile.mkdtemp(prefix="optic_tests_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{Path(_DB_DIR) / 'tests.db'}"
+os.environ.setdefault("BOT_TOKEN", "123456:tests")
+os.environ["OWNER_IDS"] = "1"
+os.environ["SEARCH_CACHE_SIZE"] = "0"
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,54 @@
+import json
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import delete, select
+
+from database.init_db import init_db
+from database.models import BroadcastDelivery, BroadcastJob, Person
+from database.session import AsyncSessionLocal
+from services.broadcast import CAPTION_LIMIT, DELIVERY_FAILED, caption_length, fill_deliveries
+
+pytestmark = pytest.mark.asyncio(loop_scope="module")
+
+SHORT_ID = 700_000_201
+LONG_ID = 700_000_202
+
+
+@pytest_asyncio.fixture(scope="module", loop_scope="module")
+async def statuses():
+    await init_db()
+    async with AsyncSessionLocal() as session:
+        session.add_all([
+            Person(telegram_id=SHORT_ID, first_name="Ян", role="client"),
+            Person(telegram_id=LONG_ID, first_name="Я" * CAPTION_LIMIT, role="client"),
+        ])
+        job = BroadcastJob(
+            text="Здравствуйте, {first_name}!",
+            media=json.dumps([{"type": "photo", "file_id": "file"}]),
+            requested_by=1,
+        )
+        session.add(job)
+        await session.flush()
+        await fill_deliveries(session, job)
+        await session.commit()
+
+        rows = await session.execute(
+            select(BroadcastDelivery.telegram_id, BroadcastDelivery.status).where(BroadcastDelivery.job_id == job.id)
+        )
+        yield dict(rows.all())
+
+        # База общая для всех тестов: другие модули заводят клиентов со своими id
+        await session.execute(delete(BroadcastDelivery).where(BroadcastDelivery.job_id == job.id))
+        await session.execute(delete(BroadcastJob).where(BroadcastJob.id == job.id))
+        await session.execute(delete(Person).where(Person.telegram_id.in_([SHORT_ID, LONG_ID])))
+        await session.commit()
+
+
+async def test_caption_length_ignores_html_markup():
+    assert caption_length("<b>Скидка</b> &lt;10%&gt;") == len("Скидка <10%>")
+
+
+async def test_rendered_caption_over_limit_is_failed(statuses):
+    assert statuses[SHORT_ID] == "pending"
+    assert statuses[LONG_ID] == DELIVERY_FAILED
@@ -0,0 +1,51 @@
+from datetime import date
+
+import pytest
+
+from services.broadcast_template import BroadcastTemplate, TemplateError
+
+
+def render(text: str, **values) -> str:
+    return BroadcastTemplate.compile(text).render(values)
+
+
+@pytest.mark.parametrize("text", [
+    "Скидка {только сегодня}!",
+    "Акция до пятницы }",
+    "Открывающая { без пары",
+    '{"promo": "OPTIC10", "sale": {"percent": 10}}',
+    "{{ и }} просто текст",
+    "{} и {  }",
+    "{first name}",
+])
+def test_plain_braces_stay_literal(text):
+    template = BroadcastTemplate.compile(text)
+    assert not template.is_personalized
+    assert template.render({}) == text
+
+
+def test_placeholders_are_rendered():
+    text = "Здравствуйте, {first_name}! Визит {visit_date}, линзы: { lens_type | уточните }."
+    values = {"first_name": "Айгерим", "visit_date": date(2024, 5, 1), "lens_type": None}
+    assert render(text, **values) == "Здравствуйте, Айгерим! Визит 01.05.2024, линзы: уточните."
+
+
+def test_placeholder_next_to_plain_braces():
+    template = BroadcastTemplate.compile("{first_name|клиент}, скидка {только сегодня} {10%}")
+    assert template.fields == ["first_name"]
+    assert template.render({}) == "клиент, скидка {только сегодня} {10%}"
+
+
+def test_escaped_placeholder_is_text():
+    template = BroadcastTemplate.compile("Пишите {{first_name}} или {{ sph_r|0 }}, {first_name}")
+    assert template.fields == ["first_name"]
+    assert template.render({"first_name": "Ян"}) == "Пишите {first_name} или { sph_r|0 }, Ян"
+
+
+def test_values_are_html_escaped():
+    assert render("{first_name}", first_name="<b>Ян</b>") == "&lt;b&gt;Ян&lt;/b&gt;"
+
+
+def test_unknown_variable_is_rejected():
+    with pytest.raises(TemplateError, match="frist_name"):
+        BroadcastTemplate.compile("Здравствуйте, {frist_name}!")
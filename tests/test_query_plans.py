@@ -0,0 +1,162 @@
+"""Планы горячих запросов к клиентам и записям зрения.
+
+На свежей схеме (init_db) вызываются настоящие функции бота, их SQL перехватывается
+и прогоняется через EXPLAIN QUERY PLAN. Тест падает, если запрос читает таблицу целиком (SCAN)
+или досортировывает выдачу во временном B-дереве (USE TEMP B-TREE).
+
+Исключение — выгрузки в Excel: они читают всю таблицу по определению, поэтому им разрешён
+SCAN выгружаемой таблицы (по rowid, в порядке id), но не временная сортировка и не SCAN других таблиц.
+Полнотекстовый поиск сортирует по bm25 — рангу, который считается на лету и в индексе не лежит,
+поэтому запросу к persons_fts разрешено досортировать найденные строки (только их, не всю таблицу).
+
+    python -m pytest -q tests/test_query_plans.py
+"""
+
+from datetime import date
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+import pytest_asyncio
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from sqlalchemy import event, insert
+
+from database.engine import async_engine
+from database.init_db import init_db
+from database.models import Person, Vision
+from database.session import AsyncSessionLocal
+from handlers.admin import admin_broadcast_router
+from handlers.owner import broadcast_router
+from handlers.owner.admins_router import get_admins_list_text
+from handlers.owner.crud.clients_router import render_client_profile
+from middlewares.roles import RoleCache
+from services.export import clients_last_vision_query, clients_query, stream_rows, visions_query
+from services.profiles import profile_cache
+from services.search import find_exact, search_clients_page
+from services.visions import count_visions, latest_vision, neighbour_vision
+
+PERSON_ID = 1
+TELEGRAM_ID = 700_000_001
+PHONE = "996555123456"
+
+pytestmark = pytest.mark.asyncio(loop_scope="module")
+
+
+class _Recorder:
+    """Запоминает SELECT-ы, которые движок отправил в базу, пока идёт один сценарий."""
+
+    def __init__(self) -> None:
+        self.statements: list[tuple[str, tuple]] = []
+        self.active = False
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        if self.active and statement.lstrip().upper().startswith("SELECT"):
+            self.statements.append((statement, tuple(parameters or ())))
+
+    async def capture(self, scenario) -> list[tuple[str, tuple]]:
+        self.statements = []
+        self.active = True
+        try:
+            async with AsyncSessionLocal() as session:
+                await scenario(session)
+        finally:
+            self.active = False
+        return self.statements
+
+
+async def _seed() -> None:
+    async with AsyncSessionLocal() as session:
+        await session.execute(insert(Person), [{
+            "id": PERSON_ID, "telegram_id": TELEGRAM_ID, "first_name": "Айгерим", "last_name": "Асанова",
+            "phone": PHONE, "phone_digits": PHONE, "role": "client",
+        }])
+        await session.execute(insert(Vision), [
+            {"id": i, "person_id": PERSON_ID, "visit_date": date(2024, i, 1)} for i in range(1, 6)
+        ])
+        await session.commit()
+
+
+async def _export(session, stmt) -> None:
+    async for _ in stream_rows(session, stmt):
+        pass
+
+
+async def _show_profile(session, show_profile) -> None:
+    # Колбэк-триггер: карточка уходит в edit_text, Telegram не нужен
+    trigger = SimpleNamespace(message=SimpleNamespace(edit_text=AsyncMock()))
+    state = FSMContext(storage=MemoryStorage(), key=StorageKey(bot_id=1, chat_id=1, user_id=1))
+    person = await session.get(Person, PERSON_ID)
+    await show_profile(trigger, person, state, None)
+    trigger.message.edit_text.assert_awaited_once()
+
+
+async def _profile(session) -> None:
+    profile_cache.clear()
+    await render_client_profile(session, PERSON_ID)
+
+
+async def _vision_open(session) -> None:
+    await latest_vision(session, PERSON_ID)
+    await count_visions(session, PERSON_ID)
+
+
+# Сценарий → (корутина от сессии, таблицы, которые ему разрешено читать целиком)
+SCENARIOS = {
+    "profile": (_profile, ()),
+    "vision.open": (_vision_open, ()),
+    "vision.older": (lambda session: neighbour_vision(session, PERSON_ID, date(2024, 6, 1), 2, older=True), ()),
+    "vision.newer": (lambda session: neighbour_vision(session, PERSON_ID, date(2024, 6, 1), 2, older=False), ()),
+    "broadcast.owner_profile": (lambda session: _show_profile(session, broadcast_router.show_profile), ()),
+    "broadcast.admin_profile": (lambda session: _show_profile(session, admin_broadcast_router.show_profile), ()),
+    "search.telegram_id": (lambda session: find_exact(session, str(TELEGRAM_ID)), ()),
+    "search.phone": (lambda session: find_exact(session, "0555 123 456"), ()),
+    "search.page.phone": (lambda session: search_clients_page(session, "0555 123 456"), ()),
+    "search.page.name": (lambda session: search_clients_page(session, "Айгерим"), ()),
+    "search.page.name_next": (lambda session: search_clients_page(session, "Асанова", cursor=(-100.0, 0)), ()),
+    "search.page.name_prev": (
+        lambda session: search_clients_page(session, "Асанова", cursor=(0.0, 0), forward=False), (),
+    ),
+    "admins.list": (lambda session: get_admins_list_text(), ()),
+    "roles.get_role": (lambda session: RoleCache().get_role(TELEGRAM_ID), ()),
+    "export.clients": (lambda session: _export(session, clients_query()), ("persons",)),
+    "export.visions": (lambda session: _export(session, visions_query()), ("visions",)),
+    "export.clients_last_vision": (lambda session: _export(session, clients_last_vision_query()), ("persons",)),
+}
+
+
+def _problems(plan: list[str], full_scans: tuple[str, ...]) -> list[str]:
+    problems = []
+    ranked_by_fts = any("VIRTUAL TABLE" in detail for detail in plan)
+    for detail in plan:
+        if "USE TEMP B-TREE" in detail and not ranked_by_fts:
+            problems.append(detail)
+        elif detail.startswith("SCAN ") and "VIRTUAL TABLE" not in detail and detail not in {f"SCAN {t}" for t in full_scans}:
+            problems.append(detail)
+    return problems
+
+
+@pytest_asyncio.fixture(scope="module", loop_scope="module")
+async def recorder():
+    await init_db()
+    await _seed()
+    recorder = _Recorder()
+    event.listen(async_engine.sync_engine, "before_cursor_execute", recorder)
+    yield recorder
+    event.remove(async_engine.sync_engine, "before_cursor_execute", recorder)
+    await async_engine.dispose()
+
+
+@pytest.mark.parametrize("name", SCENARIOS)
+async def test_query_plan(recorder, name):
+    scenario, full_scans = SCENARIOS[name]
+    statements = await recorder.capture(scenario)
+    assert statements, f"{name}: сценарий не отправил в базу ни одного SELECT"
+
+    for statement, parameters in statements:
+        async with async_engine.connect() as conn:
+            rows = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            plan = [row[-1] for row in rows]
+        problems = _problems(plan, full_scans)
+        assert not problems, f"{name}: {' | '.join(plan)}\n{' '.join(statement.split())}"
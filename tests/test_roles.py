@@ -0,0 +1,49 @@
+import pytest
+import pytest_asyncio
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Message, Update
+
+from database.init_db import init_db
+from middlewares.roles import RoleCache, RoleMiddleware
+
+pytestmark = pytest.mark.asyncio(loop_scope="module")
+
+
+@pytest_asyncio.fixture(scope="module", loop_scope="module", autouse=True)
+async def schema():
+    await init_db()
+
+
+async def test_role_cache_is_capped_while_entries_are_fresh():
+    cache = RoleCache(ttl_seconds=600, max_size=3)
+    for user_id in (101, 102, 103):
+        await cache.get_role(user_id)
+    await cache.get_role(101)  # 101 снова нужен — вытесняться должен 102
+    await cache.get_role(104)
+
+    assert len(cache._roles) == 3
+    assert list(cache._roles) == [103, 101, 104]
+
+
+async def test_owner_role_is_injected_into_handler_data():
+    seen = {}
+    router = Router()
+
+    @router.message()
+    async def handler(message: Message, user_role):
+        seen["role"] = user_role
+
+    dp = Dispatcher()
+    dp.update.middleware(RoleMiddleware())
+    dp.include_router(router)
+    update = Update.model_validate({
+        "update_id": 1,
+        "message": {
+            "message_id": 1, "date": 0, "text": "/admin",
+            "chat": {"id": 1, "type": "private"},
+            "from": {"id": 1, "is_bot": False, "first_name": "Owner"},
+        },
+    })
+    await dp.feed_update(Bot("123456:tests"), update)
+
+    assert seen == {"role": "owner"}
@@ -0,0 +1,45 @@
+from datetime import datetime
+
+import pytest
+import pytest_asyncio
+
+from database.init_db import init_db
+from database.models import Person
+from database.session import AsyncSessionLocal
+from services.search_cache import search_cache
+
+pytestmark = pytest.mark.asyncio(loop_scope="module")
+
+
+@pytest_asyncio.fixture(scope="module", loop_scope="module")
+async def person_id():
+    await init_db()
+    async with AsyncSessionLocal() as session:
+        person = Person(telegram_id=700_000_101, username="aibek", first_name="Айбек", role="client")
+        session.add(person)
+        await session.commit()
+        return person.id
+
+
+async def _update(person_id: int, **values) -> int:
+    """Меняет клиента и возвращает, сколько раз за это сбросился кэш поиска."""
+    before = search_cache.invalidations
+    async with AsyncSessionLocal() as session:
+        person = await session.get(Person, person_id)
+        for name, value in values.items():
+            setattr(person, name, value)
+        await session.commit()
+    return search_cache.invalidations - before
+
+
+async def test_same_username_keeps_cache(person_id):
+    # Как в /start: username присваивается заново, хотя не изменился
+    assert await _update(person_id, username="aibek") == 0
+
+
+async def test_unsearched_column_keeps_cache(person_id):
+    assert await _update(person_id, unreachable_since=datetime(2024, 1, 1)) == 0
+
+
+async def test_searched_column_clears_cache(person_id):
+    assert await _update(person_id, phone="996555000101", phone_digits="996555000101") > 0
@@ -1,55 +1,68 @@
-import time
-from dataclasses import dataclass
 from typing import Optional
 
+from sqlalchemy import func, select, update
 
-@dataclass
-class BroadcastStatus:
-    running: bool = False
-    started_at: float = 0.0
-    total: int = 0
-    sent: int = 0
-    errors: int = 0
-    requested_by: Optional[int] = None
-    cancel_requested: bool = False
+from database.models import BroadcastDelivery, BroadcastJob, as_kg_time, get_kg_time
+from database.session import AsyncSessionLocal
 
 
-status = BroadcastStatus()
+async def snapshot() -> dict:
+    """Состояние последней рассылки, прочитанное из broadcast_jobs / broadcast_deliveries."""
+    async with AsyncSessionLocal() as session:
+        job: Optional[BroadcastJob] = await session.scalar(
+            select(BroadcastJob)
+            .where(BroadcastJob.status != "scheduled")
+            .order_by(BroadcastJob.id.desc())
+            .limit(1)
+        )
+        if job is None:
+            return {
+                "job_id": None,
+                "running": False,
+                "total": 0,
+                "sent": 0,
+                "errors": 0,
+                "unreachable": 0,
+                "pending": 0,
+                "requested_by": None,
+                "cancel_requested": False,
+                "elapsed_seconds": 0,
+            }
 
+        result = await session.execute(
+            select(BroadcastDelivery.status, func.count(BroadcastDelivery.id))
+            .where(BroadcastDelivery.job_id == job.id)
+            .group_by(BroadcastDelivery.status)
+        )
+        counts = {status: count for status, count in result.all()}
 
-def start(total: int, requested_by: int) -> None:
-    status.running = True
-    status.started_at = time.monotonic()
-    status.total = total
-    status.sent = 0
-    status.errors = 0
-    status.requested_by = requested_by
-    status.cancel_requested = False
-
-
-def mark_sent(ok: bool) -> None:
-    if ok:
-        status.sent += 1
-    else:
-        status.errors += 1
-
-
-def request_cancel() -> None:
-    status.cancel_requested = True
+    elapsed = 0
+    if job.started_at:
+        finished_at = job.finished_at or get_kg_time()
+        elapsed = int((as_kg_time(finished_at) - as_kg_time(job.started_at)).total_seconds())
 
+    return {
+        "job_id": job.id,
+        "running": job.status in ("pending", "running"),
+        "total": job.total,
+        "sent": counts.get("sent", 0),
+        "errors": counts.get("failed", 0),
+        "unreachable": counts.get("unreachable", 0),
+        "pending": counts.get("pending", 0) + counts.get("sending", 0),
+        "requested_by": job.requested_by,
+        "cancel_requested": job.status == "cancelled",
+        "elapsed_seconds": max(0, elapsed),
+    }
 
-def finish() -> None:
-    status.running = False
 
+async def request_cancel() -> int:
+    """Отменяет все незавершённые рассылки. Воркер остановится после текущей пачки."""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            update(BroadcastJob)
+            .where(BroadcastJob.status.in_(("pending", "running")))
+            .values(status="cancelled")
+        )
+        await session.commit()
+        return result.rowcount
 
-def snapshot() -> dict:
-    elapsed = int(time.monotonic() - status.started_at) if status.started_at else 0
-    return {
-        "running": status.running,
-        "total": status.total,
-        "sent": status.sent,
-        "errors": status.errors,
-        "requested_by": status.requested_by,
-        "cancel_requested": status.cancel_requested,
-        "elapsed_seconds": elapsed,
-    }
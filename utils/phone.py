@@ -0,0 +1,27 @@
+import re
+
+_NON_DIGITS_RE = re.compile(r"\D+")
+
+KG_COUNTRY_CODE = "996"
+
+
+def normalize_phone(raw: str | None) -> str | None:
+    """Телефон в каноническом виде — только цифры E.164 без "+": 996XXXXXXXXX.
+
+    Принимает 0555123456, 555123456, 996555123456, +996 555 12-34-56 и 9960555123456
+    (код страны + ведущий ноль). Иностранные номера из контактов Telegram (+7..., +90...)
+    остаются как есть, без "+" и разделителей. Не похожее на номер → None.
+    """
+    if not raw:
+        return None
+    digits = _NON_DIGITS_RE.sub("", raw)
+    if len(digits) == 9 and not digits.startswith("0"):
+        return KG_COUNTRY_CODE + digits
+    if len(digits) == 10 and digits.startswith("0"):
+        return KG_COUNTRY_CODE + digits[1:]
+    if len(digits) == 13 and digits.startswith(KG_COUNTRY_CODE + "0"):
+        return KG_COUNTRY_CODE + digits[4:]
+    # E.164: не больше 15 цифр; короче 10 — это не полный номер
+    if 10 <= len(digits) <= 15 and not digits.startswith("0"):
+        return digits
+    return None